@@ -0,0 +1,132 @@
+"""Measure chat latency and time-to-first-token under concurrency.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_chat --requests 200 --concurrency 16
+
+The API runs in-process under uvicorn against a fake LLM server, fakeredis,
+the embedded vector store and a scratch Postgres database. Each simulated
+user holds one session and sends its turns one after another, so histories
+grow as they would in real conversations. Prints one JSON object.
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.support import FakeLLMServer, fake_redis_pool, free_port, latency_summary, local_postgres, override_settings
+
+async def _user(client, path: str, user: int, turns: int, stream: bool, latencies: List[float], first_tokens: List[float], errors: List[str]):
+    session_id = str(uuid.uuid4())
+    for turn in range(turns):
+        # Distinct per user, or identical in-flight prompts would be coalesced
+        payload = {"message": f"Question {turn} from user {user}: what changed in the quarterly report?", "session_id": session_id}
+        started = time.perf_counter()
+        try:
+            if stream:
+                first_token = None
+                async with client.stream("POST", path, json=payload) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if first_token is None and line.startswith("data: ") and json.loads(line[len("data: "):]).get("type") == "token":
+                            first_token = time.perf_counter() - started
+                latencies.append(time.perf_counter() - started)
+                if first_token is not None:
+                    first_tokens.append(first_token)
+            else:
+                response = await client.post(path, json=payload)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            errors.append(str(e))
+
+async def _load(base_url: str, path: str, requests: int, concurrency: int, stream: bool) -> Dict[str, Any]:
+    import httpx
+    latencies: List[float] = []
+    first_tokens: List[float] = []
+    errors: List[str] = []
+    turns = max(1, requests // concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            _user(client, path, user, turns, stream, latencies, first_tokens, errors)
+            for user in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+    result = {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "requests_per_second": round(len(latencies) / elapsed, 2),
+        "latency": latency_summary(latencies)
+    }
+    if stream:
+        result["time_to_first_token"] = latency_summary(first_tokens)
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+def run(requests: int, concurrency: int, tokens_per_second: float, reply_tokens: int, first_token_latency: float) -> Dict[str, Any]:
+    with FakeLLMServer(tokens_per_second, reply_tokens, first_token_latency) as llm_server, \
+            local_postgres() as postgres, \
+            tempfile.TemporaryDirectory() as data_dir, \
+            override_settings(
+                LLM_BASE_URL=llm_server.url,
+                VECTOR_STORE_BACKEND="local",
+                VECTOR_STORE_DIR=Path(data_dir) / "vectors",
+                UPLOAD_DIR=Path(data_dir) / "uploads",
+                CACHE_DIR=Path(data_dir) / "cache",
+                MODEL_WARMUP=[],
+                **postgres
+            ):
+        import uvicorn
+        import main as api
+        from core.memory import MemoryManager
+
+        # Swap the Redis-backed memory for one on fakeredis
+        api.memory_manager.close()
+        api.memory_manager = MemoryManager(embedder=api.embedding_pipeline, redis_pool=fake_redis_pool())
+
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            return {
+                "llm": {
+                    "tokens_per_second": tokens_per_second,
+                    "reply_tokens": reply_tokens,
+                    "first_token_latency": first_token_latency
+                },
+                "chat": asyncio.run(_load(base_url, "/api/v1/chat", requests, concurrency, stream=False)),
+                "chat_stream": asyncio.run(_load(base_url, "/api/v1/chat/stream", requests, concurrency, stream=True)),
+                "llm_requests": llm_server.requests
+            }
+        finally:
+            server.should_exit = True
+            thread.join()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--reply-tokens", type=int, default=64)
+    parser.add_argument("--first-token-latency", type=float, default=0.05)
+    args = parser.parse_args()
+    try:
+        results = run(args.requests, args.concurrency, args.tokens_per_second, args.reply_tokens, args.first_token_latency)
+    except (ImportError, RuntimeError) as e:
+        results = {"skipped": str(e)}
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
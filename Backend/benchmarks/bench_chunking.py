@@ -0,0 +1,102 @@
+"""Compare the sentence chunker with the original spaCy ``_chunk_text``.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_chunking --paragraphs 20000
+
+Prints one JSON object with the throughput of each implementation.
+"""
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+from core.chunking import SentenceChunker, load_sentencizer
+
+WORDS = "invoice payment receipt customer order shipment warehouse contract policy report".split()
+THAI_SENTENCES = ["วันนี้อากาศดีมาก", "เราไปเที่ยวทะเลกัน", "กรุณาชำระเงินภายในวันที่กำหนด", "ขอบคุณที่ใช้บริการ"]
+
+def make_corpus(paragraphs: int, thai_ratio: float, seed: int = 0) -> str:
+    """A synthetic document mixing English and Thai paragraphs"""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(paragraphs):
+        if rng.random() < thai_ratio:
+            out.append(" ".join(rng.choice(THAI_SENTENCES) for _ in range(rng.randint(3, 8))))
+        else:
+            sentences = [
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 20))).capitalize() + "."
+                for _ in range(rng.randint(2, 6))
+            ]
+            out.append(" ".join(sentences))
+    return "\n\n".join(out)
+
+def legacy_chunk_text(nlp, text: str, chunk_size: int = 1000) -> List[str]:
+    """The original DocumentProcessor._chunk_text"""
+    doc = nlp(text)
+    chunks = []
+    current_chunk = []
+    current_size = 0
+    for sent in doc.sents:
+        sent_text = sent.text.strip()
+        sent_size = len(sent_text)
+        if current_size + sent_size > chunk_size and current_chunk:
+            chunks.append(" ".join(current_chunk))
+            current_chunk = [sent_text]
+            current_size = sent_size
+        else:
+            current_chunk.append(sent_text)
+            current_size += sent_size
+    if current_chunk:
+        chunks.append(" ".join(current_chunk))
+    return chunks
+
+def _measure(func, text: str, repeat: int) -> Dict[str, Any]:
+    best = float("inf")
+    chunks: List[str] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = func(text)
+        best = min(best, time.perf_counter() - started)
+    return {
+        "seconds": round(best, 4),
+        "chunks": len(chunks),
+        "mb_per_second": round(len(text.encode("utf-8")) / best / 1e6, 3),
+        "chunks_per_second": round(len(chunks) / best, 1)
+    }
+
+def run(paragraphs: int, thai_ratio: float, repeat: int, legacy_model: str) -> Dict[str, Any]:
+    text = make_corpus(paragraphs, thai_ratio)
+    results: Dict[str, Any] = {
+        "input_bytes": len(text.encode("utf-8")),
+        "paragraphs": paragraphs,
+        "thai_ratio": thai_ratio
+    }
+
+    chunker = SentenceChunker(nlp=load_sentencizer())
+    results["sentence_chunker"] = _measure(chunker.chunk, text, repeat)
+
+    try:
+        import spacy
+        nlp = spacy.load(legacy_model)
+    except (ImportError, OSError) as e:
+        results["legacy_chunk_text"] = {"skipped": str(e)}
+    else:
+        # The original chunker fails outright on inputs above max_length
+        nlp.max_length = max(nlp.max_length, len(text) + 1)
+        results["legacy_chunk_text"] = _measure(lambda t: legacy_chunk_text(nlp, t), text, repeat)
+        results["speedup"] = round(results["legacy_chunk_text"]["seconds"] / results["sentence_chunker"]["seconds"], 2)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paragraphs", type=int, default=5000)
+    parser.add_argument("--thai-ratio", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--legacy-model", default="en_core_web_sm", help="spaCy model used by the original chunker")
+    args = parser.parse_args()
+    print(json.dumps(run(args.paragraphs, args.thai_ratio, args.repeat, args.legacy_model), indent=2))
+
+if __name__ == "__main__":
+    main()
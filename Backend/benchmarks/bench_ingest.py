@@ -0,0 +1,144 @@
+"""Measure ``DocumentProcessor.process_file`` throughput per file format.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_ingest --files 20 --paragraphs 200
+
+Synthetic files are generated for every format whose writer library is
+installed and processed with the cache disabled. Images are only included
+with ``--images`` because captioning loads BLIP. Prints one JSON object.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from benchmarks.bench_chunking import make_corpus
+
+def _write_text(path: Path, text: str):
+    path.write_text(text, encoding="utf-8")
+
+def _write_csv(path: Path, text: str):
+    rng = random.Random(0)
+    words = text.split()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("id,customer,product,amount,note\n")
+        for i in range(len(words) // 4):
+            f.write(f"{i},Customer {rng.randint(1, 500)},{words[i]},{rng.random() * 1000:.2f},{' '.join(words[i:i + 6])}\n")
+
+def _write_xlsx(path: Path, text: str):
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Data")
+    sheet.append(["id", "word", "context"])
+    words = text.split()
+    for i in range(len(words) // 4):
+        sheet.append([i, words[i], " ".join(words[i:i + 8])])
+    workbook.save(path)
+
+def _write_docx(path: Path, text: str):
+    import docx
+    document = docx.Document()
+    for paragraph in text.split("\n\n"):
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+def _write_pptx(path: Path, text: str):
+    from pptx import Presentation
+    presentation = Presentation()
+    for paragraph in text.split("\n\n"):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.placeholders[1].text = paragraph
+    presentation.save(path)
+
+def _write_pdf(path: Path, text: str):
+    import fitz  # PyMuPDF
+    document = fitz.open()
+    paragraphs = text.split("\n\n")
+    for start in range(0, len(paragraphs), 8):
+        page = document.new_page()
+        page.insert_textbox(fitz.Rect(40, 40, 560, 800), "\n".join(paragraphs[start:start + 8]), fontsize=9)
+    document.save(path)
+
+def _write_json(path: Path, text: str):
+    path.write_text(json.dumps({"paragraphs": text.split("\n\n")}, ensure_ascii=False), encoding="utf-8")
+
+def _write_html(path: Path, text: str):
+    body = "".join(f"<p>{paragraph}</p>" for paragraph in text.split("\n\n"))
+    path.write_text(f"<html><body>{body}</body></html>", encoding="utf-8")
+
+def _write_png(path: Path, text: str):
+    from PIL import Image, ImageDraw
+    image = Image.new("RGB", (1600, 1200), "white")
+    ImageDraw.Draw(image).multiline_text((40, 40), "\n".join(text.split("\n\n")[:20])[:2000], fill="black")
+    image.save(path)
+
+WRITERS: Dict[str, Callable[[Path, str], None]] = {
+    ".txt": _write_text,
+    ".md": _write_text,
+    ".csv": _write_csv,
+    ".xlsx": _write_xlsx,
+    ".docx": _write_docx,
+    ".pptx": _write_pptx,
+    ".pdf": _write_pdf,
+    ".json": _write_json,
+    ".html": _write_html,
+    ".png": _write_png
+}
+
+def run(files: int, paragraphs: int, images: bool, formats: List[str]) -> Dict[str, Any]:
+    from core.cache import ProcessingCache
+    from core.document_processor import DocumentProcessor
+
+    results: Dict[str, Any] = {"files_per_format": files, "paragraphs": paragraphs}
+    with tempfile.TemporaryDirectory() as tmp:
+        processor = DocumentProcessor(cache=ProcessingCache(cache_dir=Path(tmp) / "cache"))
+        for ext in formats:
+            if ext == ".png" and not images:
+                results[ext] = {"skipped": "pass --images to include captioning"}
+                continue
+            paths = []
+            try:
+                for i in range(files):
+                    path = Path(tmp) / f"sample_{i}{ext}"
+                    WRITERS[ext](path, make_corpus(paragraphs, thai_ratio=0.2, seed=i))
+                    paths.append(path)
+            except ImportError as e:
+                results[ext] = {"skipped": str(e)}
+                continue
+
+            chunks = 0
+            started = time.perf_counter()
+            for path in paths:
+                _, metadata = processor.process_file(str(path), use_cache=False)
+                chunks += len(metadata.get("chunks", []))
+            seconds = time.perf_counter() - started
+            size = sum(os.path.getsize(path) for path in paths)
+            results[ext] = {
+                "seconds": round(seconds, 3),
+                "files_per_second": round(len(paths) / seconds, 2),
+                "mb_per_second": round(size / seconds / 1e6, 3),
+                "chunks_per_second": round(chunks / seconds, 1),
+                "ms_per_file": round(seconds / len(paths) * 1000, 2)
+            }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=10, help="files per format")
+    parser.add_argument("--paragraphs", type=int, default=200, help="paragraphs per file")
+    parser.add_argument("--formats", default=",".join(WRITERS), help="comma-separated extensions")
+    parser.add_argument("--images", action="store_true", help="include image OCR and captioning")
+    args = parser.parse_args()
+    try:
+        results = run(args.files, args.paragraphs, args.images, args.formats.split(","))
+    except ImportError as e:
+        results = {"skipped": str(e)}
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
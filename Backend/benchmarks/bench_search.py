@@ -0,0 +1,95 @@
+"""Measure hybrid document search latency.
+
+Run from the Backend directory:
+
+    python -m benchmarks.bench_search --documents 2000 --queries 200
+
+Synthetic documents are stored through ``MemoryManager.store_documents``
+into a scratch Postgres database and the embedded vector store, embedded
+with a hashing stand-in for the e5 model. Every query is run once cold and
+once more to measure the result cache. Prints one JSON object.
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.bench_chunking import WORDS, make_corpus
+from benchmarks.support import HashingEmbedder, fake_redis_pool, latency_summary, local_postgres, override_settings
+
+def _documents(start: int, count: int, chunks_per_document: int, embedder: HashingEmbedder) -> List[Dict[str, Any]]:
+    documents = []
+    for i in range(start, start + count):
+        chunks = make_corpus(chunks_per_document, thai_ratio=0.2, seed=i).split("\n\n")
+        documents.append({
+            "filename": f"doc_{i}.txt",
+            "file_type": ".txt",
+            "content": "\n\n".join(chunks),
+            "metadata": {"benchmark": True},
+            "chunks": chunks,
+            "chunk_embeddings": embedder.embed_documents(chunks)
+        })
+    return documents
+
+def run(documents: int, chunks_per_document: int, queries: int, limit: int, hybrid: bool) -> Dict[str, Any]:
+    embedder = HashingEmbedder()
+    with local_postgres() as postgres, \
+            tempfile.TemporaryDirectory() as data_dir, \
+            override_settings(VECTOR_STORE_BACKEND="local", VECTOR_STORE_DIR=Path(data_dir) / "vectors", SEARCH_HYBRID=hybrid, **postgres):
+        from core.memory import MemoryManager
+        memory = MemoryManager(embedder=embedder, redis_pool=fake_redis_pool())
+        try:
+            started = time.perf_counter()
+            for start in range(0, documents, 100):
+                memory.store_documents(_documents(start, min(100, documents - start), chunks_per_document, embedder))
+            store_seconds = time.perf_counter() - started
+
+            rng = random.Random(1)
+            query_texts = [" ".join(rng.sample(WORDS, 3)) + f" {i}" for i in range(queries)]
+            cold: List[float] = []
+            legs: Dict[str, List[float]] = {}
+            for query in query_texts:
+                timings: Dict[str, float] = {}
+                started = time.perf_counter()
+                memory.search_documents(query, limit, timings=timings)
+                cold.append(time.perf_counter() - started)
+                for name, milliseconds in timings.items():
+                    legs.setdefault(name, []).append(milliseconds / 1000)
+            cached: List[float] = []
+            for query in query_texts:
+                started = time.perf_counter()
+                memory.search_documents(query, limit)
+                cached.append(time.perf_counter() - started)
+        finally:
+            memory.close()
+
+    return {
+        "documents": documents,
+        "chunks": documents * chunks_per_document,
+        "hybrid": hybrid,
+        "store_seconds": round(store_seconds, 3),
+        "chunks_stored_per_second": round(documents * chunks_per_document / store_seconds, 1),
+        "search": latency_summary(cold),
+        "search_cached": latency_summary(cached),
+        "legs": {name: latency_summary(values) for name, values in legs.items()}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--chunks-per-document", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--vector-only", action="store_true", help="disable the full-text leg")
+    args = parser.parse_args()
+    try:
+        results = run(args.documents, args.chunks_per_document, args.queries, args.limit, hybrid=not args.vector_only)
+    except (ImportError, RuntimeError) as e:
+        results = {"skipped": str(e)}
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
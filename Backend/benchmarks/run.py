@@ -0,0 +1,100 @@
+"""Run the benchmark suite and write the results as JSON.
+
+Run from the Backend directory:
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --quick --compare results.json
+
+Every benchmark runs in its own process (they change settings and import
+the API). ``--compare`` prints the ratio of each numeric result to an
+earlier results file; for ``*_ms`` and ``seconds`` values lower is better,
+for rates higher is better.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+from typing import Any, Dict, Iterator, List, Tuple
+
+BENCHMARKS: Dict[str, Dict[str, List[str]]] = {
+    "chunking": {"full": [], "quick": ["--paragraphs", "1000", "--repeat", "1"]},
+    "ingest": {"full": [], "quick": ["--files", "3", "--paragraphs", "50"]},
+    "search": {"full": [], "quick": ["--documents", "200", "--queries", "50"]},
+    "chat": {"full": [], "quick": ["--requests", "16", "--concurrency", "4"]}
+}
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_benchmark(name: str, quick: bool) -> Dict[str, Any]:
+    args = BENCHMARKS[name]["quick" if quick else "full"]
+    process = subprocess.run(
+        [sys.executable, "-m", f"benchmarks.bench_{name}", *args],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    if process.returncode != 0:
+        return {"failed": process.stderr.strip().splitlines()[-1] if process.stderr.strip() else f"exit code {process.returncode}"}
+    # Some libraries (PyMuPDF) print warnings to stdout ahead of the report
+    lines = process.stdout.splitlines()
+    start = next((i for i, line in enumerate(lines) if line.startswith("{")), 0)
+    return json.loads("\n".join(lines[start:]))
+
+def _numbers(results: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, float]]:
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from _numbers(value, path)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]):
+    """Print current / previous for every numeric result present in both"""
+    before = dict(_numbers(previous.get("results", {})))
+    for path, value in _numbers(current.get("results", {})):
+        if path in before and before[path]:
+            print(f"{path:70} {before[path]:>12} -> {value:>12}  x{value / before[path]:.2f}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", help=f"comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="small inputs for a fast smoke run")
+    parser.add_argument("--output", help="write the results to this file instead of stdout")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": args.quick
+        },
+        "results": {}
+    }
+    for name in names:
+        print(f"running {name}...", file=sys.stderr)
+        report["results"][name] = run_benchmark(name, args.quick)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""Local stand-ins and helpers shared by the benchmarks.
+
+Nothing here talks to the real LLM, Redis or ChromaDB: the LLM is a fake
+OpenAI-compatible server, Redis is fakeredis (with Lua support from
+``lupa``), vectors go to the embedded ``LocalVectorStore`` and Postgres is a
+throwaway cluster (or a scratch database on the configured server).
+"""
+import contextlib
+import hashlib
+import json
+import os
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from core.config import settings
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def latency_summary(seconds: List[float]) -> Dict[str, Any]:
+    """Percentiles of a list of durations, in milliseconds"""
+    if not seconds:
+        return {"count": 0}
+    ordered = sorted(seconds)
+
+    def percentile(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 2)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(ordered[-1] * 1000, 2)
+    }
+
+@contextlib.contextmanager
+def override_settings(**values: Any) -> Iterator[None]:
+    """Temporarily replace attributes of the global settings"""
+    previous = {name: getattr(settings, name) for name in values}
+    for name, value in values.items():
+        setattr(settings, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(settings, name, value)
+
+class FakeLLMServer:
+    """OpenAI-compatible ``/chat/completions`` endpoint with a fixed token rate.
+
+    Replies are ``reply_tokens`` canned words. The first token arrives after
+    ``first_token_latency`` seconds (prompt processing) and the rest at
+    ``tokens_per_second``; non-streaming requests take the same total time.
+    """
+
+    WORDS = "the quick brown fox jumps over a lazy dog".split()
+
+    def __init__(self, tokens_per_second: float = 50.0, reply_tokens: int = 64, first_token_latency: float = 0.1):
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.first_token_latency = first_token_latency
+        self.requests = 0
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def _tokens(self) -> List[str]:
+        return [self.WORDS[i % len(self.WORDS)] + " " for i in range(self.reply_tokens)]
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.0"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                fake.requests += 1
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                completion_id = f"chatcmpl-{fake.requests}"
+                tokens = fake._tokens()
+                if body.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.end_headers()
+                    time.sleep(fake.first_token_latency)
+                    for i, token in enumerate(tokens):
+                        if i:
+                            time.sleep(1 / fake.tokens_per_second)
+                        self._event(completion_id, {"content": token}, None)
+                    self._event(completion_id, {}, "stop")
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                    return
+                time.sleep(fake.first_token_latency + (len(tokens) - 1) / fake.tokens_per_second)
+                payload = json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _event(self, completion_id: str, delta: Dict[str, Any], finish_reason: Optional[str]):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": "fake",
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+        return Handler
+
+    def __enter__(self) -> "FakeLLMServer":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc: Any):
+        self._server.shutdown()
+        self._server.server_close()
+
+def fake_redis_pool():
+    """A connection pool backed by an in-process fakeredis server"""
+    import fakeredis
+    import redis
+    return redis.ConnectionPool(
+        connection_class=fakeredis.FakeConnection,
+        server=fakeredis.FakeServer(),
+        decode_responses=True
+    )
+
+class HashingEmbedder:
+    """Deterministic bag-of-words embeddings; stands in for the e5 model"""
+
+    _WORD = re.compile(r"\w+")
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in self._WORD.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self._embed(text) for text in texts])
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self._embed(text)
+
+def _postgres_bin() -> Optional[str]:
+    if os.environ.get("PG_BIN"):
+        return os.environ["PG_BIN"]
+    initdb = shutil.which("initdb")
+    return os.path.dirname(initdb) if initdb else None
+
+@contextlib.contextmanager
+def local_postgres() -> Iterator[Dict[str, Any]]:
+    """Settings for a scratch Postgres database, dropped afterwards.
+
+    Starts a throwaway cluster when the Postgres binaries are available
+    (on PATH or in ``PG_BIN``) and the process is not root; otherwise
+    creates a temporary database on the configured server.
+    """
+    import psycopg2
+
+    bin_dir = _postgres_bin()
+    if bin_dir and hasattr(os, "geteuid") and os.geteuid() != 0:
+        data_dir = tempfile.mkdtemp(prefix="owlynn-bench-pg-")
+        port = free_port()
+        try:
+            subprocess.run(
+                [os.path.join(bin_dir, "initdb"), "-D", data_dir, "-U", "bench", "--auth=trust", "-E", "UTF8", "--no-locale", "--no-sync"],
+                check=True, capture_output=True
+            )
+            subprocess.run(
+                [
+                    os.path.join(bin_dir, "pg_ctl"), "-D", data_dir, "-w", "-l", os.path.join(data_dir, "server.log"),
+                    "-o", f"-p {port} -k {data_dir} -c listen_addresses='' -c fsync=off", "start"
+                ],
+                check=True, capture_output=True
+            )
+            yield {"POSTGRES_HOST": data_dir, "POSTGRES_PORT": port, "POSTGRES_USER": "bench", "POSTGRES_PASSWORD": "", "POSTGRES_DB": "postgres"}
+        finally:
+            subprocess.run([os.path.join(bin_dir, "pg_ctl"), "-D", data_dir, "-m", "immediate", "stop"], capture_output=True)
+            shutil.rmtree(data_dir, ignore_errors=True)
+        return
+
+    server = {
+        "dbname": settings.POSTGRES_DB,
+        "user": settings.POSTGRES_USER,
+        "password": settings.POSTGRES_PASSWORD,
+        "host": settings.POSTGRES_HOST,
+        "port": settings.POSTGRES_PORT
+    }
+    try:
+        admin = psycopg2.connect(connect_timeout=3, **server)
+    except psycopg2.OperationalError as e:
+        raise RuntimeError(f"No Postgres available: install the server binaries or configure POSTGRES_* ({e})")
+    database = f"owlynn_bench_{os.getpid()}"
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f"CREATE DATABASE {database}")
+    try:
+        yield {"POSTGRES_DB": database}
+    finally:
+        with admin.cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {database} WITH (FORCE)")
+        admin.close()
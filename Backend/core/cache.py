@@ -0,0 +1,407 @@
+from typing import Dict, Any, Optional, Tuple, Hashable, List
+from collections import OrderedDict
+from pathlib import Path
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import unicodedata
+import numpy as np
+from core.config import settings
+
+_KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+def file_sha256(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """Hash a file's content without reading it into memory at once"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with an optional time-to-live"""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or (self.ttl is not None and time.monotonic() - item[0] > self.ttl):
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+class ProcessingCache:
+    """Content-addressed cache of document processing results in CACHE_DIR.
+
+    Each entry is a directory named after its key holding ``result.json``
+    (extracted text and metadata, including chunks and image metadata) and
+    optionally ``embeddings.npy``. Entries are evicted least recently used
+    first once the cache grows beyond ``max_bytes``.
+
+    The cache size is kept as a running total so writes only walk the
+    directory when eviction is due. Other processes write to the same
+    directory, so the total is also recounted every ``SCAN_INTERVAL`` writes.
+    """
+
+    SCAN_INTERVAL = 256
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = Path(cache_dir or settings.CACHE_DIR) / "processing"
+        self.max_bytes = max_bytes if max_bytes is not None else settings.CACHE_MAX_BYTES
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+        self._writes = 0
+
+    def _entry_dir(self, key: str) -> Path:
+        if not _KEY_PATTERN.fullmatch(key):
+            raise ValueError(f"Invalid cache key: {key}")
+        return self.cache_dir / key[:2] / key
+
+    def _write_atomic(self, path: Path, data: bytes):
+        tmp_path = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        self._replace(tmp_path, path)
+
+    def _replace(self, tmp_path: Path, path: Path):
+        """Move a written file into place and add its growth to the running size"""
+        growth = tmp_path.stat().st_size
+        try:
+            growth -= path.stat().st_size
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += growth
+            self._writes += 1
+
+    def _touch(self, entry: Path):
+        """Mark an entry as recently used"""
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            pass
+
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Return the cached ``(content, metadata)`` for ``key``, if any"""
+        entry = self._entry_dir(key)
+        try:
+            with open(entry / "result.json", "r", encoding="utf-8") as f:
+                result = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        self._touch(entry)
+        return result["content"], result["metadata"]
+
+    def put(self, key: str, content: str, metadata: Dict[str, Any]):
+        """Cache the processing result for ``key``"""
+        entry = self._entry_dir(key)
+        os.makedirs(entry, exist_ok=True)
+        payload = json.dumps({"content": content, "metadata": metadata}, ensure_ascii=False, default=str)
+        self._write_atomic(entry / "result.json", payload.encode("utf-8"))
+        self._evict()
+
+    def get_embeddings(self, key: str) -> Optional[np.ndarray]:
+        """Return the cached chunk embeddings for ``key``, if any"""
+        entry = self._entry_dir(key)
+        try:
+            embeddings = np.load(entry / "embeddings.npy")
+        except (FileNotFoundError, ValueError):
+            return None
+        self._touch(entry)
+        return embeddings
+
+    def put_embeddings(self, key: str, embeddings: np.ndarray):
+        """Cache the chunk embeddings for ``key``"""
+        entry = self._entry_dir(key)
+        os.makedirs(entry, exist_ok=True)
+        tmp_path = entry / f".embeddings.{threading.get_ident()}.tmp.npy"
+        np.save(tmp_path, np.asarray(embeddings, dtype=np.float32))
+        self._replace(tmp_path, entry / "embeddings.npy")
+        self._evict()
+
+    def invalidate(self, key: str) -> bool:
+        """Remove a single entry; returns whether it existed"""
+        if not _KEY_PATTERN.fullmatch(key):
+            return False
+        entry = self._entry_dir(key)
+        with self._lock:
+            try:
+                size = sum(f.stat().st_size for f in entry.iterdir())
+            except FileNotFoundError:
+                return False
+            shutil.rmtree(entry, ignore_errors=True)
+            self._size = max(self._size - size, 0)
+        return True
+
+    def clear(self) -> int:
+        """Remove every entry and return how many were removed"""
+        removed = 0
+        with self._lock:
+            for entry, _, _ in self._entries():
+                shutil.rmtree(entry, ignore_errors=True)
+                removed += 1
+            self._size = 0
+        return removed
+
+    def _entries(self):
+        """Yield ``(entry dir, last used, size in bytes)`` for every entry"""
+        for shard in self.cache_dir.iterdir():
+            if not shard.is_dir():
+                continue
+            for entry in shard.iterdir():
+                try:
+                    size = sum(f.stat().st_size for f in entry.iterdir())
+                    yield entry, entry.stat().st_mtime, size
+                except FileNotFoundError:
+                    continue
+
+    def stats(self) -> Dict[str, Any]:
+        """Number of entries and total size of the cache"""
+        entries = list(self._entries())
+        return {
+            "entries": len(entries),
+            "size_bytes": sum(size for _, _, size in entries),
+            "max_bytes": self.max_bytes
+        }
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits ``max_bytes``"""
+        with self._lock:
+            if self._size <= self.max_bytes and self._writes < self.SCAN_INTERVAL:
+                return
+            self._writes = 0
+            entries = sorted(self._entries(), key=lambda item: item[1])
+            total = sum(size for _, _, size in entries)
+            for entry, _, size in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+            self._size = total
+
+def normalize_prompt(prompt: str) -> str:
+    """Canonical form of a prompt for cache lookups"""
+    text = " ".join(unicodedata.normalize("NFKC", prompt).casefold().split())
+    return text.rstrip(" ?!.。")
+
+class ResponseCache:
+    """Redis-backed cache of LLM responses keyed by prompt and request context.
+
+    A prompt hits when its normalized form was answered before (exact) or,
+    with an embedder, when a cached prompt in the same context is at least
+    ``threshold`` cosine-similar (semantic). Contexts are also partitioned by
+    the embedding model and its vector size, so a model change never compares
+    vectors from different spaces. Entries expire after ``ttl``
+    seconds and the least recently used ones are evicted beyond
+    ``max_entries``. Each process mirrors the prompt embeddings of a context
+    and refreshes the mirror only when the context's version counter changes.
+    """
+
+    PREFIX = "rcache"
+
+    def __init__(
+        self,
+        redis_client: Any,
+        embedder: Optional[Any] = None,
+        threshold: Optional[float] = None,
+        ttl: Optional[int] = None,
+        max_entries: Optional[int] = None
+    ):
+        self.redis = redis_client
+        self.embedder = embedder
+        self.threshold = settings.RESPONSE_CACHE_THRESHOLD if threshold is None else threshold
+        self.ttl = ttl or settings.RESPONSE_CACHE_TTL
+        self.max_entries = max_entries or settings.RESPONSE_CACHE_MAX_ENTRIES
+        self._embeddings = LRUCache(1024)
+        self._mirrors: Dict[str, Tuple[Optional[str], List[str], Optional[np.ndarray]]] = {}
+        self._dimension: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.PREFIX,) + parts)
+
+    def _embedding_space(self) -> Optional[List[Any]]:
+        """Embedding model name and vector size, measured once per process"""
+        if self.embedder is None:
+            return None
+        if self._dimension is None:
+            self._dimension = int(np.asarray(self.embedder.embed_query("dimension")).shape[-1])
+        return [getattr(self.embedder, "model_name", settings.EMBEDDING_MODEL), self._dimension]
+
+    def namespace(self, context: Optional[Dict[str, Any]] = None) -> str:
+        """Cache partition for a model, embedding space and request context"""
+        payload = json.dumps([settings.LLM_MODEL, self._embedding_space(), context or {}], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def _embed(self, prompt: str) -> np.ndarray:
+        embedding = self._embeddings.get(prompt)
+        if embedding is None:
+            embedding = np.asarray(self.embedder.embed_query(prompt), dtype=np.float32)
+            self._embeddings.put(prompt, embedding)
+        return embedding
+
+    def _vectors(self, namespace: str) -> Tuple[List[str], Optional[np.ndarray]]:
+        """Entry ids and prompt embeddings of a namespace, from the local mirror"""
+        version = self.redis.get(self._key("version", namespace))
+        with self._lock:
+            mirror = self._mirrors.get(namespace)
+            if mirror is not None and mirror[0] == version:
+                return mirror[1], mirror[2]
+        stored = self.redis.hgetall(self._key("vectors", namespace))
+        ids = list(stored)
+        matrix = np.stack([np.frombuffer(base64.b64decode(stored[i]), dtype=np.float32) for i in ids]) if ids else None
+        with self._lock:
+            self._mirrors[namespace] = (version, ids, matrix)
+        return ids, matrix
+
+    def _hit(self, namespace: str, entry_id: str, entry: Dict[str, str], match: str, similarity: float) -> Dict[str, Any]:
+        saved = float(entry.get("generation_seconds") or 0)
+        pipe = self.redis.pipeline()
+        pipe.zadd(self._key("lru"), {f"{namespace}:{entry_id}": time.time()})
+        pipe.hincrby(self._key("stats"), f"hits_{match}", 1)
+        pipe.hincrbyfloat(self._key("stats"), "saved_seconds", saved)
+        pipe.execute()
+        return {"response": entry["response"], "match": match, "similarity": round(similarity, 4), "saved_seconds": saved}
+
+    def lookup(self, prompt: str, context: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Return the cached response for a prompt, if there is one"""
+        namespace = self.namespace(context)
+        normalized = normalize_prompt(prompt)
+        entry_id = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        entry = self.redis.hgetall(self._key("entry", namespace, entry_id))
+        if entry:
+            return self._hit(namespace, entry_id, entry, "exact", 1.0)
+
+        if self.embedder is not None and self.threshold < 1:
+            ids, matrix = self._vectors(namespace)
+            if ids:
+                similarities = matrix @ self._embed(normalized)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry = self.redis.hgetall(self._key("entry", namespace, ids[best]))
+                    if entry:
+                        return self._hit(namespace, ids[best], entry, "semantic", float(similarities[best]))
+                    # The entry expired; drop its vector
+                    self._remove([f"{namespace}:{ids[best]}"])
+
+        self.redis.hincrby(self._key("stats"), "misses", 1)
+        return None
+
+    def store(self, prompt: str, context: Optional[Dict[str, Any]], response: str, generation_seconds: float):
+        """Cache a generated response"""
+        namespace = self.namespace(context)
+        normalized = normalize_prompt(prompt)
+        entry_id = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        entry_key = self._key("entry", namespace, entry_id)
+        pipe = self.redis.pipeline()
+        pipe.hset(entry_key, mapping={
+            "prompt": normalized,
+            "response": response,
+            "generation_seconds": round(generation_seconds, 3),
+            "created": time.time()
+        })
+        pipe.expire(entry_key, self.ttl)
+        if self.embedder is not None:
+            vector = base64.b64encode(self._embed(normalized).tobytes()).decode("ascii")
+            pipe.hset(self._key("vectors", namespace), entry_id, vector)
+            pipe.incr(self._key("version", namespace))
+        pipe.zadd(self._key("lru"), {f"{namespace}:{entry_id}": time.time()})
+        pipe.hincrby(self._key("stats"), "stores", 1)
+        pipe.execute()
+        self._evict()
+
+    def _remove(self, members: List[str]):
+        """Delete entries given as ``<namespace>:<entry id>`` members"""
+        if not members:
+            return
+        pipe = self.redis.pipeline()
+        for member in members:
+            namespace, entry_id = member.split(":", 1)
+            pipe.delete(self._key("entry", namespace, entry_id))
+            pipe.hdel(self._key("vectors", namespace), entry_id)
+            pipe.incr(self._key("version", namespace))
+        pipe.zrem(self._key("lru"), *members)
+        pipe.execute()
+
+    def _evict(self):
+        """Forget expired entries and trim the cache to ``max_entries``"""
+        lru_key = self._key("lru")
+        expired = self.redis.zrangebyscore(lru_key, 0, time.time() - self.ttl)
+        self._remove(expired)
+        excess = self.redis.zcard(lru_key) - self.max_entries
+        if excess > 0:
+            evicted = [member for member, _ in self.redis.zpopmin(lru_key, excess)]
+            self._remove(evicted)
+            self.redis.hincrby(self._key("stats"), "evictions", len(evicted))
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit, miss and saved generation time counters"""
+        counters = self.redis.hgetall(self._key("stats"))
+        hits = int(counters.get("hits_exact", 0)) + int(counters.get("hits_semantic", 0))
+        misses = int(counters.get("misses", 0))
+        return {
+            "entries": self.redis.zcard(self._key("lru")),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits_exact": int(counters.get("hits_exact", 0)),
+            "hits_semantic": int(counters.get("hits_semantic", 0)),
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+            "stores": int(counters.get("stores", 0)),
+            "evictions": int(counters.get("evictions", 0)),
+            "saved_seconds": round(float(counters.get("saved_seconds", 0)), 3)
+        }
+
+    def clear(self) -> int:
+        """Remove every cached response and reset the counters"""
+        keys = list(self.redis.scan_iter(match=f"{self.PREFIX}:*"))
+        entries = self.redis.zcard(self._key("lru"))
+        if keys:
+            self.redis.delete(*keys)
+        with self._lock:
+            self._mirrors.clear()
+        return entries
+
+    async def alookup(self, prompt: str, context: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.lookup, prompt, context)
+
+    async def astore(self, prompt: str, context: Optional[Dict[str, Any]], response: str, generation_seconds: float):
+        await asyncio.to_thread(self.store, prompt, context, response, generation_seconds)
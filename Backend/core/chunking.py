@@ -0,0 +1,162 @@
+from typing import Iterable, Iterator, List, Optional, Tuple
+import re
+from core.config import settings
+from core.tokens import count_tokens
+
+_THAI_CHARS = re.compile(r"[฀-๿]")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+# Thai has no sentence punctuation; sentences and clauses are separated by spaces
+_THAI_BREAK = re.compile(r"(?<=[฀-๿\.\!\?])\s+(?=\S)")
+_WORD = re.compile(r"\S+\s*")
+
+def load_sentencizer():
+    """A spaCy pipeline with only the rule-based sentencizer.
+
+    No tagger, parser or NER runs, and no trained model is needed, so it is
+    much faster than a full pipeline and is not limited to English.
+    """
+    import spacy
+    nlp = spacy.blank("xx")
+    nlp.add_pipe("sentencizer")
+    # The sentencizer is linear in the input, so spaCy's length guard (meant
+    # for the parser's memory use) does not apply
+    nlp.max_length = 10 ** 9
+    return nlp
+
+_thai_tokenizer = None
+
+def _thai_sentences(text: str) -> List[str]:
+    """Split Thai text into sentences, using PyThaiNLP when it is installed"""
+    global _thai_tokenizer
+    if _thai_tokenizer is None:
+        try:
+            from pythainlp.tokenize import sent_tokenize
+            _thai_tokenizer = sent_tokenize
+        except ImportError:
+            _thai_tokenizer = False
+    if _thai_tokenizer:
+        try:
+            return [s for s in _thai_tokenizer(text) if s.strip()]
+        except Exception:
+            pass
+    return [s for s in _THAI_BREAK.split(text) if s.strip()]
+
+class SentenceChunker:
+    """Split text into sentence-aligned chunks of roughly ``chunk_tokens`` tokens.
+
+    Paragraphs are streamed through the sentencizer in batches, so memory
+    use does not depend on document size. Consecutive chunks share up to
+    ``overlap_tokens`` tokens of trailing sentences.
+    """
+
+    def __init__(
+        self,
+        chunk_tokens: Optional[int] = None,
+        overlap_tokens: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        nlp=None
+    ):
+        self.chunk_tokens = chunk_tokens or settings.CHUNK_TOKENS
+        self.overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+        self.batch_size = batch_size or settings.CHUNK_BATCH_SIZE
+        if self.overlap_tokens >= self.chunk_tokens:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+        self._nlp = nlp
+
+    @property
+    def nlp(self):
+        if self._nlp is not None:
+            return self._nlp
+        from core.models import model_manager
+        return model_manager.get("sentencizer")
+
+    def _paragraphs(self, texts: Iterable[str]) -> Iterator[str]:
+        for text in texts:
+            for paragraph in _PARAGRAPH_BREAK.split(text):
+                # Line breaks inside a paragraph are layout, not sentence ends
+                paragraph = " ".join(paragraph.split())
+                if paragraph:
+                    yield paragraph
+
+    def _batches(self, texts: Iterable[str]) -> Iterator[List[str]]:
+        batch: List[str] = []
+        for paragraph in self._paragraphs(texts):
+            batch.append(paragraph)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def split_sentences(self, paragraphs: List[str]) -> List[List[str]]:
+        """Run paragraphs through the sentencizer in this process"""
+        return [
+            [sent.text.strip() for sent in doc.sents if sent.text.strip()]
+            for doc in self.nlp.pipe(paragraphs)
+        ]
+
+    def _split(self, paragraphs: List[str]) -> List[List[str]]:
+        if not paragraphs:
+            return []
+        if self._nlp is not None:
+            return self.split_sentences(paragraphs)
+        from core.model_server import run_model
+        return run_model("sentences", paragraphs, self.split_sentences)
+
+    def sentences(self, texts: Iterable[str]) -> Iterator[str]:
+        """Yield the sentences of ``texts`` in order"""
+        for batch in self._batches(texts):
+            thai = [bool(_THAI_CHARS.search(paragraph)) for paragraph in batch]
+            other = iter(self._split([p for p, is_thai in zip(batch, thai) if not is_thai]))
+            for paragraph, is_thai in zip(batch, thai):
+                if is_thai:
+                    yield from _thai_sentences(paragraph)
+                else:
+                    yield from next(other)
+
+    def _split_long(self, sentence: str, tokens: int) -> Iterator[Tuple[str, int]]:
+        """Break a sentence longer than a chunk on word boundaries"""
+        words = _WORD.findall(sentence)
+        if len(words) <= 1:
+            # No spaces to split on (e.g. unsegmented Thai); cut by characters
+            step = max(1, len(sentence) * self.chunk_tokens // max(tokens, 1))
+            words = [sentence[i:i + step] for i in range(0, len(sentence), step)]
+        piece: List[str] = []
+        piece_tokens = 0
+        for word in words:
+            word_tokens = count_tokens(word)
+            if piece and piece_tokens + word_tokens > self.chunk_tokens:
+                yield "".join(piece).strip(), piece_tokens
+                piece, piece_tokens = [], 0
+            piece.append(word)
+            piece_tokens += word_tokens
+        if piece:
+            yield "".join(piece).strip(), piece_tokens
+
+    def iter_chunks(self, texts: Iterable[str]) -> Iterator[str]:
+        """Yield chunks for a stream of texts (e.g. pages) as they are read"""
+        current: List[Tuple[str, int]] = []
+        current_tokens = 0
+        for sentence in self.sentences(texts):
+            sentence_tokens = count_tokens(sentence)
+            pieces = self._split_long(sentence, sentence_tokens) if sentence_tokens > self.chunk_tokens else [(sentence, sentence_tokens)]
+            for piece, piece_tokens in pieces:
+                if current and current_tokens + piece_tokens > self.chunk_tokens:
+                    yield " ".join(text for text, _ in current)
+                    # Carry trailing sentences over as overlap
+                    overlap: List[Tuple[str, int]] = []
+                    overlap_tokens = 0
+                    for text, tokens in reversed(current):
+                        if overlap_tokens + tokens > self.overlap_tokens or overlap_tokens + tokens + piece_tokens > self.chunk_tokens:
+                            break
+                        overlap.insert(0, (text, tokens))
+                        overlap_tokens += tokens
+                    current, current_tokens = overlap, overlap_tokens
+                current.append((piece, piece_tokens))
+                current_tokens += piece_tokens
+        if current:
+            yield " ".join(text for text, _ in current)
+
+    def chunk(self, text: str) -> List[str]:
+        """Split a single text into chunks"""
+        return list(self.iter_chunks([text]))
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from pathlib import Path
 
 class Settings(BaseSettings):
@@ -7,35 +7,107 @@ class Settings(BaseSettings):
     APP_NAME: str = "OwlynnLocalAI"
     DEBUG: bool = False
     API_V1_STR: str = "/api/v1"
+    LOG_LEVEL: str = "INFO"
+    
+    # Observability
+    METRICS_ENABLED: bool = True  # Prometheus text format at /api/v1/metrics
+    TRACE_REQUESTS: bool = False  # log one line per request with its trace ID and stage timings
     
     # LLM Settings
     LLM_BASE_URL: str = "http://localhost:1234/v1"
     LLM_MODEL: str = "Qwen3-14B"
     LLM_TEMPERATURE: float = 0.65
     LLM_MAX_TOKENS: int = 8096
+    LLM_MAX_CONCURRENT: int = 2  # generations sent to the LLM server at once
+    LLM_MAX_QUEUE: int = 32  # requests waiting for a slot; more are rejected with 429
+    LLM_QUEUE_TIMEOUT: float = 60  # seconds a request may wait for a slot
+    LLM_COALESCE: bool = True  # identical in-flight requests share one generation
+    
+    # Context window
+    CONTEXT_TOKEN_BUDGET: int = 6144  # prompt tokens sent per turn
+    CONTEXT_MAX_MESSAGES: int = 200  # most recent messages loaded per turn
+    CONTEXT_SUMMARY_ENABLED: bool = True
+    CONTEXT_SUMMARY_BATCH: int = 8  # dropped messages rolled into the summary at once
+    CONTEXT_TOKENIZER: Optional[str] = None  # Hugging Face tokenizer; estimated when unset
     
     # Embeddings
     EMBEDDING_MODEL: str = "intfloat/multilingual-e5-large"
+    EMBEDDING_BATCH_SIZE: int = 32
+    EMBEDDING_NUM_THREADS: Optional[int] = None  # torch default when unset
+    EMBEDDING_DEVICE: str = "cpu"
     BLIP_MODEL: str = "Salesforce/blip-image-captioning-base"
     
+    # Model lifecycle
+    MODEL_IDLE_TIMEOUT: float = 900  # seconds before an unused model is unloaded; 0 keeps models resident
+    MODEL_IDLE_CHECK_INTERVAL: float = 60
+    MODEL_WARMUP: List[str] = []  # models loaded at startup, e.g. ["embedding"]
+    
+    # Shared model server (python -m core.model_server); unset keeps models in each process
+    MODEL_SERVER_ADDRESS: str = ""  # Unix socket path, e.g. "data/models.sock"
+    MODEL_SERVER_AUTHKEY: str = ""
+    MODEL_SERVER_BATCH_WINDOW: float = 0.005  # seconds a request waits for others to batch with
+    MODEL_SERVER_MAX_BATCH: int = 256  # texts per batched embedding or sentencizer call
+    MODEL_SERVER_TIMEOUT: float = 300
+    MODEL_SERVER_FALLBACK: bool = True  # load models in process while the server is unreachable
+    MODEL_SERVER_RETRY_SECONDS: float = 30
+    
     # Database
     POSTGRES_USER: str = "owlynn"
     POSTGRES_PASSWORD: str = "owlynn_password"
     POSTGRES_DB: str = "owlynn"
     POSTGRES_HOST: str = "localhost"
     POSTGRES_PORT: int = 5432
+    POSTGRES_POOL_MIN_SIZE: int = 1
+    POSTGRES_POOL_MAX_SIZE: int = 10
     
     # Redis
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
+    REDIS_MAX_CONNECTIONS: int = 50
+    CONVERSATION_CACHE_TTL: int = 86400  # 24 hours
+    
+    # Conversation retention
+    CONVERSATION_ARCHIVE_DAYS: int = 30  # idle sessions are compacted into one snapshot; 0 disables
+    CONVERSATION_RETENTION_DAYS: int = 365  # snapshots are deleted this long after the last message; 0 keeps them
+    CONVERSATION_RETENTION_INTERVAL: float = 3600  # seconds between retention runs; 0 disables the task
+    CONVERSATION_RETENTION_BATCH: int = 500  # sessions or rows per transaction
+    
+    # Response cache
+    RESPONSE_CACHE_ENABLED: bool = False
+    # Cosine similarity for a semantic hit; 1 allows exact hits only. E5 scores
+    # crowd the top of the range, so related but different questions can
+    # reach 0.95; rewordings of the same question score higher
+    RESPONSE_CACHE_THRESHOLD: float = 0.97
+    RESPONSE_CACHE_TTL: int = 86400
+    RESPONSE_CACHE_MAX_ENTRIES: int = 5000
+    RESPONSE_CACHE_FIRST_TURN_ONLY: bool = True  # later turns depend on the conversation history
     
     # Chroma
     CHROMA_HOST: str = "localhost"
     CHROMA_PORT: int = 8000
     CHROMA_AUTH_TOKEN: str = "chroma_token"
     
+    # Vector store
+    VECTOR_STORE_BACKEND: str = "chroma"  # "chroma" or "local" (embedded memory-mapped index)
+    VECTOR_STORE_DIR: Path = Path("data/vectors")
+    VECTOR_STORE_DTYPE: str = "float32"  # "int8" quarters the index size at a small recall cost
+    VECTOR_STORE_NLIST: int = 1024  # inverted lists (k-means centroids)
+    VECTOR_STORE_NPROBE: int = 16  # lists scanned per query
+    VECTOR_STORE_TRAIN_SIZE: int = 50000  # vectors stored before the lists are trained; exact search until then
+    VECTOR_STORE_BACKGROUND_TRAIN: bool = True  # train the lists in a background thread instead of inside add
+    VECTOR_STORE_COMPACT_RATIO: float = 0.5  # share of dead rows at which deletes compact the vector files
+    
+    # Search
+    SEARCH_HYBRID: bool = True  # fuse full-text matches with vector search
+    SEARCH_RRF_K: int = 60  # reciprocal-rank fusion constant
+    SEARCH_CHUNK_OVERSAMPLE: int = 3  # chunks fetched per requested document
+    SEARCH_SNIPPET_CHARS: int = 300
+    SEARCH_QUERY_CACHE_SIZE: int = 1024  # cached query embeddings
+    SEARCH_RESULT_CACHE_SIZE: int = 256  # cached result sets
+    SEARCH_RESULT_CACHE_TTL: float = 300  # seconds; bounds staleness across workers
+    
     # File Processing
-    MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB, for single-request uploads
     SUPPORTED_EXTENSIONS: Dict[str, Any] = {
         "text": [".txt", ".md"],
         "documents": [".pdf", ".docx", ".rtf"],
@@ -44,13 +116,61 @@ class Settings(BaseSettings):
         "code": [".py", ".js", ".json", ".yml", ".yaml", ".html", ".xml", ".css"],
         "images": [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff"]
     }
+    DOCUMENT_HANDLER_PLUGINS: List[str] = []  # modules that register extra format handlers on import
+    
+    # Chunking
+    CHUNK_TOKENS: int = 256
+    CHUNK_OVERLAP_TOKENS: int = 32
+    CHUNK_BATCH_SIZE: int = 64  # paragraphs per sentencizer batch
+    SPREADSHEET_BATCH_ROWS: int = 5000  # CSV rows read at a time
+    SPREADSHEET_PREVIEW_ROWS: int = 20  # rows per sheet kept in the document content
+    
+    # Near-duplicate chunks (SimHash); changing the distance requires re-fingerprinting
+    DEDUP_ENABLED: bool = True
+    DEDUP_MAX_DISTANCE: int = 3  # differing bits out of 64 for chunks to count as duplicates
+    DEDUP_MIN_FEATURES: int = 8  # shorter chunks must match exactly
+    DEDUP_DOCUMENT_THRESHOLD: float = 0.9  # duplicate share at which a document is linked to the one it repeats
+    
+    # Chunked uploads
+    MAX_UPLOAD_SIZE: int = 4 * 1024 * 1024 * 1024  # 4GB
+    UPLOAD_PART_SIZE: int = 8 * 1024 * 1024  # default part size offered to clients
+    UPLOAD_MAX_PART_SIZE: int = 64 * 1024 * 1024
+    UPLOAD_SESSION_TTL: float = 86400  # seconds an unfinished upload is kept after its last part
+    UPLOAD_STREAMING: bool = True  # index text and CSV uploads while their parts arrive
+    UPLOAD_MAX_STREAMING: int = 4  # uploads indexed while arriving at once; others wait for completion
+    UPLOAD_STREAM_BATCH: int = 64  # chunks embedded and stored together while streaming
+    UPLOAD_IDLE_TIMEOUT: float = 900  # seconds a streaming upload may send nothing before it is left to processing on completion; 0 waits forever
+    UPLOAD_EXPIRE_INTERVAL: float = 600  # seconds between removals of expired uploads; 0 removes them only when an upload starts
+    
+    # Background ingestion
+    INGESTION_WORKERS: int = 2  # worker processes for CPU-bound extraction
+    INGESTION_MAX_CONCURRENT: int = 2  # jobs in flight; the rest wait in the queue
+    INGESTION_WORKER_NICE: int = 10  # niceness increment for worker processes
+    INGESTION_JOB_HISTORY: int = 500  # finished jobs kept for status polling
     
     # OCR Settings
     TESSERACT_LANGUAGES: list = ["eng", "tha"]
     
+    # Images
+    IMAGE_CAPTION_MAX_SIDE: int = 512  # images are downscaled before BLIP (which uses 384px)
+    IMAGE_CAPTION_BATCH_SIZE: int = 8  # frames per BLIP generate call
+    IMAGE_CAPTION_MAX_TOKENS: int = 40
+    IMAGE_OCR_MAX_SIDE: int = 4000
+    IMAGE_OCR_WORKERS: Optional[int] = None  # Tesseract processes; CPU count when unset
+    IMAGE_MAX_FRAMES: int = 200  # pages read from multi-page TIFFs and GIFs
+    
+    # PDF extraction
+    PDF_MAX_PAGES: int = 2000
+    PDF_TIME_LIMIT: float = 600  # seconds per document
+    PDF_WORKERS: Optional[int] = None  # processes for large PDFs; CPU count when unset
+    PDF_PARALLEL_MIN_PAGES: int = 64  # smaller PDFs are extracted in-process
+    PDF_OCR_DPI: int = 200
+    PDF_OCR_MIN_CHARS: int = 20  # pages with less text and an image are OCRed
+    
     # Storage
     UPLOAD_DIR: Path = Path("uploads")
     CACHE_DIR: Path = Path("cache")
+    CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024  # 2GB
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,96 @@
+from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
+from core.config import settings
+from core.tokens import count_tokens
+from llm import Message
+
+# Fixed per-message cost of the chat template (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def message_tokens(message: Message) -> int:
+    """Token count of a message, cached in its metadata"""
+    if "token_count" not in message.metadata:
+        message.metadata["token_count"] = count_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+    return message.metadata["token_count"]
+
+class PromptWindow(BaseModel):
+    messages: List[Message] = Field(default_factory=list, description="Messages to send to the LLM, oldest first")
+    prompt_tokens: int = Field(0, description="Estimated size of the prompt in tokens")
+    dropped: List[Message] = Field(default_factory=list, description="Older messages that did not fit the budget")
+    first_kept: int = Field(0, description="Absolute position of the oldest kept history message in the session")
+    summary_used: bool = Field(False, description="Whether a summary of earlier turns was included")
+
+class ContextWindow:
+    """Fit a conversation into a fixed prompt token budget.
+
+    The newest messages are kept verbatim; older ones are replaced by the
+    session's cached summary when one exists.
+    """
+
+    def __init__(self, token_budget: Optional[int] = None):
+        self.token_budget = token_budget or settings.CONTEXT_TOKEN_BUDGET
+
+    def build(self, history: List[Message], new_message: Message, history_offset: int = 0, summary: Optional[Dict[str, Any]] = None) -> PromptWindow:
+        """Select the messages to send for ``new_message``.
+
+        ``history_offset`` is the absolute position of ``history[0]`` in the
+        session, used to line the history up with ``summary["upto"]``.
+        """
+        budget = self.token_budget - message_tokens(new_message)
+        summary_message = None
+        if summary and summary.get("content"):
+            summary_message = Message(
+                role="system",
+                content=f"Summary of the earlier conversation:\n{summary['content']}"
+            )
+
+        kept: List[Message] = []
+        used = 0
+        cut = len(history)
+        for i in range(len(history) - 1, -1, -1):
+            cost = message_tokens(history[i])
+            if used + cost > budget:
+                break
+            kept.append(history[i])
+            used += cost
+            cut = i
+        kept.reverse()
+        dropped = history[:cut]
+
+        # Fall back to the summary for whatever no longer fits, trimming more
+        # turns if the summary itself would overflow the budget
+        prefix: List[Message] = []
+        if summary_message is not None and (dropped or history_offset > 0):
+            summary_cost = message_tokens(summary_message)
+            while kept and used + summary_cost > budget:
+                used -= message_tokens(kept.pop(0))
+                dropped = history[:len(history) - len(kept)]
+            if used + summary_cost <= budget:
+                prefix = [summary_message]
+                used += summary_cost
+
+        return PromptWindow(
+            messages=prefix + kept + [new_message],
+            prompt_tokens=used + message_tokens(new_message),
+            dropped=dropped,
+            first_kept=history_offset + len(dropped),
+            summary_used=bool(prefix)
+        )
+
+SUMMARY_PROMPT = (
+    "Condense the conversation below into a short summary that preserves facts, "
+    "names, decisions and open questions the assistant may need later. "
+    "Write it in the language of the conversation."
+)
+
+async def summarize_messages(messages: List[Message], previous_summary: Optional[str] = None) -> str:
+    """Roll ``messages`` into a running summary using the local LLM"""
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from core.gateway import BACKGROUND
+    from llm import gateway
+
+    transcript = "\n".join(f"{msg.role}: {msg.content}" for msg in messages)
+    if previous_summary:
+        transcript = f"Earlier summary:\n{previous_summary}\n\nNew messages:\n{transcript}"
+    response = await gateway.ainvoke([SystemMessage(content=SUMMARY_PROMPT), HumanMessage(content=transcript)], priority=BACKGROUND)
+    return response.content
@@ -0,0 +1,155 @@
+"""Near-duplicate detection for document chunks.
+
+Every chunk gets a 64-bit SimHash of its word 3-grams (character 5-grams
+for short or unspaced text, such as Thai). Two chunks are near duplicates
+when their fingerprints differ in at most ``DEDUP_MAX_DISTANCE`` bits.
+To find candidates without comparing against every stored chunk, each
+fingerprint is split into at least ``DEDUP_MAX_DISTANCE + 1`` bands: two
+fingerprints within the distance must agree exactly on at least one band.
+"""
+from typing import Dict, Any, Optional, Callable, Iterable, List, NamedTuple, Tuple
+import hashlib
+import re
+from collections import Counter
+import numpy as np
+from core.config import settings
+
+_WORDS = re.compile(r"\w+")
+_BITS = np.arange(64, dtype=np.uint64)
+
+def _features(text: str) -> List[str]:
+    words = _WORDS.findall(text.lower())
+    if len(words) >= 8:
+        return [" ".join(words[i:i + 3]) for i in range(len(words) - 2)]
+    joined = " ".join(words)
+    if len(joined) <= 5:
+        return [joined] if joined else []
+    return [joined[i:i + 5] for i in range(len(joined) - 4)]
+
+def simhash(text: str) -> Tuple[int, int]:
+    """Signed 64-bit SimHash of ``text`` (fits a BIGINT) and its feature count"""
+    features = _features(text)
+    if not features:
+        return 0, 0
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little") for feature in features],
+        dtype=np.uint64
+    )
+    ones = ((hashes[:, None] >> _BITS) & np.uint64(1)).sum(axis=0)
+    value = sum(1 << i for i, count in enumerate(ones) if 2 * count > len(features))
+    return (value - (1 << 64) if value >= 1 << 63 else value), len(features)
+
+def hamming(a: int, b: int) -> int:
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count("1")
+
+def band_count(max_distance: Optional[int] = None) -> int:
+    """Bands per fingerprint; at least four keeps every band key within a 32-bit integer"""
+    return max(4, (settings.DEDUP_MAX_DISTANCE if max_distance is None else max_distance) + 1)
+
+def bands(fingerprint: int, count: Optional[int] = None) -> List[int]:
+    """Band keys of a fingerprint; each encodes the band's position and bits"""
+    count = count or band_count()
+    width = 64 // count
+    mask = (1 << width) - 1
+    unsigned = fingerprint & 0xFFFFFFFFFFFFFFFF
+    return [(i << width) | ((unsigned >> (i * width)) & mask) for i in range(count)]
+
+class ChunkRef(NamedTuple):
+    """A chunk by document and index; ``in_batch`` documents are positions in the batch being stored"""
+    document: int
+    chunk_index: int
+    in_batch: bool = False
+
+class DedupIndex:
+    """In-memory band index of fingerprints"""
+
+    def __init__(self, max_distance: Optional[int] = None):
+        self.max_distance = settings.DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+        self.band_count = band_count(self.max_distance)
+        self._bands: Dict[int, List[Tuple[int, ChunkRef]]] = {}
+
+    def add(self, fingerprint: int, ref: ChunkRef):
+        for key in bands(fingerprint, self.band_count):
+            self._bands.setdefault(key, []).append((fingerprint, ref))
+
+    def find(self, fingerprint: int, exact: bool = False) -> Optional[ChunkRef]:
+        """The first indexed chunk within the distance (identical with ``exact``)"""
+        limit = 0 if exact else self.max_distance
+        for key in bands(fingerprint, self.band_count):
+            for candidate, ref in self._bands.get(key, ()):
+                if hamming(candidate, fingerprint) <= limit:
+                    return ref
+        return None
+
+class DedupPlan(NamedTuple):
+    """Fingerprints of a document's chunks and, per chunk, the chunk it duplicates"""
+    fingerprints: List[int]
+    duplicates: List[Optional[ChunkRef]]
+
+    @property
+    def canonical(self) -> List[int]:
+        """Indexes of the chunks that are not duplicates and need embedding"""
+        return [i for i, duplicate in enumerate(self.duplicates) if duplicate is None]
+
+    def summary(self, batch_ids: Optional[List[int]] = None, document_id: Optional[int] = None) -> Dict[str, Any]:
+        """Duplicate counts, and the other document most chunks repeat once the ratio reaches the threshold
+        
+        ``batch_ids`` resolves in-batch references to the stored ids; without
+        it only previously stored documents are named.
+        """
+        duplicates = [ref for ref in self.duplicates if ref is not None]
+        chunks = len(self.duplicates)
+        ratio = len(duplicates) / chunks if chunks else 0.0
+        summary: Dict[str, Any] = {"chunks": chunks, "duplicate_chunks": len(duplicates), "ratio": round(ratio, 4)}
+        if duplicates and ratio >= settings.DEDUP_DOCUMENT_THRESHOLD:
+            targets = Counter(
+                batch_ids[ref.document] if ref.in_batch else ref.document
+                for ref in duplicates if batch_ids or not ref.in_batch
+            )
+            targets.pop(document_id, None)
+            if targets:
+                summary["duplicate_of"] = targets.most_common(1)[0][0]
+        return summary
+
+class ChunkDeduplicator:
+    """Plan which chunks of a batch of documents duplicate stored or earlier chunks.
+
+    ``lookup`` receives band keys and returns ``(document_id, chunk_index,
+    fingerprint)`` for the stored canonical chunks sharing any of them.
+    Chunks with fewer than ``DEDUP_MIN_FEATURES`` features only match
+    identical fingerprints, since a few words say little about similarity.
+    """
+
+    def __init__(
+        self,
+        lookup: Callable[[List[int]], Iterable[Tuple[int, int, int]]],
+        max_distance: Optional[int] = None,
+        min_features: Optional[int] = None
+    ):
+        self.lookup = lookup
+        self.max_distance = settings.DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+        self.min_features = settings.DEDUP_MIN_FEATURES if min_features is None else min_features
+
+    def plan(self, documents: List[List[str]]) -> List[DedupPlan]:
+        hashed = [[simhash(chunk) for chunk in chunks] for chunks in documents]
+        index = DedupIndex(self.max_distance)
+        keys = sorted({key for chunks in hashed for fingerprint, _ in chunks for key in bands(fingerprint, index.band_count)})
+        stored = DedupIndex(self.max_distance)
+        for document_id, chunk_index, fingerprint in (self.lookup(keys) if keys else []):
+            stored.add(fingerprint, ChunkRef(document_id, chunk_index))
+
+        plans = []
+        for position, chunks in enumerate(hashed):
+            duplicates: List[Optional[ChunkRef]] = []
+            for chunk_index, (fingerprint, features) in enumerate(chunks):
+                if not features:
+                    # Nothing to compare; empty chunks are kept as they are
+                    duplicates.append(None)
+                    continue
+                exact = features < self.min_features
+                duplicate = stored.find(fingerprint, exact) or index.find(fingerprint, exact)
+                if duplicate is None:
+                    index.add(fingerprint, ChunkRef(position, chunk_index, in_batch=True))
+                duplicates.append(duplicate)
+            plans.append(DedupPlan([fingerprint for fingerprint, _ in chunks], duplicates))
+        return plans
@@ -1,36 +1,83 @@
 import os
+import hashlib
+import time
 from typing import Dict, Any, Optional, List, Tuple
-import fitz  # PyMuPDF
-import docx
-from striprtf.striprtf import rtf_to_text
-import pandas as pd
-from pptx import Presentation
-import json
-import yaml
-from bs4 import BeautifulSoup
-import pytesseract
-from PIL import Image
-import cv2
-import numpy as np
-from transformers import BlipProcessor, BlipForConditionalGeneration
-import spacy
 from core.config import settings
+from core.cache import ProcessingCache, file_sha256
+from core.models import ModelManager, model_manager
+from core.chunking import SentenceChunker
+from core.handlers import FormatHandler, HandlerRegistry, registry as default_registry
 
 class DocumentProcessor:
-    def __init__(self):
-        # Initialize BLIP for image captioning
-        self.blip_processor = BlipProcessor.from_pretrained(settings.BLIP_MODEL)
-        self.blip_model = BlipForConditionalGeneration.from_pretrained(settings.BLIP_MODEL)
-        
-        # Initialize spaCy for text chunking
-        self.nlp = spacy.load("en_core_web_sm")
+    # Bump whenever extraction or chunking output changes so cached results
+    # from older versions are no longer used
+    VERSION = "5"
+    
+    def __init__(self, cache: Optional[ProcessingCache] = None, models: Optional[ModelManager] = None, handlers: Optional[HandlerRegistry] = None):
+        # BLIP (image captioning) and the sentencizer (chunking) load on first use
+        self.models = models or model_manager
+        self.chunker = SentenceChunker()
+        self.handlers = handlers or default_registry
+        self.handlers.load_plugins()
+        self._images = None
+        self._pdf = None
+        self._chunk_seconds = 0.0
         
         # Create necessary directories
         os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
         os.makedirs(settings.CACHE_DIR, exist_ok=True)
+        self.cache = cache or ProcessingCache()
+    
+    @property
+    def images(self):
+        """Image OCR and captioning pipeline, created on first use (it imports OpenCV)"""
+        if self._images is None:
+            from core.images import ImagePipeline
+            self._images = ImagePipeline(models=self.models)
+        return self._images
+    
+    @property
+    def pdf(self):
+        """PDF page extractor, created on first use so its process pool is shared by every PDF"""
+        if self._pdf is None:
+            from core.pdf import PdfExtractor
+            self._pdf = PdfExtractor()
+        return self._pdf
+    
+    def close(self):
+        """Stop the image OCR and PDF process pools, if they were started"""
+        if self._images is not None:
+            self._images.close()
+        if self._pdf is not None:
+            self._pdf.close()
+    
+    def supported_extensions(self) -> List[str]:
+        return self.handlers.extensions()
+    
+    def handler_for(self, file_path: str) -> Optional[FormatHandler]:
+        return self.handlers.get(os.path.splitext(file_path)[1])
+    
+    def cache_key(self, file_path: str, ocr: bool = True, caption: bool = True) -> str:
+        """Key a file by its content plus everything that shapes the output"""
+        file_ext = os.path.splitext(file_path)[1].lower()
+        fingerprint = "|".join([
+            file_sha256(file_path),
+            file_ext,
+            getattr(self.handler_for(file_path), "name", ""),
+            self.VERSION,
+            settings.BLIP_MODEL,
+            settings.EMBEDDING_MODEL,
+            "+".join(settings.TESSERACT_LANGUAGES),
+            f"ocr={int(ocr)},caption={int(caption)}"
+        ])
+        return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
     
-    def process_file(self, file_path: str) -> Tuple[str, Dict[str, Any]]:
-        """Process a file and return its content and metadata"""
+    def process_file(self, file_path: str, use_cache: bool = True, ocr: bool = True, caption: bool = True) -> Tuple[str, Dict[str, Any]]:
+        """Process a file and return its content and metadata
+        
+        ``ocr`` and ``caption`` switch off Tesseract (for images and scanned
+        PDF pages) and BLIP captioning (for images).
+        """
         file_ext = os.path.splitext(file_path)[1].lower()
         content = ""
         metadata = {
@@ -39,131 +86,58 @@ class DocumentProcessor:
             "file_size": os.path.getsize(file_path)
         }
         
+        cache_key = self.cache_key(file_path, ocr, caption) if use_cache else None
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached:
+                content, cached_metadata = cached
+                return content, {**cached_metadata, **metadata, "cache_key": cache_key, "cache_hit": True}
+        
+        self._chunk_seconds = 0.0
+        started = time.perf_counter()
         try:
-            if file_ext in settings.SUPPORTED_EXTENSIONS["text"]:
-                content = self._process_text_file(file_path)
-            elif file_ext in settings.SUPPORTED_EXTENSIONS["documents"]:
-                content = self._process_document(file_path, file_ext)
-            elif file_ext in settings.SUPPORTED_EXTENSIONS["spreadsheets"]:
-                content = self._process_spreadsheet(file_path, file_ext)
-            elif file_ext in settings.SUPPORTED_EXTENSIONS["presentations"]:
-                content = self._process_presentation(file_path)
-            elif file_ext in settings.SUPPORTED_EXTENSIONS["code"]:
-                content = self._process_code_file(file_path, file_ext)
-            elif file_ext in settings.SUPPORTED_EXTENSIONS["images"]:
-                content, image_metadata = self._process_image(file_path)
-                metadata.update(image_metadata)
-            else:
+            handler = self.handlers.get(file_ext)
+            if handler is None:
                 raise ValueError(f"Unsupported file type: {file_ext}")
+            content, handler_metadata = handler.func(self, file_path, ocr=ocr, caption=caption)
+            metadata.update(handler_metadata)
+            metadata["handler"] = handler.name
+            
+            # Chunk the content, unless the handler already produced chunks
+            if "chunks" not in metadata:
+                metadata["chunks"] = self._chunk_text(content)
             
-            # Chunk the content
-            chunks = self._chunk_text(content)
-            metadata["chunks"] = chunks
+            # Seconds per stage, reported to the metrics by the API process;
+            # chunking interleaved with extraction (PDF pages) is split out
+            metadata["timings"] = {
+                "parse": round(time.perf_counter() - started - self._chunk_seconds, 4),
+                "chunk": round(self._chunk_seconds, 4),
+                **metadata.get("image_seconds", {})
+            }
             
+            if cache_key:
+                self.cache.put(cache_key, content, metadata)
+                metadata["cache_key"] = cache_key
+            metadata["cache_hit"] = False
             return content, metadata
             
         except Exception as e:
             raise Exception(f"Error processing file {file_path}: {str(e)}")
     
-    def _process_text_file(self, file_path: str) -> str:
-        """Process plain text files"""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
-    
-    def _process_document(self, file_path: str, file_ext: str) -> str:
-        """Process PDF, DOCX, and RTF files"""
-        if file_ext == '.pdf':
-            doc = fitz.open(file_path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            return text
-        elif file_ext == '.docx':
-            doc = docx.Document(file_path)
-            return "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        elif file_ext == '.rtf':
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return rtf_to_text(f.read())
-    
-    def _process_spreadsheet(self, file_path: str, file_ext: str) -> str:
-        """Process CSV and Excel files"""
-        if file_ext == '.csv':
-            df = pd.read_csv(file_path)
-        else:  # .xlsx
-            df = pd.read_excel(file_path)
-        return df.to_string()
-    
-    def _process_presentation(self, file_path: str) -> str:
-        """Process PowerPoint files"""
-        prs = Presentation(file_path)
-        text = []
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text.append(shape.text)
-        return "\n".join(text)
-    
-    def _process_code_file(self, file_path: str, file_ext: str) -> str:
-        """Process code files"""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        if file_ext in ['.json']:
-            # Pretty print JSON
-            return json.dumps(json.loads(content), indent=2)
-        elif file_ext in ['.yml', '.yaml']:
-            # Pretty print YAML
-            return yaml.dump(yaml.safe_load(content), default_flow_style=False)
-        elif file_ext in ['.html', '.xml']:
-            # Clean HTML/XML
-            soup = BeautifulSoup(content, 'lxml')
-            return soup.prettify()
-        else:
-            return content
-    
-    def _process_image(self, file_path: str) -> Tuple[str, Dict[str, Any]]:
-        """Process image files with OCR and captioning"""
-        # Read image
-        image = Image.open(file_path)
-        
-        # Perform OCR
-        ocr_text = pytesseract.image_to_string(image, lang='+'.join(settings.TESSERACT_LANGUAGES))
-        
-        # Generate image caption
-        inputs = self.blip_processor(image, return_tensors="pt")
-        out = self.blip_model.generate(**inputs)
-        caption = self.blip_processor.decode(out[0], skip_special_tokens=True)
-        
-        # Extract image metadata
-        metadata = {
-            "dimensions": image.size,
-            "format": image.format,
-            "mode": image.mode,
-            "caption": caption
-        }
-        
-        return f"OCR Text:\n{ocr_text}\n\nCaption:\n{caption}", metadata
-    
-    def _chunk_text(self, text: str, chunk_size: int = 1000) -> List[str]:
-        """Split text into chunks using spaCy"""
-        doc = self.nlp(text)
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        
-        for sent in doc.sents:
-            sent_text = sent.text.strip()
-            sent_size = len(sent_text)
-            
-            if current_size + sent_size > chunk_size and current_chunk:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = [sent_text]
-                current_size = sent_size
-            else:
-                current_chunk.append(sent_text)
-                current_size += sent_size
-        
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
-        
-        return chunks 
\ No newline at end of file
+    def _chunk_text(self, text: str) -> List[str]:
+        """Split text into sentence-aligned, token-sized chunks"""
+        started = time.perf_counter()
+        try:
+            return self.chunker.chunk(text)
+        finally:
+            self._chunk_seconds += time.perf_counter() - started
+
+# One processor per ingestion worker process, created on first use
+_worker_processor: Optional[DocumentProcessor] = None
+
+def process_file_in_worker(file_path: str, use_cache: bool = True, ocr: bool = True, caption: bool = True) -> Tuple[str, Dict[str, Any]]:
+    """Entry point for running process_file in a worker process"""
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DocumentProcessor()
+    return _worker_processor.process_file(file_path, use_cache=use_cache, ocr=ocr, caption=caption)
@@ -0,0 +1,49 @@
+from typing import List, Optional
+import numpy as np
+from core.config import settings
+from core.models import ModelManager, model_manager
+from core.model_server import run_model
+
+class EmbeddingPipeline:
+    """Batched sentence embeddings for document chunks and search queries"""
+
+    def __init__(self, models: Optional[ModelManager] = None, batch_size: Optional[int] = None):
+        self.models = models or model_manager
+        self.model_name = settings.EMBEDDING_MODEL
+        self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+
+    @property
+    def model(self):
+        """The sentence-transformers model, loaded on first use"""
+        return self.models.get("embedding")
+
+    def _prefix(self, kind: str) -> str:
+        """E5 models expect inputs to be marked as queries or passages"""
+        return f"{kind}: " if "e5" in self.model_name.lower() else ""
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        # A private model manager (tests, benchmarks) always runs in process
+        if self.models is not model_manager:
+            return self.encode(texts)
+        return run_model("embed", texts, self.encode)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed already-prefixed texts with the model in this process"""
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        ).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """Embed document chunks in batches of ``batch_size``"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        prefix = self._prefix("passage")
+        return self._encode([prefix + text for text in texts])
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Embed a single search query"""
+        return self._encode([self._prefix("query") + text])[0]
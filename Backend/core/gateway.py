@@ -0,0 +1,269 @@
+from typing import Dict, Any, Optional, AsyncIterator, Callable, List, Tuple
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import time
+from contextlib import asynccontextmanager
+from core.config import settings
+from core.metrics import metrics
+
+# Lower runs first: chat replies ahead of summaries and other background work
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+LLM_QUEUE_DEPTH = metrics.gauge("owlynn_llm_queue_depth", "Requests waiting for an LLM slot")
+LLM_ACTIVE = metrics.gauge("owlynn_llm_active", "Generations running on the LLM server")
+LLM_QUEUE_WAIT_SECONDS = metrics.histogram(
+    "owlynn_llm_queue_wait_seconds", "Time requests waited for an LLM slot", ["priority"]
+)
+LLM_REQUESTS = metrics.counter(
+    "owlynn_llm_requests_total", "LLM requests by outcome (admitted, coalesced, rejected, timeout)", ["priority", "outcome"]
+)
+
+class LLMSaturated(Exception):
+    """The LLM wait queue is full, or a request waited too long for a slot"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def request_key(messages: List[Any]) -> str:
+    """Identify a request by its message types and contents"""
+    payload = [(type(msg).__name__, msg.content) for msg in messages]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+class _Flight:
+    """One generation shared by every identical request that arrives while it runs.
+
+    Chunks (or the single result) are kept so late joiners replay what they
+    missed. The generation is cancelled once nobody is listening any more.
+    """
+
+    def __init__(self, priority: int = INTERACTIVE):
+        self.priority = priority
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.queue_seconds: Optional[float] = None
+        self.listeners = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    async def push(self, chunk: Any):
+        async with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None):
+        async with self._changed:
+            self.done = True
+            self.error = error
+            self._changed.notify_all()
+
+    async def subscribe(self, timings: Optional[Dict[str, Any]] = None) -> AsyncIterator[Any]:
+        self.listeners += 1
+        try:
+            position = 0
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(lambda: len(self.chunks) > position or self.done)
+                    pending = self.chunks[position:]
+                    position = len(self.chunks)
+                    finished = self.done
+                if timings is not None and self.queue_seconds is not None:
+                    timings["queue"] = self.queue_seconds
+                for chunk in pending:
+                    yield chunk
+                if finished:
+                    if self.error is not None:
+                        raise self.error
+                    return
+        finally:
+            self.listeners -= 1
+            if self.listeners == 0 and self.task is not None and not self.task.done():
+                self.task.cancel()
+
+class LLMGateway:
+    """Admission control in front of the LLM client.
+
+    At most ``max_concurrent`` generations run at once; up to ``max_queue``
+    more wait in priority order and anything beyond that is rejected with
+    ``LLMSaturated`` straight away, as is a request still waiting after
+    ``queue_timeout`` seconds. With ``coalesce``, a request identical to
+    one in flight shares its generation instead of queueing again.
+    
+    Pass either a chat ``client`` or a ``client_factory`` that creates it on
+    the first generation.
+    """
+
+    def __init__(
+        self,
+        client: Any = None,
+        max_concurrent: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        coalesce: Optional[bool] = None,
+        client_factory: Optional[Callable[[], Any]] = None
+    ):
+        if client is None and client_factory is None:
+            raise ValueError("LLMGateway needs a client or a client_factory")
+        self._client = client
+        self._client_factory = client_factory
+        self.max_concurrent = max_concurrent or settings.LLM_MAX_CONCURRENT
+        self.max_queue = settings.LLM_MAX_QUEUE if max_queue is None else max_queue
+        self.queue_timeout = queue_timeout or settings.LLM_QUEUE_TIMEOUT
+        self.coalesce = settings.LLM_COALESCE if coalesce is None else coalesce
+        self._active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._flights: Dict[Tuple[str, str], _Flight] = {}
+        # Moving average of how long a generation holds its slot, for Retry-After
+        self._slot_seconds: Optional[float] = None
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to be free for a new request"""
+        per_slot = self._slot_seconds or 10.0
+        return max(1, math.ceil(per_slot * (len(self._waiters) + 1) / self.max_concurrent))
+
+    def _reject(self, priority: int, outcome: str, message: str):
+        LLM_REQUESTS.inc(priority=PRIORITY_NAMES[priority], outcome=outcome)
+        raise LLMSaturated(message, self.retry_after())
+
+    def check_admission(self, priority: int = INTERACTIVE):
+        """Fail fast when a new request would be rejected, e.g. before a stream starts"""
+        if self._active >= self.max_concurrent and len(self._waiters) >= self.max_queue:
+            self._reject(priority, "rejected", "The LLM is busy, try again later")
+
+    def _update_gauges(self):
+        LLM_QUEUE_DEPTH.set(len(self._waiters))
+        LLM_ACTIVE.set(self._active)
+
+    def _release(self):
+        """Hand the slot to the best waiter, or free it"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                self._update_gauges()
+                return
+        self._active -= 1
+        self._update_gauges()
+
+    async def _acquire(self, priority: int) -> float:
+        """Wait for a slot and return the time spent waiting"""
+        started = time.perf_counter()
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+        else:
+            if len(self._waiters) >= self.max_queue:
+                self._reject(priority, "rejected", "The LLM is busy, try again later")
+            future = asyncio.get_running_loop().create_future()
+            entry = (priority, next(self._order), future)
+            heapq.heappush(self._waiters, entry)
+            self._update_gauges()
+            try:
+                await asyncio.wait_for(future, self.queue_timeout)
+            except BaseException as e:
+                if future.done() and not future.cancelled():
+                    # The slot was handed over just as the wait ended
+                    self._release()
+                elif entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._update_gauges()
+                if isinstance(e, asyncio.TimeoutError):
+                    self._reject(priority, "timeout", f"No LLM slot became free within {self.queue_timeout:g}s")
+                raise
+        waited = time.perf_counter() - started
+        LLM_QUEUE_WAIT_SECONDS.observe(waited, priority=PRIORITY_NAMES[priority])
+        LLM_REQUESTS.inc(priority=PRIORITY_NAMES[priority], outcome="admitted")
+        self._update_gauges()
+        return waited
+
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE):
+        """Hold one of the concurrent generation slots; yields the queue wait in seconds"""
+        waited = await self._acquire(priority)
+        started = time.perf_counter()
+        try:
+            yield waited
+        finally:
+            held = time.perf_counter() - started
+            self._slot_seconds = held if self._slot_seconds is None else 0.8 * self._slot_seconds + 0.2 * held
+            self._release()
+
+    async def _generate(self, flight: _Flight, messages: List[Any], priority: int, stream: bool, kwargs: Dict[str, Any]):
+        try:
+            async with self.slot(priority) as waited:
+                flight.queue_seconds = waited
+                if stream:
+                    async for chunk in self.client.astream(messages, **kwargs):
+                        await flight.push(chunk)
+                else:
+                    await flight.push(await self.client.ainvoke(messages, **kwargs))
+        except BaseException as e:
+            await flight.finish(e)
+            if not isinstance(e, Exception):
+                raise
+        else:
+            await flight.finish()
+
+    def _flight(self, messages: List[Any], priority: int, stream: bool, kwargs: Dict[str, Any]) -> _Flight:
+        """Join the identical request in flight, or start a new one
+
+        Only a flight queued at the same or a more urgent priority is joined,
+        so an interactive request never waits behind the background queue.
+        """
+        key = ("stream" if stream else "invoke", request_key(messages)) if self.coalesce and not kwargs else None
+        flight = self._flights.get(key) if key else None
+        # A flight nobody listens to any more is being cancelled
+        if flight is not None and flight.listeners > 0 and flight.priority <= priority:
+            LLM_REQUESTS.inc(priority=PRIORITY_NAMES[priority], outcome="coalesced")
+            return flight
+        flight = _Flight(priority)
+        flight.task = asyncio.create_task(self._generate(flight, messages, priority, stream, kwargs))
+        if key:
+            # Later identical requests join this one, the more urgent of the two
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._flights.pop(key) if self._flights.get(key) is flight else None)
+        return flight
+
+    async def ainvoke(self, messages: List[Any], priority: int = INTERACTIVE, timings: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Any:
+        """Generate a complete reply; the queue wait in seconds goes to ``timings["queue"]``"""
+        results = [result async for result in self._flight(messages, priority, False, kwargs).subscribe(timings)]
+        return results[0]
+
+    async def astream(self, messages: List[Any], priority: int = INTERACTIVE, timings: Optional[Dict[str, Any]] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        """Stream a reply chunk by chunk; the queue wait in seconds goes to ``timings["queue"]``"""
+        async for chunk in self._flight(messages, priority, True, kwargs).subscribe(timings):
+            yield chunk
+
+    def stats(self) -> Dict[str, Any]:
+        """Current load and limits"""
+        return {
+            "active": self._active,
+            "max_concurrent": self.max_concurrent,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "queued_by_priority": {
+                name: sum(1 for priority, _, _ in self._waiters if priority == value)
+                for value, name in PRIORITY_NAMES.items()
+            },
+            "in_flight": len(self._flights),
+            "average_slot_seconds": round(self._slot_seconds, 3) if self._slot_seconds is not None else None,
+            "retry_after": self.retry_after()
+        }
@@ -0,0 +1,222 @@
+"""File format handlers for DocumentProcessor.
+
+A handler turns one file into ``(content, metadata)``. It is called as
+``handler(processor, file_path, ocr=..., caption=...)`` and should accept
+and ignore options it does not use. Handlers import their parsing
+libraries when first called, so importing the processor (and spawning an
+ingestion worker) does not pay for PyMuPDF, pandas, python-docx or OpenCV.
+
+Other modules add formats by registering on import and being listed in
+``DOCUMENT_HANDLER_PLUGINS``::
+
+    from core.handlers import registry
+
+    @registry.register([".epub"], streaming=True)
+    def epub(processor, file_path, **options):
+        ...
+
+Formats that can be parsed front to back may also register an
+incremental handler, used for chunked uploads while they are still
+arriving. It is a generator called as ``handler(processor, stream,
+filename=..., ocr=..., caption=...)`` with a binary file object whose
+reads block until the next part is uploaded; it yields chunks as they
+are complete and returns ``(content, metadata)``.
+"""
+from typing import Dict, Any, Optional, Callable, Generator, Iterable, Iterator, List, NamedTuple, Tuple, BinaryIO, TYPE_CHECKING
+import codecs
+import importlib
+import os
+from core.config import settings
+
+if TYPE_CHECKING:
+    from core.document_processor import DocumentProcessor
+
+HandlerFunc = Callable[..., Tuple[str, Dict[str, Any]]]
+IncrementalFunc = Callable[..., Generator[str, None, Tuple[str, Dict[str, Any]]]]
+
+class FormatHandler(NamedTuple):
+    name: str
+    func: HandlerFunc
+    extensions: Tuple[str, ...]
+    # Reads the file incrementally and returns its own "chunks", so the
+    # whole text is never chunked in one piece
+    streaming: bool = False
+    # Fans work out to its own worker processes
+    parallel: bool = False
+
+    def describe(self) -> Dict[str, Any]:
+        return {"name": self.name, "extensions": list(self.extensions), "streaming": self.streaming, "parallel": self.parallel}
+
+class HandlerRegistry:
+    """Map file extensions to handlers; a later registration replaces an earlier one"""
+
+    def __init__(self):
+        self._handlers: Dict[str, FormatHandler] = {}
+        self._incremental: Dict[str, IncrementalFunc] = {}
+        self._loaded_plugins: set = set()
+
+    def register(
+        self,
+        extensions: Iterable[str],
+        func: Optional[HandlerFunc] = None,
+        name: Optional[str] = None,
+        streaming: bool = False,
+        parallel: bool = False
+    ) -> Any:
+        """Register ``func`` for ``extensions``; without ``func`` this is a decorator"""
+        def decorator(f: HandlerFunc) -> HandlerFunc:
+            handler = FormatHandler(name or f.__name__, f, tuple(ext.lower() for ext in extensions), streaming, parallel)
+            for ext in handler.extensions:
+                self._handlers[ext] = handler
+            return f
+        return decorator(func) if func is not None else decorator
+
+    def register_incremental(self, extensions: Iterable[str], func: Optional[IncrementalFunc] = None) -> Any:
+        """Register an incremental handler for ``extensions``; without ``func`` this is a decorator"""
+        def decorator(f: IncrementalFunc) -> IncrementalFunc:
+            for ext in extensions:
+                self._incremental[ext.lower()] = f
+            return f
+        return decorator(func) if func is not None else decorator
+
+    def get(self, extension: str) -> Optional[FormatHandler]:
+        return self._handlers.get(extension.lower())
+
+    def incremental(self, extension: str) -> Optional[IncrementalFunc]:
+        return self._incremental.get(extension.lower())
+
+    def extensions(self) -> List[str]:
+        return sorted(self._handlers)
+
+    def handlers(self) -> List[FormatHandler]:
+        """Registered handlers, each once"""
+        unique: Dict[int, FormatHandler] = {}
+        for handler in self._handlers.values():
+            unique.setdefault(id(handler), handler)
+        return sorted(unique.values(), key=lambda handler: handler.name)
+
+    def load_plugins(self, modules: Optional[Iterable[str]] = None):
+        """Import plugin modules, which register their handlers on import"""
+        for module in settings.DOCUMENT_HANDLER_PLUGINS if modules is None else modules:
+            if module not in self._loaded_plugins:
+                importlib.import_module(module)
+                self._loaded_plugins.add(module)
+
+registry = HandlerRegistry()
+
+_TEXT_READ_SIZE = 1024 * 1024
+
+@registry.register(settings.SUPPORTED_EXTENSIONS["text"], name="text")
+def process_text(processor: "DocumentProcessor", file_path: str, **options: Any) -> Tuple[str, Dict[str, Any]]:
+    """Plain text files"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return f.read(), {}
+
+@registry.register_incremental(settings.SUPPORTED_EXTENSIONS["text"])
+def stream_text(processor: "DocumentProcessor", stream: BinaryIO, **options: Any) -> Generator[str, None, Tuple[str, Dict[str, Any]]]:
+    """Chunk plain text as it is read, a run of whole paragraphs at a time"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    content: List[str] = []
+    # read1 returns what has arrived instead of waiting for a full read
+    read = getattr(stream, "read1", stream.read)
+
+    def blocks() -> Iterator[str]:
+        pending = ""
+        while data := read(_TEXT_READ_SIZE):
+            pending = (pending + decoder.decode(data)).replace("\r\n", "\n")
+            # Keep the last paragraph back, since the next read may continue
+            # it, unless it has grown too long to be one
+            end = pending.rfind("\n\n") + 2
+            if end < 2 and len(pending) > _TEXT_READ_SIZE:
+                end = pending.rfind("\n") + 1
+            if end > 0:
+                content.append(pending[:end])
+                yield pending[:end]
+                pending = pending[end:]
+        pending = (pending + decoder.decode(b"", final=True)).replace("\r\n", "\n")
+        if pending:
+            content.append(pending)
+            yield pending
+
+    yield from processor.chunker.iter_chunks(blocks())
+    return "".join(content), {}
+
+@registry.register([".pdf"], name="pdf", streaming=True, parallel=True)
+def process_pdf(processor: "DocumentProcessor", file_path: str, ocr: bool = True, **options: Any) -> Tuple[str, Dict[str, Any]]:
+    """Stream PDF pages into the chunker, keeping page numbers per chunk"""
+    stats: Dict[str, Any] = {}
+    pages = []
+    chunks = []
+    chunk_pages = []
+    for page in processor.pdf.iter_pages(file_path, stats, ocr_scanned=ocr):
+        pages.append(page.text)
+        page_chunks = processor._chunk_text(page.text)
+        chunks.extend(page_chunks)
+        chunk_pages.extend([page.number] * len(page_chunks))
+    return "\n".join(pages), {
+        "chunks": chunks,
+        "chunk_pages": chunk_pages,
+        "pdf": stats
+    }
+
+@registry.register([".docx"], name="docx")
+def process_docx(processor: "DocumentProcessor", file_path: str, **options: Any) -> Tuple[str, Dict[str, Any]]:
+    import docx
+    doc = docx.Document(file_path)
+    return "\n".join([paragraph.text for paragraph in doc.paragraphs]), {}
+
+@registry.register([".rtf"], name="rtf")
+def process_rtf(processor: "DocumentProcessor", file_path: str, **options: Any) -> Tuple[str, Dict[str, Any]]:
+    from striprtf.striprtf import rtf_to_text
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return rtf_to_text(f.read()), {}
+
+@registry.register(settings.SUPPORTED_EXTENSIONS["spreadsheets"], name="spreadsheet", streaming=True)
+def process_spreadsheet(processor: "DocumentProcessor", file_path: str, **options: Any) -> Tuple[str, Dict[str, Any]]:
+    """Stream CSV and Excel files into row-group chunks, one sheet at a time"""
+    from core.spreadsheets import SpreadsheetChunker
+    return SpreadsheetChunker().process(file_path)
+
+@registry.register_incremental([".csv"])
+def stream_csv(processor: "DocumentProcessor", stream: BinaryIO, filename: str = "", **options: Any) -> Generator[str, None, Tuple[str, Dict[str, Any]]]:
+    """Chunk CSV rows as they are read"""
+    from core.spreadsheets import SpreadsheetChunker, iter_csv_sheet
+    chunker = SpreadsheetChunker()
+    stats: Dict[str, Any] = {}
+    name = os.path.splitext(os.path.basename(filename))[0]
+    yield from chunker.iter_chunks(name, iter_csv_sheet(stream, chunker.batch_rows), stats)
+    return chunker.summary([stats]), {"sheets": [stats]}
+
+@registry.register(settings.SUPPORTED_EXTENSIONS["presentations"], name="presentation")
+def process_presentation(processor: "DocumentProcessor", file_path: str, **options: Any) -> Tuple[str, Dict[str, Any]]:
+    from pptx import Presentation
+    prs = Presentation(file_path)
+    text = []
+    for slide in prs.slides:
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                text.append(shape.text)
+    return "\n".join(text), {}
+
+@registry.register(settings.SUPPORTED_EXTENSIONS["code"], name="code")
+def process_code(processor: "DocumentProcessor", file_path: str, **options: Any) -> Tuple[str, Dict[str, Any]]:
+    """Code and markup; structured formats are pretty-printed"""
+    file_ext = os.path.splitext(file_path)[1].lower()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    if file_ext in ['.json']:
+        import json
+        return json.dumps(json.loads(content), indent=2), {}
+    elif file_ext in ['.yml', '.yaml']:
+        import yaml
+        return yaml.dump(yaml.safe_load(content), default_flow_style=False), {}
+    elif file_ext in ['.html', '.xml']:
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(content, 'lxml').prettify(), {}
+    return content, {}
+
+@registry.register(settings.SUPPORTED_EXTENSIONS["images"], name="image", parallel=True)
+def process_image(processor: "DocumentProcessor", file_path: str, ocr: bool = True, caption: bool = True, **options: Any) -> Tuple[str, Dict[str, Any]]:
+    """OCR and captioning"""
+    return processor.images.process(file_path, ocr=ocr, caption=caption)
@@ -0,0 +1,187 @@
+from typing import Dict, Any, Optional, List, Tuple
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageSequence
+import cv2
+import numpy as np
+from core.config import settings
+from core.jobs import nested_workers
+from core.models import ModelManager, model_manager
+from core.model_server import run_model
+
+def to_rgb(image: Image.Image) -> Image.Image:
+    """Convert any PIL mode to RGB, flattening transparency onto white"""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+def fit_within(array: np.ndarray, max_side: int) -> np.ndarray:
+    """Downscale an image array so its longest side is at most ``max_side``"""
+    height, width = array.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return array
+    return cv2.resize(array, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+def prepare_for_caption(image: Image.Image, max_side: Optional[int] = None) -> Image.Image:
+    """RGB image small enough that the BLIP processor's resize is cheap"""
+    array = np.asarray(to_rgb(image))
+    return Image.fromarray(fit_within(array, max_side or settings.IMAGE_CAPTION_MAX_SIDE))
+
+def prepare_for_ocr(image: Image.Image, max_side: Optional[int] = None) -> np.ndarray:
+    """Grayscale array bounded in size; Tesseract is slow on huge scans"""
+    gray = cv2.cvtColor(np.asarray(to_rgb(image)), cv2.COLOR_RGB2GRAY)
+    return fit_within(gray, max_side or settings.IMAGE_OCR_MAX_SIDE)
+
+def load_frames(file_path: str, max_frames: Optional[int] = None) -> List[Image.Image]:
+    """Frames of an image file; multi-page TIFFs and animated GIFs have several"""
+    max_frames = max_frames or settings.IMAGE_MAX_FRAMES
+    with Image.open(file_path) as image:
+        frames = []
+        for frame in ImageSequence.Iterator(image):
+            frames.append(frame.copy())
+            if len(frames) >= max_frames:
+                break
+        return frames
+
+def ocr_frame(file_path: str, index: int) -> str:
+    """OCR a single frame of an image file; runs inside OCR worker processes"""
+    import pytesseract
+    with Image.open(file_path) as image:
+        image.seek(index)
+        array = prepare_for_ocr(image)
+    return pytesseract.image_to_string(array, lang='+'.join(settings.TESSERACT_LANGUAGES))
+
+class ImagePipeline:
+    """OCR and caption the frames of an image file.
+
+    Tesseract runs on a process pool, one task per frame, while the frames
+    are captioned in batches through a single BLIP ``generate`` call per
+    batch in this process. The pool is started on first use and kept for
+    later images until ``close``. Inside an ingestion worker it only gets
+    that worker's share of the CPUs (see ``nested_workers``).
+    """
+
+    def __init__(
+        self,
+        models: Optional[ModelManager] = None,
+        batch_size: Optional[int] = None,
+        ocr_workers: Optional[int] = None
+    ):
+        self.models = models or model_manager
+        self.batch_size = batch_size or settings.IMAGE_CAPTION_BATCH_SIZE
+        self.ocr_workers = ocr_workers or nested_workers(settings.IMAGE_OCR_WORKERS)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """OCR process pool, started on first use"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.ocr_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def close(self):
+        """Stop the OCR process pool; the next image starts a new one"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def caption(self, images: List[Image.Image]) -> List[str]:
+        """Caption images in batches, on the model server if one is configured"""
+        # Downscaled first, which also keeps what is sent to the server small
+        prepared = [prepare_for_caption(image) for image in images]
+        if self.models is not model_manager:
+            return self.generate_captions(prepared)
+        return run_model("caption", prepared, self.generate_captions)
+
+    def generate_captions(self, images: List[Image.Image]) -> List[str]:
+        """Caption images already passed through ``prepare_for_caption`` in this process"""
+        import torch
+        processor, model = self.models.get("blip")
+        captions: List[str] = []
+        for start in range(0, len(images), self.batch_size):
+            batch = images[start:start + self.batch_size]
+            with torch.inference_mode():
+                inputs = processor(images=batch, return_tensors="pt")
+                output = model.generate(**inputs, max_new_tokens=settings.IMAGE_CAPTION_MAX_TOKENS)
+            captions.extend(caption.strip() for caption in processor.batch_decode(output, skip_special_tokens=True))
+        return captions
+
+    def process(self, file_path: str, ocr: bool = True, caption: bool = True) -> Tuple[str, Dict[str, Any]]:
+        """Return the text content and image metadata of ``file_path``"""
+        with Image.open(file_path) as image:
+            size, image_format, mode = image.size, image.format, image.mode
+        frames = load_frames(file_path)
+        timings: Dict[str, float] = {}
+        ocr_texts: List[str] = []
+        captions: List[str] = []
+
+        # With a single frame and nothing to overlap it with, handing it to
+        # the pool would only add a round trip
+        pooled = ocr and (len(frames) > 1 or caption) and self.ocr_workers > 1
+        futures = []
+        ocr_finished: List[float] = []
+        try:
+            started = time.perf_counter()
+            if pooled:
+                executor = self.executor
+                for i in range(len(frames)):
+                    future = executor.submit(ocr_frame, file_path, i)
+                    future.add_done_callback(lambda _: ocr_finished.append(time.perf_counter()))
+                    futures.append(future)
+            if caption:
+                captions = self.caption(frames)
+                timings["caption"] = round(time.perf_counter() - started, 3)
+            if ocr:
+                waiting = time.perf_counter()
+                ocr_texts = [future.result() for future in futures] if pooled else [ocr_frame(file_path, i) for i in range(len(frames))]
+                # OCR overlaps captioning, so its own duration runs until the
+                # last frame finished; "ocr_wait" is how long it held us up
+                finished = max(ocr_finished) if pooled and len(ocr_finished) == len(futures) else time.perf_counter()
+                timings["ocr"] = round(finished - started, 3)
+                timings["ocr_wait"] = round(time.perf_counter() - waiting, 3)
+        except BrokenProcessPool:
+            # A crashed OCR worker breaks the pool for good; the next image
+            # starts a new one
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+
+        sections = []
+        for i in range(len(frames)):
+            parts = []
+            if ocr:
+                parts.append(f"OCR Text:\n{ocr_texts[i]}")
+            if caption:
+                parts.append(f"Caption:\n{captions[i]}")
+            section = "\n\n".join(parts)
+            sections.append(f"Page {i + 1}\n{section}" if len(frames) > 1 else section)
+
+        metadata = {
+            "dimensions": size,
+            "format": image_format,
+            "mode": mode,
+            "frames": len(frames),
+            "ocr": ocr,
+            "caption": captions[0] if captions else None,
+            "image_seconds": timings
+        }
+        if len(frames) > 1:
+            metadata["captions"] = captions
+        return "\n\n".join(sections), metadata
@@ -0,0 +1,184 @@
+from typing import Dict, Any, Optional, Callable, Awaitable, List
+import asyncio
+import functools
+import multiprocessing
+import os
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from pydantic import BaseModel, Field
+from core.config import settings
+
+class JobStage(BaseModel):
+    status: str = Field("pending", description="pending, running, completed or failed")
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    seconds: Optional[float] = None
+    detail: Dict[str, Any] = Field(default_factory=dict, description="Stage-specific progress details")
+
+class Job(BaseModel):
+    id: str
+    name: str
+    status: str = Field("queued", description="queued, running, completed or failed")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    stages: Dict[str, JobStage] = Field(default_factory=dict)
+    progress: float = 0.0
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+
+    @contextmanager
+    def stage(self, name: str):
+        """Record the timing and outcome of one pipeline stage"""
+        stage = self.stages.setdefault(name, JobStage())
+        stage.status = "running"
+        stage.started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        try:
+            yield stage
+        except Exception:
+            stage.status = "failed"
+            raise
+        else:
+            stage.status = "completed"
+        finally:
+            stage.finished_at = datetime.now(timezone.utc)
+            stage.seconds = round(time.perf_counter() - started, 3)
+            done = sum(1 for s in self.stages.values() if s.status == "completed")
+            self.progress = round(done / len(self.stages), 3)
+
+    def summary(self) -> Dict[str, Any]:
+        """Job status without the result payload"""
+        return self.model_dump(exclude={"result"})
+
+# Size of the ingestion pool this process belongs to, if it is a worker
+_pool_size: Optional[int] = None
+
+def nested_workers(configured: Optional[int] = None) -> int:
+    """Processes a pool started inside this process may use
+
+    ``configured`` (or every CPU when unset) in the API process. An
+    ingestion worker shares the CPUs with the rest of its pool, so it gets
+    at most an even share; 1 means the work runs in-process.
+    """
+    cpus = os.cpu_count() or 1
+    workers = configured or cpus
+    if _pool_size:
+        workers = min(workers, cpus // _pool_size)
+    return max(1, workers)
+
+def init_worker(pool_size: Optional[int] = None):
+    """Keep ingestion workers from competing with the API for CPU, or holding models they no longer use"""
+    global _pool_size
+    _pool_size = pool_size or settings.INGESTION_WORKERS
+    if settings.INGESTION_WORKER_NICE and hasattr(os, "nice"):
+        os.nice(settings.INGESTION_WORKER_NICE)
+    # Models a worker loads itself (no model server, or while it is down)
+    # are unloaded when idle, as in the API process
+    from core.models import model_manager
+    model_manager.start_idle_reaper()
+
+class JobQueue:
+    """Run ingestion pipelines in the background and track their progress.
+
+    CPU-bound steps go to a process pool through ``run_in_worker``; at most
+    ``max_concurrent`` jobs run at once and the rest wait in order.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_concurrent: Optional[int] = None, history: Optional[int] = None):
+        self.max_workers = max_workers or settings.INGESTION_WORKERS
+        self.max_concurrent = max_concurrent or settings.INGESTION_MAX_CONCURRENT
+        self.history = history or settings.INGESTION_JOB_HISTORY
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """Worker process pool, started on first use"""
+        if self._executor is None:
+            # Spawned workers only import what the job function needs instead
+            # of inheriting the API process's threads and models
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(self.max_workers,)
+            )
+        return self._executor
+
+    async def run_in_worker(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a picklable function in the worker process pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def submit(
+        self,
+        name: str,
+        pipeline: Callable[[Job], Awaitable[Dict[str, Any]]],
+        stages: Optional[List[str]] = None,
+        limited: bool = True
+    ) -> Job:
+        """Queue ``pipeline`` and return its job immediately
+        
+        Jobs that are not ``limited`` start at once instead of taking one of
+        the ``max_concurrent`` slots, for pipelines that mostly wait (such as
+        indexing an upload while it arrives) and bound themselves.
+        """
+        job = Job(id=str(uuid.uuid4()), name=name, stages={stage: JobStage() for stage in stages or []})
+        self._jobs[job.id] = job
+        self._prune()
+        task = asyncio.create_task(self._run(job, pipeline, limited))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    async def _run(self, job: Job, pipeline: Callable[[Job], Awaitable[Dict[str, Any]]], limited: bool = True):
+        async with self._semaphore if limited else nullcontext():
+            job.status = "running"
+            job.started_at = datetime.now(timezone.utc)
+            try:
+                job.result = await pipeline(job)
+                job.status = "completed"
+                job.progress = 1.0
+            except Exception as e:
+                traceback.print_exc()
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = datetime.now(timezone.utc)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Job]:
+        return list(self._jobs.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Number of jobs per status"""
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"workers": self.max_workers, "max_concurrent": self.max_concurrent, "jobs": counts}
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond the history limit"""
+        excess = len(self._jobs) - self.history
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id].status in ("completed", "failed"):
+                del self._jobs[job_id]
+                excess -= 1
+
+    def shutdown(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,52 +1,200 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Iterator
+import asyncio
+import copy
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import redis
 import psycopg2
-from psycopg2.extras import DictCursor
-import chromadb
-from chromadb.config import Settings as ChromaSettings
+from psycopg2.extras import DictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from core.config import settings
+from core.cache import LRUCache
+from core.dedup import ChunkDeduplicator, DedupPlan, bands
+from core.metrics import CACHE_REQUESTS, DB_POOL_WAIT_SECONDS, logger, metrics
+from core.retrieval import has_thai, like_patterns, reciprocal_rank_fusion, group_by_document
+from core.vector_store import VectorStore, ChromaVectorStore, LocalVectorStore
 import json
 from datetime import datetime
 from llm import Message  # <-- Add this import
 
+DEDUP_CHUNKS = metrics.counter("owlynn_dedup_chunks_total", "Stored chunks by dedup result (unique, duplicate)", ["result"])
+
+# Cached conversations are a Redis list holding the tail of the session plus
+# an offset key with the seq of its first element. Appends only push when the
+# cached tail ends exactly where the new messages start; otherwise the cache
+# is dropped and rebuilt from PostgreSQL on the next read.
+_APPEND_MESSAGES_LUA = """
+local length = redis.call('LLEN', KEYS[1])
+local offset = tonumber(redis.call('GET', KEYS[2]) or '0')
+if offset + length ~= tonumber(ARGV[1]) then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return 0
+end
+for i = 3, #ARGV do
+    redis.call('RPUSH', KEYS[1], ARGV[i])
+end
+redis.call('SET', KEYS[2], offset, 'EX', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+_POPULATE_MESSAGES_LUA = """
+if #ARGV < 3 or redis.call('LLEN', KEYS[1]) > 0 then
+    return 0
+end
+for i = 3, #ARGV do
+    redis.call('RPUSH', KEYS[1], ARGV[i])
+end
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+# One snapshot row in ``conversations`` per session being compacted; the
+# session row's bookkeeping goes under the reserved "archive" metadata key
+_COMPACT_SESSIONS_SQL = """
+INSERT INTO conversations (session_id, timestamp, messages, metadata)
+SELECT
+    s.session_id,
+    s.updated_at,
+    COALESCE(m.messages, '[]'::jsonb),
+    COALESCE(s.metadata, '{}'::jsonb) || jsonb_build_object(
+        'archive', jsonb_build_object('summary', s.summary, 'created_at', s.created_at)
+    )
+FROM conversation_sessions s
+LEFT JOIN LATERAL (
+    SELECT jsonb_agg(
+        jsonb_build_object('role', role, 'content', content, 'metadata', COALESCE(metadata, '{}'::jsonb))
+        ORDER BY seq
+    ) AS messages
+    FROM conversation_messages
+    WHERE session_id = s.session_id
+) m ON TRUE
+WHERE s.session_id = ANY(%s)
+RETURNING id
+"""
+
+# Per-chunk lists handlers put in a document's metadata; they are stored as
+# chunk rows, not in ``documents.metadata``
+_CHUNK_METADATA_KEYS = ("chunks", "chunk_pages")
+
+def _document_metadata(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {key: value for key, value in (metadata or {}).items() if key not in _CHUNK_METADATA_KEYS}
+
+def _timed(timings: Dict[str, float], name: str, func: Callable[..., Any], *args: Any) -> Any:
+    """Call ``func`` and record its duration in milliseconds under ``name``"""
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        timings[name] = round((time.perf_counter() - started) * 1000, 2)
+
+def _snippet(text: Optional[str]) -> str:
+    """Shorten a matching chunk for display"""
+    text = " ".join((text or "").split())
+    if len(text) <= settings.SEARCH_SNIPPET_CHARS:
+        return text
+    return text[:settings.SEARCH_SNIPPET_CHARS].rsplit(" ", 1)[0] + "…"
+
+def _message_to_dict(message: Message) -> Dict[str, Any]:
+    """Serialize a Message for storage"""
+    return {"role": message.role, "content": message.content, "metadata": message.metadata}
+
 class MemoryManager:
-    def __init__(self):
+    def __init__(self, embedder: Optional[Any] = None, redis_pool: Optional[redis.ConnectionPool] = None):
+        # Embeds search queries into the same space as stored chunks
+        self.embedder = embedder
+        self._query_embedding_cache = LRUCache(settings.SEARCH_QUERY_CACHE_SIZE)
+        self._search_result_cache = LRUCache(settings.SEARCH_RESULT_CACHE_SIZE, ttl=settings.SEARCH_RESULT_CACHE_TTL)
+        self._legacy_compacted = False
+        
         # Initialize Redis for short-term memory
-        self.redis_client = redis.Redis(
+        self.redis_pool = redis_pool or redis.ConnectionPool(
             host=settings.REDIS_HOST,
             port=settings.REDIS_PORT,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
             decode_responses=True
         )
+        self.redis_client = redis.Redis(connection_pool=self.redis_pool)
+        self._append_script = self.redis_client.register_script(_APPEND_MESSAGES_LUA)
+        self._populate_script = self.redis_client.register_script(_POPULATE_MESSAGES_LUA)
         
         # Initialize PostgreSQL for long-term memory
-        self.pg_conn = psycopg2.connect(
+        self.pg_pool = ThreadedConnectionPool(
+            settings.POSTGRES_POOL_MIN_SIZE,
+            settings.POSTGRES_POOL_MAX_SIZE,
             dbname=settings.POSTGRES_DB,
             user=settings.POSTGRES_USER,
             password=settings.POSTGRES_PASSWORD,
             host=settings.POSTGRES_HOST,
             port=settings.POSTGRES_PORT
         )
+        # ThreadedConnectionPool raises instead of waiting when exhausted, so
+        # callers queue on a semaphore sized to the pool
+        self._pg_slots = threading.BoundedSemaphore(settings.POSTGRES_POOL_MAX_SIZE)
         
-        # Initialize ChromaDB for vector storage
-        self.chroma_client = chromadb.HttpClient(
-            host=settings.CHROMA_HOST,
-            port=settings.CHROMA_PORT,
-            settings=ChromaSettings(
-                anonymized_telemetry=False,
-                allow_reset=True,
-                is_persistent=True
-            ),
-            headers={
-                "X-Chroma-Token": settings.CHROMA_AUTH_TOKEN
-            }
+        # Worker threads backing the async API, one per pooled connection
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.POSTGRES_POOL_MAX_SIZE,
+            thread_name_prefix="memory"
         )
         
+        # Initialize the vector store: the ChromaDB server, or an embedded
+        # index that needs no separate service
+        self.chroma_client = None
+        if settings.VECTOR_STORE_BACKEND == "local":
+            if embedder is None:
+                raise ValueError("The local vector store requires an embedder")
+            self.vector_store: VectorStore = LocalVectorStore()
+        elif settings.VECTOR_STORE_BACKEND == "chroma":
+            import chromadb
+            from chromadb.config import Settings as ChromaSettings
+            self.chroma_client = chromadb.HttpClient(
+                host=settings.CHROMA_HOST,
+                port=settings.CHROMA_PORT,
+                settings=ChromaSettings(
+                    anonymized_telemetry=False,
+                    allow_reset=True,
+                    is_persistent=True
+                ),
+                headers={
+                    "X-Chroma-Token": settings.CHROMA_AUTH_TOKEN
+                }
+            )
+            self.vector_store = ChromaVectorStore(self.chroma_client, "documents")
+        else:
+            raise ValueError(f"Unknown vector store backend: {settings.VECTOR_STORE_BACKEND}")
+        
         self._init_databases()
     
+    @contextmanager
+    def _pg_connection(self) -> Iterator[Any]:
+        """Borrow a pooled PostgreSQL connection, committing on success"""
+        started = time.perf_counter()
+        with self._pg_slots:
+            conn = self.pg_pool.getconn()
+            DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                self.pg_pool.putconn(conn)
+    
+    async def _run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking storage call on the memory worker threads"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
     def _init_databases(self):
         """Initialize database tables and collections"""
         # Create PostgreSQL tables
-        with self.pg_conn.cursor() as cur:
+        with self._pg_connection() as conn, conn.cursor() as cur:
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS conversations (
                     id SERIAL PRIMARY KEY,
@@ -56,6 +204,38 @@ class MemoryManager:
                     metadata JSONB
                 )
             """)
+            # Snapshot lookups take the newest row of a session; retention
+            # scans by age
+            cur.execute(
+                "CREATE INDEX IF NOT EXISTS conversations_session_timestamp_idx ON conversations (session_id, timestamp DESC)"
+            )
+            cur.execute("CREATE INDEX IF NOT EXISTS conversations_timestamp_idx ON conversations (timestamp)")
+            
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS conversation_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    message_count INTEGER NOT NULL DEFAULT 0,
+                    metadata JSONB,
+                    summary JSONB,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cur.execute(
+                "CREATE INDEX IF NOT EXISTS conversation_sessions_updated_at_idx ON conversation_sessions (updated_at)"
+            )
+            
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS conversation_messages (
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT,
+                    metadata JSONB,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (session_id, seq)
+                )
+            """)
             
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS documents (
@@ -67,102 +247,991 @@ class MemoryManager:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
-        self.pg_conn.commit()
+        
+        # Full-text index over chunks for the lexical retrieval leg
+        with self._pg_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS document_chunks (
+                    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+                    chunk_index INTEGER NOT NULL,
+                    page INTEGER,
+                    content TEXT NOT NULL,
+                    tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED,
+                    PRIMARY KEY (document_id, chunk_index)
+                )
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS document_chunks_tsv_idx ON document_chunks USING GIN (tsv)")
+            # Near-duplicate chunks have no vector of their own; their text stays in the lexical index
+            cur.execute("ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS duplicate BOOLEAN NOT NULL DEFAULT FALSE")
+        
+        # SimHash fingerprints of stored chunks; a duplicate links to the
+        # canonical chunk it repeats and has no vector of its own
+        with self._pg_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_fingerprints (
+                    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+                    chunk_index INTEGER NOT NULL,
+                    simhash BIGINT NOT NULL,
+                    bands INTEGER[] NOT NULL,
+                    duplicate_of_document INTEGER,
+                    duplicate_of_chunk INTEGER,
+                    PRIMARY KEY (document_id, chunk_index),
+                    FOREIGN KEY (duplicate_of_document, duplicate_of_chunk)
+                        REFERENCES chunk_fingerprints (document_id, chunk_index) ON DELETE SET NULL
+                )
+            """)
+            # Candidates are only ever looked up among canonical chunks
+            cur.execute(
+                "CREATE INDEX IF NOT EXISTS chunk_fingerprints_bands_idx ON chunk_fingerprints USING GIN (bands) "
+                "WHERE duplicate_of_document IS NULL"
+            )
+            cur.execute(
+                "CREATE INDEX IF NOT EXISTS chunk_fingerprints_duplicate_of_idx ON chunk_fingerprints (duplicate_of_document, duplicate_of_chunk)"
+            )
+        
+        # Trigram matching serves languages the text search parser cannot
+        # split into words; it needs the pg_trgm extension
+        try:
+            with self._pg_connection() as conn, conn.cursor() as cur:
+                cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                cur.execute(
+                    "CREATE INDEX IF NOT EXISTS document_chunks_trgm_idx ON document_chunks USING GIN (content gin_trgm_ops)"
+                )
+            self._trigram_available = True
+        except psycopg2.Error:
+            self._trigram_available = False
         
         # Create ChromaDB collections
-        self.chroma_client.get_or_create_collection("documents")
-        self.chroma_client.get_or_create_collection("conversations")
+        if self.chroma_client is not None:
+            self.chroma_client.get_or_create_collection("conversations")
     
-    def store_conversation(self, session_id: str, messages: List[Message], metadata: Optional[Dict[str, Any]] = None):
-        """Store conversation in both Redis (STM) and PostgreSQL (LTM)"""
-        # Convert Message objects to dictionaries
-        messages_dict = [{"role": msg.role, "content": msg.content, "metadata": msg.metadata} for msg in messages]
-        # Store in Redis with 24-hour expiration
-        self.redis_client.setex(
-            f"conv:{session_id}",
-            86400,  # 24 hours
-            json.dumps({"messages": messages_dict, "metadata": metadata or {}})
-        )
+    def _conversation_keys(self, session_id: str) -> List[str]:
+        """Redis keys holding a session's cached message tail and its offset"""
+        return [f"conv:{session_id}:messages", f"conv:{session_id}:offset"]
+    
+    def _message_count(self, session_id: str) -> int:
+        """Number of messages stored for a session in PostgreSQL
         
-        # Store in PostgreSQL
-        with self.pg_conn.cursor() as cur:
+        A session that only exists as a snapshot in ``conversations`` (legacy
+        or compacted) counts the snapshot's messages, which the next append
+        restores ahead of the new ones.
+        """
+        with self._pg_connection() as conn, conn.cursor() as cur:
             cur.execute(
-                "INSERT INTO conversations (session_id, messages, metadata) VALUES (%s, %s, %s)",
-                (session_id, json.dumps(messages_dict), json.dumps(metadata or {}))
+                """
+                SELECT COALESCE(
+                    (SELECT message_count FROM conversation_sessions WHERE session_id = %s),
+                    (SELECT jsonb_array_length(messages) FROM conversations WHERE session_id = %s ORDER BY timestamp DESC LIMIT 1),
+                    0
+                )
+                """,
+                (session_id, session_id)
+            )
+            return cur.fetchone()[0]
+    
+    def append_messages(self, session_id: str, messages: List[Message], metadata: Optional[Dict[str, Any]] = None) -> int:
+        """Append new messages to a conversation and return the new message count.
+        
+        Only the new messages are written: one row per message in PostgreSQL
+        keyed by (session_id, seq), and an RPUSH onto the session's Redis list.
+        """
+        messages_dict = [_message_to_dict(msg) for msg in messages]
+        
+        with self._pg_connection() as conn, conn.cursor() as cur:
+            # Reserve a contiguous block of sequence numbers; the row lock on
+            # the session serializes concurrent appends to the same session
+            cur.execute(
+                """
+                INSERT INTO conversation_sessions (session_id, message_count, metadata)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (session_id) DO UPDATE SET
+                    message_count = conversation_sessions.message_count + EXCLUDED.message_count,
+                    metadata = COALESCE(conversation_sessions.metadata, '{}'::jsonb) || EXCLUDED.metadata,
+                    updated_at = CURRENT_TIMESTAMP
+                RETURNING message_count
+                """,
+                (session_id, len(messages_dict), json.dumps(metadata or {}))
+            )
+            message_count = cur.fetchone()[0]
+            if message_count == len(messages_dict):
+                # A new session row: bring back the history of an archived
+                # session with the same id first
+                message_count += self._restore_snapshot(cur, session_id)
+            first_seq = message_count - len(messages_dict)
+            if messages_dict:
+                execute_values(
+                    cur,
+                    "INSERT INTO conversation_messages (session_id, seq, role, content, metadata) VALUES %s",
+                    [
+                        (session_id, first_seq + i, msg["role"], msg["content"], json.dumps(msg["metadata"]))
+                        for i, msg in enumerate(messages_dict)
+                    ]
+                )
+        
+        # Push the new turn onto the cached tail; the script drops the cache
+        # instead if it no longer lines up with PostgreSQL
+        if messages_dict:
+            self._append_script(
+                keys=self._conversation_keys(session_id),
+                args=[first_seq, settings.CONVERSATION_CACHE_TTL] + [json.dumps(msg) for msg in messages_dict]
+            )
+        if metadata:
+            self.redis_client.delete(f"conv:{session_id}:meta")
+        return message_count
+    
+    def _restore_snapshot(self, cur: Any, session_id: str) -> int:
+        """Move a session's snapshot back into message rows ahead of new messages.
+        
+        Runs in the transaction that just created the session row, which it
+        shifts by the restored message count. Returns that count.
+        """
+        cur.execute(
+            "SELECT messages, metadata FROM conversations WHERE session_id = %s ORDER BY timestamp DESC LIMIT 1",
+            (session_id,)
+        )
+        row = cur.fetchone()
+        if row is None:
+            return 0
+        messages = row[0] or []
+        metadata = dict(row[1] or {})
+        archive = metadata.pop("archive", None) or {}
+        if messages:
+            execute_values(
+                cur,
+                "INSERT INTO conversation_messages (session_id, seq, role, content, metadata) VALUES %s",
+                [
+                    (session_id, seq, msg.get("role"), msg.get("content"), json.dumps(msg.get("metadata") or {}))
+                    for seq, msg in enumerate(messages)
+                ]
+            )
+        # New metadata wins over the archived one, as in append_messages
+        cur.execute(
+            """
+            UPDATE conversation_sessions SET
+                message_count = message_count + %s,
+                metadata = %s::jsonb || COALESCE(metadata, '{}'::jsonb),
+                summary = %s,
+                created_at = COALESCE(%s::timestamp, created_at)
+            WHERE session_id = %s
+            """,
+            (
+                len(messages),
+                json.dumps(metadata),
+                json.dumps(archive["summary"]) if archive.get("summary") else None,
+                archive.get("created_at"),
+                session_id
             )
-        self.pg_conn.commit()
+        )
+        cur.execute("DELETE FROM conversations WHERE session_id = %s", (session_id,))
+        return len(messages)
+    
+    def store_conversation(self, session_id: str, messages: List[Message], metadata: Optional[Dict[str, Any]] = None):
+        """Store conversation in both Redis (STM) and PostgreSQL (LTM)
+        
+        ``messages`` is the full history; only the messages beyond those
+        already stored are appended.
+        """
+        stored = self._message_count(session_id)
+        self.append_messages(session_id, messages[stored:], metadata)
     
-    def get_conversation(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Retrieve conversation from Redis (STM) or PostgreSQL (LTM)"""
+    def get_conversation(self, session_id: str, last_n: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Retrieve conversation from Redis (STM) or PostgreSQL (LTM)
+        
+        With ``last_n`` only the most recent ``last_n`` messages are returned.
+        """
+        list_key, offset_key = self._conversation_keys(session_id)
+        meta_key = f"conv:{session_id}:meta"
+        
         # Try Redis first
-        conv_data = self.redis_client.get(f"conv:{session_id}")
-        if conv_data:
-            return json.loads(conv_data)
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.llen(list_key)
+        pipe.get(offset_key)
+        pipe.lrange(list_key, -last_n if last_n else 0, -1)
+        pipe.get(meta_key)
+        cached_len, cached_offset, cached_messages, cached_meta = pipe.execute()
+        cached_offset = int(cached_offset or 0)
+        # The cached list may only hold the tail of a long session
+        if cached_len and cached_meta is not None and (cached_offset == 0 or (last_n and cached_len >= last_n)):
+            CACHE_REQUESTS.inc(cache="conversation", result="hit")
+            return {
+                "messages": [json.loads(msg) for msg in cached_messages],
+                "metadata": json.loads(cached_meta),
+                "message_count": cached_offset + cached_len
+            }
         
         # If not in Redis, try PostgreSQL
-        with self.pg_conn.cursor(cursor_factory=DictCursor) as cur:
+        CACHE_REQUESTS.inc(cache="conversation", result="miss")
+        with self._pg_connection() as conn, conn.cursor(cursor_factory=DictCursor) as cur:
             cur.execute(
-                "SELECT messages, metadata FROM conversations WHERE session_id = %s ORDER BY timestamp DESC LIMIT 1",
+                "SELECT message_count, metadata FROM conversation_sessions WHERE session_id = %s",
                 (session_id,)
             )
-            result = cur.fetchone()
-            if result:
-                return {
-                    "messages": result["messages"],
-                    "metadata": result["metadata"]
-                }
+            session = cur.fetchone()
+            if session is None:
+                return self._get_legacy_conversation(cur, session_id)
+            
+            if last_n:
+                cur.execute(
+                    "SELECT role, content, metadata FROM conversation_messages WHERE session_id = %s ORDER BY seq DESC LIMIT %s",
+                    (session_id, last_n)
+                )
+                rows = cur.fetchall()[::-1]
+            else:
+                cur.execute(
+                    "SELECT role, content, metadata FROM conversation_messages WHERE session_id = %s ORDER BY seq",
+                    (session_id,)
+                )
+                rows = cur.fetchall()
+        
+        messages_dict = [{"role": row["role"], "content": row["content"], "metadata": row["metadata"] or {}} for row in rows]
+        session_metadata = session["metadata"] or {}
+        message_count = session["message_count"]
+        
+        # Repopulate the cache with what was read
+        self._populate_script(
+            keys=self._conversation_keys(session_id),
+            args=[message_count - len(messages_dict), settings.CONVERSATION_CACHE_TTL] + [json.dumps(msg) for msg in messages_dict]
+        )
+        self.redis_client.setex(meta_key, settings.CONVERSATION_CACHE_TTL, json.dumps(session_metadata))
+        
+        return {
+            "messages": messages_dict,
+            "metadata": session_metadata,
+            "message_count": message_count
+        }
+    
+    def get_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Retrieve the rolling summary of a session's older turns"""
+        cached = self.redis_client.get(f"conv:{session_id}:summary")
+        if cached:
+            return json.loads(cached)
+        
+        with self._pg_connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT summary FROM conversation_sessions WHERE session_id = %s",
+                (session_id,)
+            )
+            row = cur.fetchone()
+        if row and row[0]:
+            self.redis_client.setex(f"conv:{session_id}:summary", settings.CONVERSATION_CACHE_TTL, json.dumps(row[0]))
+            return row[0]
         return None
     
-    def store_document(self, filename: str, file_type: str, content: str, metadata: Optional[Dict[str, Any]] = None, embeddings: Optional[list] = None):
-        """Store document in PostgreSQL and its embeddings in ChromaDB"""
-        # Store in PostgreSQL
-        with self.pg_conn.cursor() as cur:
+    def store_summary(self, session_id: str, summary: Dict[str, Any]):
+        """Store the rolling summary of a session's older turns"""
+        with self._pg_connection() as conn, conn.cursor() as cur:
             cur.execute(
-                "INSERT INTO documents (filename, file_type, content, metadata) VALUES (%s, %s, %s, %s) RETURNING id",
-                (filename, file_type, content, json.dumps(metadata or {}))
-            )
-            doc_id = cur.fetchone()[0]
-        self.pg_conn.commit()
-        
-        # Store in ChromaDB (if embeddings are provided)
-        if embeddings is not None:
-            self.chroma_client.get_collection("documents").add(
-                ids=[str(doc_id)],
-                embeddings=[embeddings],
-                metadatas=[metadata or {}],
-                documents=[content]
-            )
-    
-    def search_documents(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Search documents using ChromaDB"""
-        results = self.chroma_client.get_collection("documents").query(
-            query_texts=[query],
-            n_results=limit
+                "UPDATE conversation_sessions SET summary = %s WHERE session_id = %s",
+                (json.dumps(summary), session_id)
+            )
+        self.redis_client.setex(f"conv:{session_id}:summary", settings.CONVERSATION_CACHE_TTL, json.dumps(summary))
+    
+    def _get_legacy_conversation(self, cur: Any, session_id: str) -> Optional[Dict[str, Any]]:
+        """Read a session stored as full-history snapshots in ``conversations``"""
+        cur.execute(
+            "SELECT messages, metadata FROM conversations WHERE session_id = %s ORDER BY timestamp DESC LIMIT 1",
+            (session_id,)
         )
+        result = cur.fetchone()
+        if result:
+            metadata = {key: value for key, value in (result["metadata"] or {}).items() if key != "archive"}
+            return {
+                "messages": result["messages"],
+                "metadata": metadata,
+                "message_count": len(result["messages"] or [])
+            }
+        return None
+    
+    def store_document(
+        self,
+        filename: str,
+        file_type: str,
+        content: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        embeddings: Optional[list] = None,
+        chunks: Optional[List[str]] = None,
+        chunk_embeddings: Optional[Any] = None,
+        dedup: Optional[DedupPlan] = None
+    ) -> int:
+        """Store document in PostgreSQL and its embeddings in the vector store
         
-        # Fetch full document details from PostgreSQL
-        documents = []
-        for doc_id, metadata in zip(results["ids"][0], results["metadatas"][0]):
-            with self.pg_conn.cursor(cursor_factory=DictCursor) as cur:
-                cur.execute("SELECT * FROM documents WHERE id = %s", (doc_id,))
-                doc = cur.fetchone()
-                if doc:
-                    documents.append(dict(doc))
+        ``embeddings`` is a single vector for the whole document, while
+        ``chunks`` and ``chunk_embeddings`` store one vector per chunk keyed
+        by ``<document id>:<chunk index>``. With a ``dedup`` plan from
+        ``plan_dedup``, ``chunk_embeddings`` holds vectors for the plan's
+        canonical chunks only and duplicates are linked instead. The
+        ``chunk_pages`` list in ``metadata`` numbers the chunks' pages; it and
+        any ``chunks`` list are kept out of the stored metadata.
+        """
+        return self.store_documents([{
+            "filename": filename,
+            "file_type": file_type,
+            "content": content,
+            "metadata": metadata,
+            "embeddings": embeddings,
+            "chunks": chunks,
+            "chunk_embeddings": chunk_embeddings,
+            "dedup": dedup
+        }])[0]
+    
+    def _canonical_fingerprints(self, keys: List[int]) -> List[tuple]:
+        with self._pg_connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT document_id, chunk_index, simhash FROM chunk_fingerprints
+                WHERE duplicate_of_document IS NULL AND bands && %s::integer[]
+                """,
+                (keys,)
+            )
+            return cur.fetchall()
+    
+    def plan_dedup(self, documents: List[List[str]]) -> Optional[List[DedupPlan]]:
+        """Find near-duplicate chunks in a batch of documents (lists of chunks) before they are embedded
         
-        return documents
+        A chunk duplicates a stored canonical chunk, an earlier chunk of the
+        batch or an earlier chunk of its own document. Returns one plan per
+        document, or None when ``DEDUP_ENABLED`` is off.
+        """
+        if not settings.DEDUP_ENABLED:
+            return None
+        return ChunkDeduplicator(self._canonical_fingerprints).plan(documents)
+    
+    def dedup_stats(self) -> Dict[str, Any]:
+        """Fingerprinted chunks and how many of them are linked duplicates"""
+        with self._pg_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT count(*), count(duplicate_of_document) FROM chunk_fingerprints")
+            chunks, duplicates = cur.fetchone()
+        return {
+            "enabled": settings.DEDUP_ENABLED,
+            "chunks": chunks,
+            "duplicate_chunks": duplicates,
+            "ratio": round(duplicates / chunks, 4) if chunks else 0.0
+        }
+    
+    def store_documents(self, documents: List[Dict[str, Any]]) -> List[int]:
+        """Store a batch of documents in one transaction and one vector store write
+        
+        Each document is a dict with the keyword arguments of
+        ``store_document``. Returns the new document ids in order.
+        """
+        if not documents:
+            return []
+        with self._pg_connection() as conn, conn.cursor() as cur:
+            rows = execute_values(
+                cur,
+                "INSERT INTO documents (filename, file_type, content, metadata) VALUES %s RETURNING id",
+                [(doc["filename"], doc["file_type"], doc["content"], json.dumps(_document_metadata(doc.get("metadata")))) for doc in documents],
+                fetch=True
+            )
+            doc_ids = [row[0] for row in rows]
+            self._write_chunks(cur, doc_ids, documents, [0] * len(documents))
+            dedup_summaries = [
+                (json.dumps(doc["dedup"].summary(doc_ids, doc_id)), doc_id)
+                for doc_id, doc in zip(doc_ids, documents) if doc.get("dedup")
+            ]
+            if dedup_summaries:
+                # Only known once in-batch duplicates have their document ids
+                execute_values(
+                    cur,
+                    """
+                    UPDATE documents SET metadata = jsonb_set(COALESCE(metadata, '{}'::jsonb), '{dedup}', v.summary::jsonb)
+                    FROM (VALUES %s) AS v (summary, id) WHERE documents.id = v.id
+                    """,
+                    dedup_summaries
+                )
+        
+        # Store in the vector store (if embeddings are provided)
+        ids: List[str] = []
+        vectors: List[Any] = []
+        metadatas: List[Dict[str, Any]] = []
+        texts: List[str] = []
+        for doc_id, doc in zip(doc_ids, documents):
+            if doc.get("embeddings") is not None:
+                ids.append(str(doc_id))
+                vectors.append(doc["embeddings"])
+                metadatas.append(_document_metadata(doc.get("metadata")))
+                texts.append(doc["content"])
+        self._add_chunk_vectors(doc_ids, documents, [0] * len(documents), ids, vectors, metadatas, texts)
+        
+        # Cached result sets no longer reflect the corpus
+        self._search_result_cache.clear()
+        return doc_ids
+    
+    def _write_chunks(self, cur: Any, doc_ids: List[int], documents: List[Dict[str, Any]], offsets: List[int]):
+        """Insert chunk rows and fingerprints; each document's chunks are numbered from its offset"""
+        chunk_rows = []
+        fingerprint_rows = []
+        for doc_id, doc, offset in zip(doc_ids, documents, offsets):
+            chunks = doc.get("chunks") or []
+            chunk_pages = (doc.get("metadata") or {}).get("chunk_pages") or [None] * len(chunks)
+            plan: Optional[DedupPlan] = doc.get("dedup")
+            duplicates = plan.duplicates if plan else [None] * len(chunks)
+            chunk_rows.extend(
+                (doc_id, offset + i, page, chunk, duplicate is not None)
+                for i, (chunk, page, duplicate) in enumerate(zip(chunks, chunk_pages, duplicates))
+            )
+            if plan:
+                for i, (fingerprint, duplicate) in enumerate(zip(plan.fingerprints, plan.duplicates)):
+                    target = None
+                    if duplicate and duplicate.in_batch:
+                        target = (doc_ids[duplicate.document], offsets[duplicate.document] + duplicate.chunk_index)
+                    elif duplicate:
+                        target = (duplicate.document, duplicate.chunk_index)
+                    fingerprint_rows.append((doc_id, offset + i, fingerprint, bands(fingerprint), *(target or (None, None))))
+                DEDUP_CHUNKS.inc(len(plan.canonical), result="unique")
+                DEDUP_CHUNKS.inc(len(chunks) - len(plan.canonical), result="duplicate")
+        if chunk_rows:
+            execute_values(
+                cur,
+                "INSERT INTO document_chunks (document_id, chunk_index, page, content, duplicate) VALUES %s",
+                chunk_rows,
+                page_size=1000
+            )
+        if fingerprint_rows:
+            # Duplicates always link to an earlier chunk, so every link target is inserted first
+            execute_values(
+                cur,
+                """
+                INSERT INTO chunk_fingerprints
+                    (document_id, chunk_index, simhash, bands, duplicate_of_document, duplicate_of_chunk)
+                VALUES %s
+                """,
+                fingerprint_rows,
+                page_size=1000
+            )
     
-    def cleanup_old_conversations(self, days: int = 30):
-        """Clean up conversations older than specified days"""
-        with self.pg_conn.cursor() as cur:
+    def _add_chunk_vectors(
+        self,
+        doc_ids: List[int],
+        documents: List[Dict[str, Any]],
+        offsets: List[int],
+        ids: List[str],
+        vectors: List[Any],
+        metadatas: List[Dict[str, Any]],
+        texts: List[str]
+    ):
+        """Add chunk vectors (after any whole-document ones already collected) in one vector store write"""
+        for doc_id, doc, offset in zip(doc_ids, documents, offsets):
+            chunks = doc.get("chunks")
+            chunk_embeddings = doc.get("chunk_embeddings")
+            if chunks and chunk_embeddings is not None and len(chunk_embeddings):
+                # Duplicate chunks get no vector; search finds their canonical chunk
+                indexes = doc["dedup"].canonical if doc.get("dedup") else list(range(len(chunks)))
+                chunk_pages = (doc.get("metadata") or {}).get("chunk_pages")
+                chunk_metadata = self._chunk_metadata(doc_id, doc["filename"], doc["file_type"], len(chunks), chunk_pages, offset)
+                ids.extend(f"{doc_id}:{offset + i}" for i in indexes)
+                vectors.extend(chunk_embeddings)
+                metadatas.extend(chunk_metadata[i] for i in indexes)
+                texts.extend(chunks[i] for i in indexes)
+        if ids:
+            self.vector_store.add(ids=ids, embeddings=vectors, metadatas=metadatas, documents=texts)
+    
+    def create_document(self, filename: str, file_type: str, metadata: Optional[Dict[str, Any]] = None) -> int:
+        """Insert an empty document that ``append_chunks`` fills while its file is still being read"""
+        with self._pg_connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO documents (filename, file_type, content, metadata) VALUES (%s, %s, '', %s) RETURNING id",
+                (filename, file_type, json.dumps(metadata or {}))
+            )
+            return cur.fetchone()[0]
+    
+    def append_chunks(
+        self,
+        doc_id: int,
+        filename: str,
+        file_type: str,
+        start: int,
+        chunks: List[str],
+        chunk_embeddings: Any,
+        dedup: Optional[DedupPlan] = None,
+        chunk_pages: Optional[List[int]] = None
+    ):
+        """Store chunks ``start`` onwards of a document created with ``create_document``
+        
+        ``chunk_embeddings`` and ``dedup`` work as in ``store_document``, with
+        the plan made for these chunks alone.
+        """
+        document = {
+            "filename": filename,
+            "file_type": file_type,
+            "metadata": {"chunk_pages": chunk_pages} if chunk_pages else {},
+            "chunks": chunks,
+            "chunk_embeddings": chunk_embeddings,
+            "dedup": dedup
+        }
+        with self._pg_connection() as conn, conn.cursor() as cur:
+            self._write_chunks(cur, [doc_id], [document], [start])
+        self._add_chunk_vectors([doc_id], [document], [start], [], [], [], [])
+        self._search_result_cache.clear()
+    
+    def finish_document(self, doc_id: int, content: str, metadata: Dict[str, Any]):
+        """Set the content and metadata of a document once all its chunks are stored"""
+        with self._pg_connection() as conn, conn.cursor() as cur:
             cur.execute(
-                "DELETE FROM conversations WHERE timestamp < NOW() - INTERVAL '%s days'",
-                (days,)
+                "UPDATE documents SET content = %s, metadata = %s WHERE id = %s",
+                (content, json.dumps(_document_metadata(metadata)), doc_id)
+            )
+        self._search_result_cache.clear()
+    
+    def _chunk_metadata(
+        self,
+        doc_id: int,
+        filename: str,
+        file_type: str,
+        count: int,
+        chunk_pages: Optional[List[int]] = None,
+        offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        metadatas = []
+        for i in range(count):
+            chunk_metadata = {"document_id": doc_id, "chunk_index": offset + i, "filename": filename, "file_type": file_type}
+            if chunk_pages:
+                chunk_metadata["page"] = chunk_pages[i]
+            metadatas.append(chunk_metadata)
+        return metadatas
+    
+    def _promote_duplicates(self, cur: Any, doc_id: int) -> List[Dict[str, Any]]:
+        """Make other documents' duplicates of ``doc_id``'s chunks canonical before it is deleted
+        
+        The first duplicate of each chunk takes its place and the others are
+        relinked to it. Returns the promoted chunks, which need vectors.
+        """
+        cur.execute(
+            """
+            SELECT f.document_id, f.chunk_index, f.duplicate_of_chunk, c.page, c.content, d.filename, d.file_type
+            FROM chunk_fingerprints f
+            JOIN document_chunks c USING (document_id, chunk_index)
+            JOIN documents d ON d.id = f.document_id
+            WHERE f.duplicate_of_document = %s AND f.document_id <> %s
+            ORDER BY f.duplicate_of_chunk, f.document_id, f.chunk_index
+            """,
+            (doc_id, doc_id)
+        )
+        promoted: Dict[int, Dict[str, Any]] = {}
+        relinked = []
+        for row in cur.fetchall():
+            canonical = promoted.get(row["duplicate_of_chunk"])
+            if canonical is None:
+                promoted[row["duplicate_of_chunk"]] = dict(row)
+            else:
+                relinked.append((canonical["document_id"], canonical["chunk_index"], row["document_id"], row["chunk_index"]))
+        if promoted:
+            keys = [(row["document_id"], row["chunk_index"]) for row in promoted.values()]
+            execute_values(
+                cur,
+                """
+                UPDATE chunk_fingerprints f SET duplicate_of_document = NULL, duplicate_of_chunk = NULL
+                FROM (VALUES %s) AS v (document_id, chunk_index)
+                WHERE f.document_id = v.document_id AND f.chunk_index = v.chunk_index
+                """,
+                keys
             )
-        self.pg_conn.commit()
+            execute_values(
+                cur,
+                """
+                UPDATE document_chunks c SET duplicate = FALSE
+                FROM (VALUES %s) AS v (document_id, chunk_index)
+                WHERE c.document_id = v.document_id AND c.chunk_index = v.chunk_index
+                """,
+                keys
+            )
+        if relinked:
+            execute_values(
+                cur,
+                """
+                UPDATE chunk_fingerprints f SET duplicate_of_document = v.target_document, duplicate_of_chunk = v.target_chunk
+                FROM (VALUES %s) AS v (target_document, target_chunk, document_id, chunk_index)
+                WHERE f.document_id = v.document_id AND f.chunk_index = v.chunk_index
+                """,
+                relinked
+            )
+        return list(promoted.values())
+    
+    def delete_document(self, doc_id: int) -> bool:
+        """Delete a document, its chunks and its vectors; returns whether it existed
+        
+        Chunks of other documents that were linked as duplicates of this
+        document's chunks are promoted and embedded in their place.
+        """
+        with self._pg_connection() as conn, conn.cursor(cursor_factory=DictCursor) as cur:
+            promoted = self._promote_duplicates(cur, doc_id)
+            cur.execute("DELETE FROM documents WHERE id = %s", (doc_id,))
+            deleted = cur.rowcount > 0
+        self.vector_store.delete(ids=[str(doc_id)])
+        self.vector_store.delete(where={"document_id": doc_id})
+        if promoted and self.embedder is not None:
+            self.vector_store.add(
+                ids=[f"{row['document_id']}:{row['chunk_index']}" for row in promoted],
+                embeddings=self.embedder.embed_documents([row["content"] for row in promoted]),
+                metadatas=[
+                    {
+                        "document_id": row["document_id"], "chunk_index": row["chunk_index"],
+                        "filename": row["filename"], "file_type": row["file_type"],
+                        **({"page": row["page"]} if row["page"] is not None else {})
+                    }
+                    for row in promoted
+                ],
+                documents=[row["content"] for row in promoted]
+            )
+        elif promoted:
+            logger.warning("%d chunks promoted from deleted document %s have no vectors without an embedder", len(promoted), doc_id)
+        self._search_result_cache.clear()
+        return deleted
+    
+    def _embed_query(self, query: str) -> List[float]:
+        """Embed a search query, reusing the embedding of repeated queries"""
+        embedding = self._query_embedding_cache.get(query)
+        if embedding is None:
+            embedding = list(map(float, self.embedder.embed_query(query)))
+            self._query_embedding_cache.put(query, embedding)
+        return embedding
+    
+    def _vector_search(self, query: str, n_results: int) -> List[Dict[str, Any]]:
+        """Rank chunks by embedding similarity using the vector store"""
+        if self.embedder is not None:
+            results = self.vector_store.query(embedding=self._embed_query(query), n_results=n_results)
+        else:
+            results = self.vector_store.query(text=query, n_results=n_results)
+        
+        hits = []
+        for result in results:
+            metadata = result["metadata"]
+            hits.append({
+                "document_id": int(metadata.get("document_id", result["id"].split(":")[0])),
+                "chunk_index": metadata.get("chunk_index"),
+                "page": metadata.get("page"),
+                "text": result["document"],
+                # Cosine similarity for the normalized embeddings stored by
+                # the ingestion pipeline (both backends return squared L2 distance)
+                "score": 1 - result["distance"] / 2
+            })
+        return hits
+    
+    def _lexical_search(self, query: str, n_results: int) -> List[Dict[str, Any]]:
+        """Rank chunks by full-text match in PostgreSQL
+        
+        Thai is written without spaces between words, so the ``simple``
+        text search configuration cannot split it into terms; Thai queries
+        match substrings through the trigram index instead.
+        """
+        if not query.strip():
+            return []
+        with self._pg_connection() as conn, conn.cursor(cursor_factory=DictCursor) as cur:
+            if has_thai(query) and self._trigram_available:
+                cur.execute(
+                    """
+                    SELECT document_id, chunk_index, page, content, word_similarity(%s, content) AS rank
+                    FROM document_chunks
+                    WHERE content ILIKE ALL(%s)
+                    ORDER BY rank DESC
+                    LIMIT %s
+                    """,
+                    (query, like_patterns(query), n_results)
+                )
+            elif has_thai(query):
+                cur.execute(
+                    """
+                    SELECT document_id, chunk_index, page, content, 1.0 AS rank
+                    FROM document_chunks
+                    WHERE content ILIKE ALL(%s)
+                    LIMIT %s
+                    """,
+                    (like_patterns(query), n_results)
+                )
+            else:
+                cur.execute(
+                    """
+                    SELECT document_id, chunk_index, page, content, ts_rank_cd(tsv, q) AS rank
+                    FROM document_chunks, websearch_to_tsquery('simple', %s) q
+                    WHERE tsv @@ q
+                    ORDER BY rank DESC
+                    LIMIT %s
+                    """,
+                    (query, n_results)
+                )
+            rows = cur.fetchall()
+        return [
+            {
+                "document_id": row["document_id"],
+                "chunk_index": row["chunk_index"],
+                "page": row["page"],
+                "text": row["content"],
+                "score": float(row["rank"])
+            }
+            for row in rows
+        ]
+    
+    def _hydrate(self, hits: Dict[int, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Attach document details to grouped chunk hits with a single query"""
+        rows = {}
+        if hits:
+            # Leave out the full content and the per-chunk lists in the metadata
+            with self._pg_connection() as conn, conn.cursor(cursor_factory=DictCursor) as cur:
+                cur.execute(
+                    """
+                    SELECT id, filename, file_type, metadata - 'chunks' - 'chunk_pages' AS metadata, created_at
+                    FROM documents WHERE id = ANY(%s)
+                    """,
+                    (list(hits),)
+                )
+                rows = {row["id"]: dict(row) for row in cur.fetchall()}
+        
+        documents = []
+        for doc_id, chunks in hits.items():
+            if doc_id in rows:
+                documents.append({
+                    **rows[doc_id],
+                    "score": round(chunks[0]["score"], 6),
+                    "chunks": [
+                        {
+                            "chunk_index": chunk["chunk_index"],
+                            "page": chunk["page"],
+                            "snippet": _snippet(chunk["text"]),
+                            "score": round(chunk["score"], 6),
+                            "sources": chunk.get("sources", {})
+                        }
+                        for chunk in chunks
+                    ]
+                })
+        return documents
+    
+    def _fuse(self, legs: Dict[str, List[Dict[str, Any]]], limit: int) -> Dict[int, List[Dict[str, Any]]]:
+        return group_by_document(reciprocal_rank_fusion(legs), limit)
+    
+    def search_documents(self, query: str, limit: int = 5, timings: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+        """Search documents with hybrid vector and full-text retrieval
+        
+        Returns up to ``limit`` documents ranked by reciprocal-rank fusion of
+        their best chunks, each with the matching chunk snippets and scores
+        instead of the full document content. Per-leg timings in
+        milliseconds are written to ``timings`` when given.
+        """
+        timings = timings if timings is not None else {}
+        cache_key = (query, limit)
+        cached = self._search_result_cache.get(cache_key)
+        if cached is not None:
+            timings["cache"] = 1
+            return copy.deepcopy(cached)
+        
+        # Fetch more chunks than documents requested, since several chunks
+        # of the same document may match
+        n_results = limit * settings.SEARCH_CHUNK_OVERSAMPLE
+        legs = {"vector": _timed(timings, "vector", self._vector_search, query, n_results)}
+        if settings.SEARCH_HYBRID:
+            legs["lexical"] = _timed(timings, "lexical", self._lexical_search, query, n_results)
+        grouped = _timed(timings, "fusion", self._fuse, legs, limit)
+        documents = _timed(timings, "hydrate", self._hydrate, grouped)
+        
+        self._search_result_cache.put(cache_key, documents)
+        return copy.deepcopy(documents)
+    
+    def _delete_in_batches(self, sql: str, params: tuple, batch_size: int) -> int:
+        """Run a ``LIMIT``-ed delete until it runs dry, one transaction per batch
+        
+        Short transactions keep row locks and WAL bursts small while chat
+        traffic continues. ``sql`` takes ``params`` followed by the batch size.
+        """
+        total = 0
+        while True:
+            with self._pg_connection() as conn, conn.cursor() as cur:
+                cur.execute(sql, (*params, batch_size))
+                deleted = cur.rowcount
+            total += deleted
+            if deleted < batch_size:
+                return total
+    
+    def cleanup_old_conversations(self, days: Optional[int] = None, batch_size: Optional[int] = None) -> int:
+        """Delete conversation snapshots older than ``days``; returns the rows deleted
+        
+        Active sessions are never deleted here: they are compacted into a
+        snapshot first (see compact_conversations), whose timestamp is the
+        session's last activity.
+        """
+        days = settings.CONVERSATION_RETENTION_DAYS if days is None else days
+        return self._delete_in_batches(
+            """
+            DELETE FROM conversations WHERE id IN (
+                SELECT id FROM conversations
+                WHERE timestamp < NOW() - make_interval(days => %s)
+                ORDER BY timestamp
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            """,
+            (days,),
+            batch_size or settings.CONVERSATION_RETENTION_BATCH
+        )
+    
+    def compact_conversations(self, inactive_days: Optional[int] = None, batch_size: Optional[int] = None) -> int:
+        """Fold sessions idle for ``inactive_days`` into one snapshot each
+        
+        A session's message rows are replaced by a single row in
+        ``conversations``, which get_conversation still reads, store_conversation
+        counts as stored and the next append restores. Runs ``batch_size`` sessions per transaction and
+        returns the number of sessions compacted.
+        """
+        inactive_days = settings.CONVERSATION_ARCHIVE_DAYS if inactive_days is None else inactive_days
+        batch_size = batch_size or settings.CONVERSATION_RETENTION_BATCH
+        compacted = 0
+        while True:
+            with self._pg_connection() as conn, conn.cursor() as cur:
+                # Sessions being appended to are locked and skipped
+                cur.execute(
+                    """
+                    SELECT session_id FROM conversation_sessions
+                    WHERE updated_at < NOW() - make_interval(days => %s)
+                    ORDER BY updated_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                    """,
+                    (inactive_days, batch_size)
+                )
+                session_ids = [row[0] for row in cur.fetchall()]
+                if session_ids:
+                    cur.execute(_COMPACT_SESSIONS_SQL, (session_ids,))
+                    snapshot_ids = [row[0] for row in cur.fetchall()]
+                    cur.execute(
+                        "DELETE FROM conversations WHERE session_id = ANY(%s) AND NOT id = ANY(%s)",
+                        (session_ids, snapshot_ids)
+                    )
+                    cur.execute("DELETE FROM conversation_messages WHERE session_id = ANY(%s)", (session_ids,))
+                    cur.execute("DELETE FROM conversation_sessions WHERE session_id = ANY(%s)", (session_ids,))
+            if session_ids:
+                self.redis_client.delete(*[
+                    key
+                    for session_id in session_ids
+                    for key in self._conversation_keys(session_id) + [f"conv:{session_id}:meta", f"conv:{session_id}:summary"]
+                ])
+            compacted += len(session_ids)
+            if len(session_ids) < batch_size:
+                return compacted
+    
+    def compact_legacy_snapshots(self, batch_size: Optional[int] = None) -> int:
+        """Keep only the newest full-history snapshot of each legacy session"""
+        return self._delete_in_batches(
+            """
+            DELETE FROM conversations WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, row_number() OVER (PARTITION BY session_id ORDER BY timestamp DESC, id DESC) AS position
+                    FROM conversations
+                ) ranked
+                WHERE position > 1
+                LIMIT %s
+            )
+            """,
+            (),
+            batch_size or settings.CONVERSATION_RETENTION_BATCH
+        )
+    
+    def apply_retention(self) -> Dict[str, int]:
+        """Compact idle sessions and delete expired snapshots"""
+        result: Dict[str, int] = {}
+        # Nothing writes several snapshots per session any more, so old
+        # duplicates only need removing once per process
+        if not self._legacy_compacted:
+            result["legacy_snapshots_removed"] = self.compact_legacy_snapshots()
+            self._legacy_compacted = True
+        if settings.CONVERSATION_ARCHIVE_DAYS:
+            result["sessions_compacted"] = self.compact_conversations()
+        if settings.CONVERSATION_RETENTION_DAYS:
+            result["snapshots_deleted"] = self.cleanup_old_conversations()
+        return result
+    
+    async def run_retention(self, interval: Optional[float] = None):
+        """Periodically apply conversation retention; runs until cancelled"""
+        interval = interval or settings.CONVERSATION_RETENTION_INTERVAL
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                result = await self._run(self.apply_retention)
+                if any(result.values()):
+                    logger.info("Conversation retention: %s", result)
+            except Exception:
+                logger.exception("Conversation retention failed")
+    
+    # Async variants for the FastAPI handlers; the blocking work runs on the
+    # memory worker threads so the event loop stays free
+    async def astore_conversation(self, session_id: str, messages: List[Message], metadata: Optional[Dict[str, Any]] = None):
+        """Async variant of store_conversation"""
+        return await self._run(self.store_conversation, session_id, messages, metadata)
+    
+    async def aappend_messages(self, session_id: str, messages: List[Message], metadata: Optional[Dict[str, Any]] = None) -> int:
+        """Async variant of append_messages"""
+        return await self._run(self.append_messages, session_id, messages, metadata)
+    
+    async def aget_conversation(self, session_id: str, last_n: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Async variant of get_conversation"""
+        return await self._run(self.get_conversation, session_id, last_n)
+    
+    async def aget_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Async variant of get_summary"""
+        return await self._run(self.get_summary, session_id)
+    
+    async def astore_summary(self, session_id: str, summary: Dict[str, Any]):
+        """Async variant of store_summary"""
+        return await self._run(self.store_summary, session_id, summary)
+    
+    async def astore_document(
+        self,
+        filename: str,
+        file_type: str,
+        content: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        embeddings: Optional[list] = None,
+        chunks: Optional[List[str]] = None,
+        chunk_embeddings: Optional[Any] = None,
+        dedup: Optional[DedupPlan] = None
+    ) -> int:
+        """Async variant of store_document"""
+        return await self._run(self.store_document, filename, file_type, content, metadata, embeddings, chunks, chunk_embeddings, dedup)
+    
+    async def aplan_dedup(self, documents: List[List[str]]) -> Optional[List[DedupPlan]]:
+        """Async variant of plan_dedup"""
+        return await self._run(self.plan_dedup, documents)
+    
+    async def adelete_document(self, doc_id: int) -> bool:
+        """Async variant of delete_document"""
+        return await self._run(self.delete_document, doc_id)
+    
+    async def asearch_documents(self, query: str, limit: int = 5, timings: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+        """Async variant of search_documents that runs both retrieval legs concurrently"""
+        timings = timings if timings is not None else {}
+        cache_key = (query, limit)
+        cached = self._search_result_cache.get(cache_key)
+        if cached is not None:
+            timings["cache"] = 1
+            return copy.deepcopy(cached)
+        
+        n_results = limit * settings.SEARCH_CHUNK_OVERSAMPLE
+        names = ["vector"] + (["lexical"] if settings.SEARCH_HYBRID else [])
+        searches = {"vector": self._vector_search, "lexical": self._lexical_search}
+        results = await asyncio.gather(*[
+            self._run(_timed, timings, name, searches[name], query, n_results) for name in names
+        ])
+        grouped = _timed(timings, "fusion", self._fuse, dict(zip(names, results)), limit)
+        documents = await self._run(_timed, timings, "hydrate", self._hydrate, grouped)
+        
+        self._search_result_cache.put(cache_key, documents)
+        return copy.deepcopy(documents)
+    
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hit counts of the in-process search caches"""
+        return {
+            "query_embedding": self._query_embedding_cache.stats(),
+            "search_results": self._search_result_cache.stats()
+        }
+
+    def close(self):
+        """Release pooled connections and worker threads"""
+        if hasattr(self, '_executor'):
+            self._executor.shutdown(wait=False)
+        if hasattr(self, 'pg_pool') and not self.pg_pool.closed:
+            self.pg_pool.closeall()
+        if hasattr(self, 'redis_pool'):
+            self.redis_pool.disconnect()
+        if isinstance(getattr(self, 'vector_store', None), LocalVectorStore):
+            self.vector_store.close()
     
     def __del__(self):
         """Cleanup connections"""
-        if hasattr(self, 'pg_conn'):
-            self.pg_conn.close()
-        if hasattr(self, 'redis_client'):
-            self.redis_client.close()
+        self.close()
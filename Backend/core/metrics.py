@@ -0,0 +1,263 @@
+from typing import Dict, Any, Optional, Callable, Iterator, List, Sequence, Tuple
+import logging
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Seconds; spans a cache hit up to a long LLM generation
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, List[Tuple[str, str]], float]]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """Monotonic total per label set"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, value: float, **labels: Any):
+        """Mirror a total that another component keeps"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[Tuple[str, List[Tuple[str, str]], float]]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, list(zip(self.labelnames, key)), value
+
+class Gauge(Counter):
+    """Current value per label set"""
+
+    kind = "gauge"
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels: Any) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self) -> Iterator[Tuple[str, List[Tuple[str, str]], float]]:
+        with self._lock:
+            items = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in items:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", labels + [("le", _format_value(bound))], cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text exposition format.
+
+    Collectors run before every render to mirror values that other
+    components already keep (cache statistics, queue sizes).
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:
+                logger.exception("Metrics collector failed")
+        lines = []
+        for metric in sorted(self._metrics.values(), key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    "owlynn_stage_seconds", "Time spent in each stage of chat and search requests", ["stage"]
+)
+DOCUMENT_STAGE_SECONDS = metrics.histogram(
+    "owlynn_document_stage_seconds", "Time spent in each document ingestion stage per file type", ["stage", "file_type"]
+)
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "owlynn_http_request_seconds", "HTTP request latency until the response headers are sent", ["method", "route", "status"]
+)
+LLM_TOKENS = metrics.counter(
+    "owlynn_llm_tokens_total", "Prompt and completion tokens exchanged with the LLM", ["kind"]
+)
+LLM_TOKENS_PER_SECOND = metrics.histogram(
+    "owlynn_llm_tokens_per_second", "Completion tokens per second of generation", [],
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 500)
+)
+LLM_FIRST_TOKEN_SECONDS = metrics.histogram(
+    "owlynn_llm_first_token_seconds", "Time from request to the first streamed token"
+)
+DB_POOL_WAIT_SECONDS = metrics.histogram(
+    "owlynn_db_pool_wait_seconds", "Time spent waiting for a pooled PostgreSQL connection",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+)
+CACHE_REQUESTS = metrics.counter(
+    "owlynn_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"]
+)
+
+# Per-request tracing: a trace ID for log lines plus the stage timings of
+# the request, reported together when the request finishes
+class RequestTrace:
+    def __init__(self, trace_id: Optional[str] = None):
+        self.id = trace_id or uuid.uuid4().hex[:16]
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def summary(self) -> str:
+        return " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.stages.items())
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("owlynn_trace", default=None)
+
+def start_trace(trace_id: Optional[str] = None) -> RequestTrace:
+    """Start tracing the current request (and the tasks it spawns)"""
+    trace = RequestTrace(trace_id)
+    _current_trace.set(trace)
+    return trace
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+def observe_stage(stage: str, seconds: float):
+    """Record a request stage that was timed elsewhere"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+@contextmanager
+def timed_stage(stage: str) -> Iterator[None]:
+    """Time a block as one stage of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+def observe_document(file_type: str, timings: Dict[str, float]):
+    """Record per-stage ingestion timings (in seconds) of one file"""
+    for stage, seconds in timings.items():
+        if seconds is not None:
+            DOCUMENT_STAGE_SECONDS.observe(seconds, stage=stage, file_type=file_type or "unknown")
+
+def observe_generation(prompt_tokens: int, completion_tokens: int, seconds: float):
+    """Record the token counts and throughput of one LLM call"""
+    LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, kind="completion")
+    if seconds > 0 and completion_tokens:
+        LLM_TOKENS_PER_SECOND.observe(completion_tokens / seconds)
+
+class TraceIdFilter(logging.Filter):
+    """Add the current request's trace ID to log records as ``trace_id``"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace = _current_trace.get()
+        record.trace_id = trace.id if trace is not None else "-"
+        return True
+
+logger = logging.getLogger("owlynn")
+
+def configure_logging(level: str = "INFO"):
+    """Log through the ``owlynn`` logger with the trace ID on every line"""
+    if any(isinstance(f, TraceIdFilter) for handler in logger.handlers for f in handler.filters):
+        return
+    handler = logging.StreamHandler()
+    handler.addFilter(TraceIdFilter())
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
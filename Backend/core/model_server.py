@@ -0,0 +1,340 @@
+"""Host the local models in one process shared by every API and ingestion worker.
+
+Start it before the workers, from the Backend directory:
+
+    python -m core.model_server --warmup embedding
+
+and point the workers at the same socket with ``MODEL_SERVER_ADDRESS``.
+Embedding, captioning and sentence splitting are then sent to the server
+over a Unix socket (``multiprocessing.connection``). Concurrent requests
+from all workers are merged into one batched model call per operation.
+When the server cannot be reached, a worker falls back to loading the
+model itself (unless ``MODEL_SERVER_FALLBACK`` is off) and tries the
+server again after ``MODEL_SERVER_RETRY_SECONDS``.
+"""
+from typing import Dict, Any, Optional, Callable, List, Tuple
+import argparse
+import logging
+import os
+import pickle
+import queue
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from core.config import settings
+from core.metrics import metrics
+
+MODEL_REQUESTS = metrics.counter(
+    "owlynn_model_requests_total", "Model calls by operation and where they ran (server, local)", ["op", "served"]
+)
+
+logger = logging.getLogger("owlynn.model_server")
+
+class ModelServerUnavailable(Exception):
+    """The model server could not be reached"""
+
+class ModelServerError(RuntimeError):
+    """The model server received the request but could not complete it"""
+
+# Set in the server process so its own pipelines run the models directly
+_serving = False
+
+def _authkey() -> Optional[bytes]:
+    return settings.MODEL_SERVER_AUTHKEY.encode("utf-8") if settings.MODEL_SERVER_AUTHKEY else None
+
+class _Batcher:
+    """Merge concurrent requests for one operation into batched calls.
+
+    Each request is a list of items. The first request waits up to
+    ``window`` seconds for others to join; the items of all of them (up to
+    ``max_items``) go through ``func`` in a single call and the results are
+    split back per request.
+    """
+
+    def __init__(self, op: str, func: Callable[[List[Any]], Any], window: float, max_items: int):
+        self.op = op
+        self.func = func
+        self.window = window
+        self.max_items = max_items
+        self.requests = 0
+        self.items = 0
+        self.batches = 0
+        self._pending: deque = deque()
+        self._changed = threading.Condition()
+        threading.Thread(target=self._run, name=f"batch-{op}", daemon=True).start()
+
+    def submit(self, items: List[Any]) -> Future:
+        future: Future = Future()
+        with self._changed:
+            self._pending.append((items, future))
+            self._changed.notify()
+        return future
+
+    def _take(self) -> List[Tuple[List[Any], Future]]:
+        with self._changed:
+            while not self._pending:
+                self._changed.wait()
+            batch = [self._pending.popleft()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.window
+            while size < self.max_items:
+                if self._pending:
+                    if size + len(self._pending[0][0]) > self.max_items:
+                        break
+                    request = self._pending.popleft()
+                    batch.append(request)
+                    size += len(request[0])
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            items = [item for request_items, _ in batch for item in request_items]
+            self.requests += len(batch)
+            self.items += len(items)
+            self.batches += 1
+            try:
+                results = self.func(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for request_items, future in batch:
+                future.set_result(results[start:start + len(request_items)])
+                start += len(request_items)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "items": self.items,
+            "batches": self.batches,
+            "average_batch": round(self.items / self.batches, 2) if self.batches else None
+        }
+
+class ModelServer:
+    """Serve batched model operations to local workers over a Unix socket"""
+
+    def __init__(self, address: Optional[str] = None, window: Optional[float] = None, max_batch: Optional[int] = None):
+        # Imported here so that clients never load the pipelines' dependencies
+        from core.chunking import SentenceChunker
+        from core.embeddings import EmbeddingPipeline
+        from core.images import ImagePipeline
+        from core.models import model_manager
+
+        global _serving
+        _serving = True
+        self.address = address or settings.MODEL_SERVER_ADDRESS
+        if not self.address:
+            raise ValueError("MODEL_SERVER_ADDRESS is not set")
+        self.models = model_manager
+        window = settings.MODEL_SERVER_BATCH_WINDOW if window is None else window
+        max_batch = max_batch or settings.MODEL_SERVER_MAX_BATCH
+        self.batchers = {
+            "embed": _Batcher("embed", EmbeddingPipeline().encode, window, max_batch),
+            # Captioning is far slower per item, so its batches stay small
+            "caption": _Batcher("caption", ImagePipeline().generate_captions, window, settings.IMAGE_CAPTION_BATCH_SIZE),
+            "sentences": _Batcher("sentences", SentenceChunker().split_sentences, window, max_batch)
+        }
+        self.commands: Dict[str, Callable[[Any], Any]] = {
+            "status": lambda _: self.status(),
+            "warmup": self.models.warmup,
+            "unload": self.models.unload
+        }
+        self.started = time.monotonic()
+        self._listener: Optional[Listener] = None
+
+    def _bind(self) -> Listener:
+        if os.path.exists(self.address):
+            # A socket file left behind by a crash can be replaced; a live server cannot
+            try:
+                Client(self.address, family="AF_UNIX", authkey=_authkey()).close()
+            except (OSError, EOFError):
+                os.unlink(self.address)
+            else:
+                raise RuntimeError(f"A model server is already listening on {self.address}")
+        os.makedirs(os.path.dirname(os.path.abspath(self.address)), exist_ok=True)
+        listener = Listener(self.address, family="AF_UNIX", authkey=_authkey())
+        # Requests are pickled, so only the owner may connect
+        os.chmod(self.address, 0o600)
+        return listener
+
+    def handle(self, op: str, payload: Any) -> Any:
+        if op in self.batchers:
+            return self.batchers[op].submit(payload).result()
+        if op in self.commands:
+            return self.commands[op](payload)
+        raise ValueError(f"Unknown model server operation: {op}")
+
+    def _serve_connection(self, conn: Connection):
+        with conn:
+            while True:
+                try:
+                    op, payload = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = ("ok", self.handle(op, payload))
+                except Exception as e:
+                    logger.exception("Model server %s request failed", op)
+                    # Send the exception itself where possible so callers can handle it by type
+                    try:
+                        pickle.dumps(e)
+                        reply = ("error", e)
+                    except Exception:
+                        reply = ("error", ModelServerError(f"{type(e).__name__}: {e}"))
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+
+    def serve_forever(self):
+        self._listener = self._bind()
+        self.models.start_idle_reaper()
+        logger.info("Model server listening on %s", self.address)
+        try:
+            while True:
+                try:
+                    conn = self._listener.accept()
+                except (OSError, EOFError, AuthenticationError):
+                    if self._listener is None:
+                        return
+                    # A client that fails authentication is dropped
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self):
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.close()
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "address": self.address,
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.monotonic() - self.started, 1),
+            "batches": {op: batcher.stats() for op, batcher in self.batchers.items()},
+            **self.models.status()
+        }
+
+class ModelClient:
+    """Call the model server, keeping a pool of connections per process"""
+
+    def __init__(self, address: Optional[str] = None, timeout: Optional[float] = None, fallback: Optional[bool] = None):
+        self.address = address or settings.MODEL_SERVER_ADDRESS
+        self.timeout = timeout or settings.MODEL_SERVER_TIMEOUT
+        self.fallback = settings.MODEL_SERVER_FALLBACK if fallback is None else fallback
+        self._idle: "queue.LifoQueue[Connection]" = queue.LifoQueue()
+        self._pid = os.getpid()
+        self._down_until = 0.0
+
+    def _connection(self) -> Connection:
+        if os.getpid() != self._pid:
+            # Connections inherited through fork belong to the parent
+            self._idle = queue.LifoQueue()
+            self._pid = os.getpid()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return Client(self.address, family="AF_UNIX", authkey=_authkey())
+        except (OSError, EOFError) as e:
+            raise ModelServerUnavailable(f"Cannot reach the model server at {self.address}: {e}")
+
+    def call(self, op: str, payload: Any = None) -> Any:
+        """Run ``op`` on the server; raises ModelServerUnavailable if it cannot be reached"""
+        if time.monotonic() < self._down_until:
+            raise ModelServerUnavailable("The model server was unreachable recently")
+        try:
+            conn = self._connection()
+            try:
+                conn.send((op, payload))
+                if not conn.poll(self.timeout):
+                    conn.close()
+                    raise ModelServerError(f"The model server did not answer {op} within {self.timeout:g}s")
+                status, result = conn.recv()
+            except (OSError, EOFError) as e:
+                conn.close()
+                raise ModelServerUnavailable(f"Lost the connection to the model server: {e}")
+        except ModelServerUnavailable as e:
+            self._down_until = time.monotonic() + settings.MODEL_SERVER_RETRY_SECONDS
+            logger.warning("%s; using in-process models for %gs", e, settings.MODEL_SERVER_RETRY_SECONDS)
+            raise
+        self._idle.put(conn)
+        if status != "ok":
+            raise result
+        return result
+
+    def run(self, op: str, payload: Any, local: Callable[[Any], Any]) -> Any:
+        """Run ``op`` on the server, or with ``local`` in this process if the server is down"""
+        try:
+            result = self.call(op, payload)
+        except ModelServerUnavailable:
+            if not self.fallback:
+                raise
+            MODEL_REQUESTS.inc(op=op, served="local")
+            return local(payload)
+        MODEL_REQUESTS.inc(op=op, served="server")
+        return result
+
+    def status(self) -> Optional[Dict[str, Any]]:
+        """The server's status, or None if it cannot be reached"""
+        try:
+            return self.call("status")
+        except ModelServerUnavailable:
+            return None
+
+_client: Optional[ModelClient] = None
+
+def model_client() -> Optional[ModelClient]:
+    """The shared client when a model server is configured (and this is not it)"""
+    global _client
+    if _serving or not settings.MODEL_SERVER_ADDRESS:
+        return None
+    if _client is None:
+        _client = ModelClient()
+    return _client
+
+def run_model(op: str, payload: Any, local: Callable[[Any], Any]) -> Any:
+    """Run a model operation on the model server if one is configured, else in process"""
+    client = model_client()
+    if client is None:
+        return local(payload)
+    return client.run(op, payload, local)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--address", default=settings.MODEL_SERVER_ADDRESS, help="Unix socket path (default: MODEL_SERVER_ADDRESS)")
+    parser.add_argument("--warmup", nargs="*", default=settings.MODEL_WARMUP, help="models to load at startup")
+    args = parser.parse_args(argv)
+
+    from core.metrics import configure_logging
+    configure_logging(settings.LOG_LEVEL)
+    server = ModelServer(args.address)
+    if args.warmup:
+        server.models.warmup(args.warmup)
+    # Exit through serve_forever's cleanup, which removes the socket file
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
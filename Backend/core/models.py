@@ -0,0 +1,177 @@
+from typing import Dict, Any, Optional, Callable, List
+import asyncio
+import gc
+import os
+import threading
+import time
+from core.config import settings
+
+def process_rss_bytes() -> Optional[int]:
+    """Resident memory of the current process, if it can be determined"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+def _torch_bytes(model: Any) -> Optional[int]:
+    """Size of a torch module's parameters and buffers"""
+    if not hasattr(model, "parameters"):
+        return None
+    total = sum(p.numel() * p.element_size() for p in model.parameters())
+    if hasattr(model, "buffers"):
+        total += sum(b.numel() * b.element_size() for b in model.buffers())
+    return total
+
+class _ModelSlot:
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self.loader = loader
+        self.model: Any = None
+        self.lock = threading.Lock()
+        self.last_used: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.resident_bytes: Optional[int] = None
+
+class ModelManager:
+    """Load models on first use and unload them after a period of inactivity"""
+
+    def __init__(self, idle_timeout: Optional[float] = None):
+        self.idle_timeout = settings.MODEL_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self._slots: Dict[str, _ModelSlot] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        """Register a loader; nothing is loaded until the model is requested"""
+        if name not in self._slots:
+            self._slots[name] = _ModelSlot(name, loader)
+
+    def _slot(self, name: str) -> _ModelSlot:
+        try:
+            return self._slots[name]
+        except KeyError:
+            raise KeyError(f"Unknown model: {name}")
+
+    def get(self, name: str) -> Any:
+        """Return a model, loading it if it is not resident"""
+        slot = self._slot(name)
+        # The timestamp is refreshed under the lock unload_idle checks it with,
+        # so a model is never unloaded between being loaded or used and returned
+        with slot.lock:
+            model = slot.model
+            if model is None:
+                rss_before = process_rss_bytes()
+                started = time.perf_counter()
+                model = slot.loader()
+                slot.load_seconds = time.perf_counter() - started
+                # Prefer the exact tensor size; fall back to the RSS growth
+                parts = model if isinstance(model, tuple) else (model,)
+                sizes = [_torch_bytes(part) for part in parts]
+                if any(size is not None for size in sizes):
+                    slot.resident_bytes = sum(size or 0 for size in sizes)
+                else:
+                    rss_after = process_rss_bytes()
+                    slot.resident_bytes = rss_after - rss_before if rss_before and rss_after else None
+                slot.last_used = time.monotonic()
+                slot.model = model
+            else:
+                slot.last_used = time.monotonic()
+        return model
+
+    def warmup(self, names: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Load the given models (all registered ones by default)"""
+        for name in names or list(self._slots):
+            self.get(name)
+        return self.status()
+
+    def unload(self, name: str) -> bool:
+        """Drop a resident model; returns whether it was loaded"""
+        slot = self._slot(name)
+        with slot.lock:
+            if slot.model is None:
+                return False
+            slot.model = None
+            slot.resident_bytes = None
+        gc.collect()
+        return True
+
+    def unload_idle(self) -> List[str]:
+        """Unload every model unused for longer than ``idle_timeout``"""
+        if not self.idle_timeout:
+            return []
+        unloaded = []
+        for name, slot in self._slots.items():
+            with slot.lock:
+                # Checked under the lock, so a model loaded or used meanwhile stays
+                if slot.model is None or slot.last_used is None or time.monotonic() - slot.last_used <= self.idle_timeout:
+                    continue
+                slot.model = None
+                slot.resident_bytes = None
+            unloaded.append(name)
+        if unloaded:
+            gc.collect()
+        return unloaded
+
+    def status(self) -> Dict[str, Any]:
+        """Load state, idle time and memory footprint of every model"""
+        now = time.monotonic()
+        models = {}
+        for name, slot in self._slots.items():
+            loaded = slot.model is not None
+            models[name] = {
+                "loaded": loaded,
+                "load_seconds": round(slot.load_seconds, 3) if slot.load_seconds is not None else None,
+                "idle_seconds": round(now - slot.last_used, 1) if loaded and slot.last_used is not None else None,
+                "resident_bytes": slot.resident_bytes if loaded else None
+            }
+        return {
+            "idle_timeout": self.idle_timeout,
+            "process_rss_bytes": process_rss_bytes(),
+            "models": models
+        }
+
+    def start_idle_reaper(self, interval: Optional[float] = None) -> threading.Thread:
+        """Unload idle models from a daemon thread, for processes without an event loop"""
+        interval = interval or settings.MODEL_IDLE_CHECK_INTERVAL
+
+        def reap():
+            while True:
+                time.sleep(interval)
+                self.unload_idle()
+
+        thread = threading.Thread(target=reap, name="idle-reaper", daemon=True)
+        thread.start()
+        return thread
+
+    async def run_idle_reaper(self, interval: Optional[float] = None):
+        """Periodically unload idle models; runs until cancelled"""
+        interval = interval or settings.MODEL_IDLE_CHECK_INTERVAL
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.unload_idle)
+
+def _load_blip():
+    from transformers import BlipProcessor, BlipForConditionalGeneration
+    processor = BlipProcessor.from_pretrained(settings.BLIP_MODEL)
+    model = BlipForConditionalGeneration.from_pretrained(settings.BLIP_MODEL)
+    return processor, model
+
+def _load_sentencizer():
+    from core.chunking import load_sentencizer
+    return load_sentencizer()
+
+def _load_embedding():
+    from sentence_transformers import SentenceTransformer
+    if settings.EMBEDDING_NUM_THREADS:
+        import torch
+        torch.set_num_threads(settings.EMBEDDING_NUM_THREADS)
+    return SentenceTransformer(settings.EMBEDDING_MODEL, device=settings.EMBEDDING_DEVICE)
+
+model_manager = ModelManager()
+model_manager.register("blip", _load_blip)
+model_manager.register("sentencizer", _load_sentencizer)
+model_manager.register("embedding", _load_embedding)
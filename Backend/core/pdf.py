@@ -0,0 +1,141 @@
+from typing import Dict, Any, Optional, Iterator, List, NamedTuple
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from core.config import settings
+from core.jobs import nested_workers
+
+class PdfPage(NamedTuple):
+    number: int  # 1-based page number
+    text: str
+    ocr: bool  # text came from OCR because the page had no text layer
+
+def _ocr_page(page) -> str:
+    """Render a page and run Tesseract over it"""
+    import pytesseract
+    from PIL import Image
+    pix = page.get_pixmap(dpi=settings.PDF_OCR_DPI)
+    image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    return pytesseract.image_to_string(image, lang='+'.join(settings.TESSERACT_LANGUAGES))
+
+def _extract_page(page, ocr_scanned: bool) -> PdfPage:
+    text = page.get_text()
+    # A page with images but (almost) no text layer is a scan
+    if ocr_scanned and len(text.strip()) < settings.PDF_OCR_MIN_CHARS and page.get_images():
+        return PdfPage(page.number + 1, _ocr_page(page), True)
+    return PdfPage(page.number + 1, text, False)
+
+def extract_page_range(file_path: str, start: int, end: int, ocr_scanned: bool = True) -> List[PdfPage]:
+    """Extract pages ``[start, end)``; runs inside PDF worker processes"""
+    import fitz  # PyMuPDF
+    with fitz.open(file_path) as doc:
+        return [_extract_page(doc[i], ocr_scanned) for i in range(start, end)]
+
+class PdfExtractor:
+    """Stream the pages of a PDF, fanning large documents out over processes.
+
+    Pages are yielded in order as soon as they are available. Extraction
+    stops at ``max_pages`` pages or after ``time_limit`` seconds; ``stats``
+    records what was extracted and why it stopped. The process pool is
+    started by the first large PDF and kept for later ones until ``close``;
+    inside an ingestion worker it only gets that worker's share of the CPUs.
+    """
+
+    def __init__(
+        self,
+        max_pages: Optional[int] = None,
+        time_limit: Optional[float] = None,
+        workers: Optional[int] = None,
+        parallel_min_pages: Optional[int] = None,
+        ocr_scanned: bool = True
+    ):
+        self.max_pages = max_pages or settings.PDF_MAX_PAGES
+        self.time_limit = time_limit or settings.PDF_TIME_LIMIT
+        self.workers = workers or nested_workers(settings.PDF_WORKERS)
+        self.parallel_min_pages = parallel_min_pages or settings.PDF_PARALLEL_MIN_PAGES
+        self.ocr_scanned = ocr_scanned
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """Page extraction process pool, started on first use"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def close(self):
+        """Stop the process pool; the next large PDF starts a new one"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def iter_pages(self, file_path: str, stats: Optional[Dict[str, Any]] = None, ocr_scanned: Optional[bool] = None) -> Iterator[PdfPage]:
+        """Yield the pages of ``file_path`` in order"""
+        import fitz  # PyMuPDF
+        stats = stats if stats is not None else {}
+        ocr_scanned = self.ocr_scanned if ocr_scanned is None else ocr_scanned
+        with fitz.open(file_path) as doc:
+            page_count = doc.page_count
+        limit = min(page_count, self.max_pages)
+        stats.update({"page_count": page_count, "pages_extracted": 0, "ocr_pages": 0, "truncated": None})
+        if limit < page_count:
+            stats["truncated"] = "page_limit"
+        deadline = time.monotonic() + self.time_limit
+
+        if self.workers > 1 and limit >= self.parallel_min_pages:
+            pages = self._iter_parallel(file_path, limit, deadline, stats, ocr_scanned)
+        else:
+            pages = self._iter_sequential(file_path, limit, deadline, stats, ocr_scanned)
+        for page in pages:
+            stats["pages_extracted"] += 1
+            stats["ocr_pages"] += page.ocr
+            yield page
+
+    def _iter_sequential(self, file_path: str, limit: int, deadline: float, stats: Dict[str, Any], ocr_scanned: bool) -> Iterator[PdfPage]:
+        import fitz  # PyMuPDF
+        with fitz.open(file_path) as doc:
+            for i in range(limit):
+                if time.monotonic() > deadline:
+                    stats["truncated"] = "time_limit"
+                    return
+                yield _extract_page(doc[i], ocr_scanned)
+
+    def _iter_parallel(self, file_path: str, limit: int, deadline: float, stats: Dict[str, Any], ocr_scanned: bool) -> Iterator[PdfPage]:
+        # Several ranges per worker keep the pool busy when pages vary in cost
+        # (OCR pages are far slower) while still yielding early pages early
+        range_size = max(1, -(-limit // (self.workers * 4)))
+        ranges = [(start, min(start + range_size, limit)) for start in range(0, limit, range_size)]
+        executor = self.executor
+        futures = []
+        try:
+            futures = [
+                executor.submit(extract_page_range, file_path, start, end, ocr_scanned)
+                for start, end in ranges
+            ]
+            for future in futures:
+                remaining = deadline - time.monotonic()
+                try:
+                    pages = future.result(timeout=max(remaining, 0))
+                except FutureTimeoutError:
+                    stats["truncated"] = "time_limit"
+                    return
+                yield from pages
+        except BrokenProcessPool:
+            # A crashed worker breaks the pool for good; the next PDF starts
+            # a new one
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
+        finally:
+            # Ranges not started yet once the time limit is hit are dropped
+            for future in futures:
+                future.cancel()
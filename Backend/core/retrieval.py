@@ -0,0 +1,54 @@
+from typing import Dict, Any, List, Tuple, Optional
+import re
+from core.config import settings
+
+_THAI_CHARS = re.compile(r"[฀-๿]")
+
+def has_thai(text: str) -> bool:
+    return bool(_THAI_CHARS.search(text))
+
+def like_patterns(query: str) -> List[str]:
+    """ILIKE patterns matching every whitespace-separated term of a query"""
+    escaped = (term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") for term in query.split())
+    return [f"%{term}%" for term in escaped]
+
+def reciprocal_rank_fusion(legs: Dict[str, List[Dict[str, Any]]], k: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Fuse ranked chunk lists with reciprocal-rank fusion.
+
+    Each leg is a list of hits ordered best first; a hit is a dict with
+    ``document_id``, ``chunk_index``, ``page``, ``text`` and ``score``. A
+    chunk's fused score is the sum of ``1 / (k + rank)`` over the legs that
+    returned it.
+    """
+    k = k or settings.SEARCH_RRF_K
+    fused: Dict[Tuple[int, Any], Dict[str, Any]] = {}
+    for leg, hits in legs.items():
+        for rank, hit in enumerate(hits, start=1):
+            key = (hit["document_id"], hit["chunk_index"])
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = {
+                    "document_id": hit["document_id"],
+                    "chunk_index": hit["chunk_index"],
+                    "page": hit.get("page"),
+                    "text": hit.get("text"),
+                    "score": 0.0,
+                    "sources": {}
+                }
+            entry["score"] += 1.0 / (k + rank)
+            entry["sources"][leg] = round(hit["score"], 4)
+            if not entry["text"]:
+                entry["text"] = hit.get("text")
+    return sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)
+
+def group_by_document(hits: List[Dict[str, Any]], limit: int) -> Dict[int, List[Dict[str, Any]]]:
+    """Group ranked chunk hits under the ``limit`` best-ranked documents"""
+    grouped: Dict[int, List[Dict[str, Any]]] = {}
+    for hit in hits:
+        doc_id = hit["document_id"]
+        if doc_id not in grouped:
+            if len(grouped) >= limit:
+                continue
+            grouped[doc_id] = []
+        grouped[doc_id].append(hit)
+    return grouped
@@ -0,0 +1,126 @@
+from typing import Dict, Any, Optional, Iterator, List, Tuple, Union, BinaryIO
+from datetime import date, datetime, time
+import os
+from core.config import settings
+from core.tokens import count_tokens
+
+Row = Tuple[str, ...]
+
+def _cell(value: Any) -> str:
+    """Render a cell value compactly"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return " ".join(str(value).split())
+
+def _trim(row: Row) -> Row:
+    """Drop trailing empty cells (read-only worksheets pad rows to the sheet width)"""
+    end = len(row)
+    while end and not row[end - 1]:
+        end -= 1
+    return row[:end]
+
+def iter_csv_sheet(source: Union[str, BinaryIO], batch_rows: int) -> Iterator[Row]:
+    """Rows of a CSV file (a path or a binary file object), header first, read ``batch_rows`` at a time"""
+    import pandas as pd
+    reader = pd.read_csv(
+        source,
+        dtype=str,
+        keep_default_na=False,
+        chunksize=batch_rows,
+        encoding_errors="replace",
+        on_bad_lines="warn"
+    )
+    header_sent = False
+    with reader:
+        for batch in reader:
+            if not header_sent:
+                yield tuple(_cell(column) for column in batch.columns)
+                header_sent = True
+            for row in batch.itertuples(index=False, name=None):
+                yield tuple(_cell(value) for value in row)
+
+def iter_xlsx_sheets(file_path: str) -> Iterator[Tuple[str, Iterator[Row]]]:
+    """``(sheet name, rows)`` for each worksheet, streamed in read-only mode"""
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            rows = (tuple(_cell(value) for value in row) for row in worksheet.iter_rows(values_only=True))
+            yield worksheet.title, rows
+    finally:
+        workbook.close()
+
+class SpreadsheetChunker:
+    """Turn spreadsheets into row-group chunks without loading whole sheets.
+
+    The first non-empty row of each sheet is its header. Rows are grouped
+    into chunks of up to ``chunk_tokens`` tokens, and every chunk starts
+    with the sheet name and the header so it can be understood on its own.
+    The document content is a summary of each sheet with a few preview
+    rows rather than the full table.
+    """
+
+    def __init__(self, chunk_tokens: Optional[int] = None, batch_rows: Optional[int] = None, preview_rows: Optional[int] = None):
+        self.chunk_tokens = chunk_tokens or settings.CHUNK_TOKENS
+        self.batch_rows = batch_rows or settings.SPREADSHEET_BATCH_ROWS
+        self.preview_rows = settings.SPREADSHEET_PREVIEW_ROWS if preview_rows is None else preview_rows
+
+    def sheets(self, file_path: str) -> Iterator[Tuple[str, Iterator[Row]]]:
+        if os.path.splitext(file_path)[1].lower() == ".csv":
+            yield os.path.splitext(os.path.basename(file_path))[0], iter_csv_sheet(file_path, self.batch_rows)
+        else:
+            yield from iter_xlsx_sheets(file_path)
+
+    def iter_chunks(self, name: str, rows: Iterator[Row], stats: Dict[str, Any]) -> Iterator[str]:
+        """Yield the chunks of one sheet, recording its size in ``stats``"""
+        header: Optional[Row] = None
+        prefix = ""
+        budget = self.chunk_tokens
+        group: List[str] = []
+        group_tokens = 0
+        stats.update({"name": name, "columns": [], "rows": 0, "preview": []})
+        for row in rows:
+            row = _trim(row)
+            if not row:
+                continue
+            if header is None:
+                header = row
+                prefix = f"Sheet: {name}\n{' | '.join(header)}\n"
+                budget = max(self.chunk_tokens - count_tokens(prefix), 1)
+                stats["columns"] = list(header)
+                continue
+            line = " | ".join(row)
+            tokens = count_tokens(line) + 1
+            if group and group_tokens + tokens > budget:
+                yield prefix + "\n".join(group)
+                group, group_tokens = [], 0
+            group.append(line)
+            group_tokens += tokens
+            stats["rows"] += 1
+            if len(stats["preview"]) < self.preview_rows:
+                stats["preview"].append(line)
+        if group:
+            yield prefix + "\n".join(group)
+
+    def process(self, file_path: str) -> Tuple[str, Dict[str, Any]]:
+        """Return the summary content and chunk metadata of a spreadsheet"""
+        chunks: List[str] = []
+        sheets: List[Dict[str, Any]] = []
+        for name, rows in self.sheets(file_path):
+            stats: Dict[str, Any] = {}
+            chunks.extend(self.iter_chunks(name, rows, stats))
+            sheets.append(stats)
+        return self.summary(sheets), {"chunks": chunks, "sheets": sheets}
+
+    def summary(self, sheets: List[Dict[str, Any]]) -> str:
+        """Document content for sheets whose chunks have been read; drops their previews from the stats"""
+        summary = []
+        for sheet in sheets:
+            lines = [f"Sheet: {sheet['name']} ({sheet['rows']} rows)", " | ".join(sheet["columns"])]
+            lines.extend(sheet.pop("preview"))
+            summary.append("\n".join(lines))
+        return "\n\n".join(summary)
@@ -0,0 +1,28 @@
+import math
+from core.config import settings
+
+_tokenizer = None
+
+def _get_tokenizer():
+    """Load the configured Hugging Face tokenizer once, if any"""
+    global _tokenizer
+    if _tokenizer is None and settings.CONTEXT_TOKENIZER:
+        from transformers import AutoTokenizer
+        _tokenizer = AutoTokenizer.from_pretrained(settings.CONTEXT_TOKENIZER)
+    return _tokenizer
+
+def count_tokens(text: str) -> int:
+    """Count the tokens in a piece of text.
+
+    Uses ``CONTEXT_TOKENIZER`` when configured, otherwise a character-based
+    estimate: roughly four ASCII characters per token, while scripts such as
+    Thai tokenize far more densely.
+    """
+    if not text:
+        return 0
+    tokenizer = _get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    other_chars = len(text) - ascii_chars
+    return math.ceil(ascii_chars / 4 + other_chars / 1.5)
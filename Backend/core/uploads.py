@@ -0,0 +1,416 @@
+"""Resumable chunked uploads.
+
+A client starts an upload with the file's name and size, PUTs the parts in
+any order (retrying or resuming any that failed) and completes it. Each
+upload lives in its own directory under ``UPLOAD_DIR/sessions``:
+
+    session.json   name, size, part size, options and status
+    data           the file, preallocated (sparse) and written part by part
+    parts/<index>  the SHA-256 of each part once it is fully written
+
+Parts are written straight to their offset in ``data`` and are never held
+in memory. Every state change is a file created or replaced atomically, so
+parts of one upload may be sent to different API workers.
+
+``UploadStore.reader`` returns a file object over ``data`` that blocks
+until the next bytes have arrived, which lets formats that can be parsed
+front to back (text, CSV) be chunked and indexed while the upload is
+still in progress. Waiting readers give up once nothing has been written
+to the upload for ``UPLOAD_IDLE_TIMEOUT`` seconds.
+"""
+from typing import Dict, Any, Optional, Iterable, List
+import asyncio
+import hashlib
+import io
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from pydantic import BaseModel, Field
+from core.config import settings
+from core.metrics import logger
+
+_READ_SIZE = 1024 * 1024
+
+class UploadError(Exception):
+    """An upload request that cannot be accepted; ``status_code`` is the HTTP status to answer with"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+class UploadIdleError(UploadError):
+    """Nothing was written to an upload for ``UPLOAD_IDLE_TIMEOUT`` seconds; the upload itself stays open"""
+
+    def __init__(self, message: str):
+        super().__init__(message, 408)
+
+class UploadSession(BaseModel):
+    id: str
+    filename: str
+    size: int
+    part_size: int
+    checksum: Optional[str] = Field(None, description="Expected SHA-256 of the whole file")
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+    ocr: bool = True
+    caption: bool = True
+    status: str = Field("open", description="open, complete or failed")
+    error: Optional[str] = None
+    job_id: Optional[str] = Field(None, description="Ingestion job, once one is running")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    @property
+    def part_count(self) -> int:
+        return max(1, -(-self.size // self.part_size))
+
+    def part_length(self, index: int) -> int:
+        return min(self.part_size, self.size - index * self.part_size)
+
+class PartWriter:
+    """Write one part at its offset while hashing it; used as a context manager
+
+    The part is recorded only when the block exits without an error and the
+    length and checksum match. A part that was already received is not
+    rewritten (a streaming reader may have consumed it): the body is only
+    hashed, and must match what was received before.
+    """
+
+    def __init__(self, store: "UploadStore", session: UploadSession, index: int, checksum: Optional[str] = None):
+        self.store = store
+        self.session = session
+        self.index = index
+        self.checksum = checksum.lower() if checksum else None
+        self.expected = session.part_length(index)
+        self.received = store.part_checksum(session.id, index)
+        self.written = 0
+        self._hash = hashlib.sha256()
+        self._file: Optional[io.BufferedRandom] = None
+
+    def __enter__(self) -> "PartWriter":
+        if self.received is None:
+            self._file = open(self.store.data_path(self.session.id), "r+b")
+            self._file.seek(self.index * self.session.part_size)
+        return self
+
+    def write(self, data: bytes):
+        self.written += len(data)
+        if self.written > self.expected:
+            raise UploadError(f"Part {self.index} is larger than its {self.expected} bytes", 413)
+        self._hash.update(data)
+        if self._file is not None:
+            self._file.write(data)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._file is not None:
+            self._file.close()
+        if exc_type is not None:
+            return False
+        if self.written != self.expected:
+            raise UploadError(f"Part {self.index} has {self.written} bytes, expected {self.expected}")
+        digest = self._hash.hexdigest()
+        if self.checksum and digest != self.checksum:
+            raise UploadError(f"Part {self.index} does not match its checksum", 422)
+        if self.received is not None:
+            if digest != self.received:
+                raise UploadError(f"Part {self.index} was already received with different content", 409)
+            return False
+        self.store._write_atomic(self.store.part_path(self.session.id, self.index), digest)
+        self.store.notify()
+        return False
+
+class UploadReader(io.RawIOBase):
+    """Read an upload front to back, waiting for parts that have not arrived yet
+
+    Raises UploadError if the upload fails, is aborted or expires first.
+    Wrap it in ``io.BufferedReader`` (``UploadStore.reader`` does) for
+    efficient small reads.
+    """
+
+    def __init__(self, store: "UploadStore", upload_id: str, poll: float = 1.0):
+        self.store = store
+        self.upload_id = upload_id
+        self.poll = poll
+        self.position = 0
+        self._available = 0
+        self._parts = 0
+        self._file = open(store.data_path(upload_id), "rb")
+
+    def readable(self) -> bool:
+        return True
+
+    def _refresh(self, session: UploadSession):
+        while self._parts < session.part_count and self.store.part_checksum(self.upload_id, self._parts) is not None:
+            self._parts += 1
+        self._available = min(self._parts * session.part_size, session.size)
+
+    def _wait(self) -> int:
+        """Bytes available past the current position; 0 at the end of the file"""
+        while True:
+            session = self.store.get(self.upload_id)
+            if session is None:
+                raise UploadError(f"Upload {self.upload_id} was aborted or expired", 410)
+            if session.status == "failed":
+                raise UploadError(session.error or f"Upload {self.upload_id} failed", 422)
+            self._refresh(session)
+            if self._available > self.position or self.position >= session.size:
+                return self._available - self.position
+            # Parts written by other workers are noticed on the next poll
+            self.store.check_idle(self.upload_id)
+            self.store.wait(self.poll)
+
+    def readinto(self, buffer) -> int:
+        available = self._wait()
+        if available <= 0:
+            return 0
+        self._file.seek(self.position)
+        count = self._file.readinto(memoryview(buffer)[:min(len(buffer), available)])
+        self.position += count
+        return count
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+class UploadStore:
+    """Upload sessions on disk under ``directory``"""
+
+    def __init__(self, directory: Optional[Path] = None, ttl: Optional[float] = None, idle_timeout: Optional[float] = None):
+        self.directory = Path(directory or settings.UPLOAD_DIR / "sessions")
+        self.ttl = settings.UPLOAD_SESSION_TTL if ttl is None else ttl
+        self.idle_timeout = settings.UPLOAD_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self._changed = threading.Condition()
+
+    def _path(self, upload_id: str) -> Path:
+        # Ids come from URLs; only the ones this store generates are accepted
+        if not upload_id or not all(c in "0123456789abcdef" for c in upload_id):
+            raise UploadError(f"Unknown upload: {upload_id}", 404)
+        return self.directory / upload_id
+
+    def data_path(self, upload_id: str) -> Path:
+        return self._path(upload_id) / "data"
+
+    def part_path(self, upload_id: str, index: int) -> Path:
+        return self._path(upload_id) / "parts" / str(index)
+
+    @staticmethod
+    def _write_atomic(path: Path, content: str):
+        temporary = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        temporary.write_text(content)
+        os.replace(temporary, path)
+
+    def notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait(self, timeout: float):
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def create(
+        self,
+        filename: str,
+        size: int,
+        part_size: Optional[int] = None,
+        checksum: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        ocr: bool = True,
+        caption: bool = True
+    ) -> UploadSession:
+        """Start an upload and preallocate its file"""
+        part_size = part_size or settings.UPLOAD_PART_SIZE
+        if size < 0:
+            raise UploadError("Upload size must not be negative")
+        if size > settings.MAX_UPLOAD_SIZE:
+            raise UploadError(f"File too large; the limit is {settings.MAX_UPLOAD_SIZE} bytes", 413)
+        if not 0 < part_size <= settings.UPLOAD_MAX_PART_SIZE:
+            raise UploadError(f"Part size must be between 1 and {settings.UPLOAD_MAX_PART_SIZE} bytes")
+        self.expire()
+        session = UploadSession(
+            id=uuid.uuid4().hex,
+            filename=os.path.basename(filename),
+            size=size,
+            part_size=part_size,
+            checksum=checksum.lower() if checksum else None,
+            metadata=metadata or {},
+            ocr=ocr,
+            caption=caption
+        )
+        path = self._path(session.id)
+        (path / "parts").mkdir(parents=True)
+        with open(path / "data", "wb") as f:
+            f.truncate(size)
+        self.save(session)
+        return session
+
+    def save(self, session: UploadSession):
+        self._write_atomic(self._path(session.id) / "session.json", session.model_dump_json())
+        self.notify()
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        try:
+            return UploadSession.model_validate_json((self._path(upload_id) / "session.json").read_text())
+        except FileNotFoundError:
+            return None
+
+    def require(self, upload_id: str) -> UploadSession:
+        session = self.get(upload_id)
+        if session is None:
+            raise UploadError(f"Unknown upload: {upload_id}", 404)
+        return session
+
+    def part_checksum(self, upload_id: str, index: int) -> Optional[str]:
+        try:
+            return self.part_path(upload_id, index).read_text()
+        except FileNotFoundError:
+            return None
+
+    def received_parts(self, upload_id: str) -> List[int]:
+        try:
+            names = os.listdir(self._path(upload_id) / "parts")
+        except FileNotFoundError:
+            return []
+        return sorted(int(name) for name in names if name.isdigit())
+
+    def write_part(self, upload_id: str, index: int, checksum: Optional[str] = None) -> PartWriter:
+        """A writer for part ``index``; ``checksum`` is the part's expected SHA-256"""
+        session = self.require(upload_id)
+        if session.status != "open":
+            raise UploadError(f"Upload {upload_id} is {session.status}", 409)
+        if not 0 <= index < session.part_count:
+            raise UploadError(f"Part index must be between 0 and {session.part_count - 1}", 416)
+        return PartWriter(self, session, index, checksum)
+
+    def put_part(self, upload_id: str, index: int, data: Iterable[bytes], checksum: Optional[str] = None):
+        with self.write_part(upload_id, index, checksum) as writer:
+            for block in data:
+                writer.write(block)
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        session = self.require(upload_id)
+        received = self.received_parts(upload_id)
+        missing = sorted(set(range(session.part_count)) - set(received))
+        return {
+            **session.model_dump(exclude={"metadata"}),
+            "parts": session.part_count,
+            "received_parts": len(received),
+            "missing_parts": missing,
+            "received_bytes": sum(session.part_length(index) for index in received)
+        }
+
+    def file_checksum(self, upload_id: str) -> str:
+        digest = hashlib.sha256()
+        with open(self.data_path(upload_id), "rb") as f:
+            while block := f.read(_READ_SIZE):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def complete(self, upload_id: str, checksum: Optional[str] = None) -> UploadSession:
+        """Check that every part arrived and the whole file matches its checksum
+
+        Reads the whole file when a checksum is given, so call it off the
+        event loop. A checksum mismatch fails the upload for good, which also
+        stops a streaming ingestion of it.
+        """
+        session = self.require(upload_id)
+        if session.status == "complete":
+            return session
+        if session.status != "open":
+            raise UploadError(f"Upload {upload_id} is {session.status}", 409)
+        missing = session.part_count - len(self.received_parts(upload_id))
+        if missing:
+            raise UploadError(f"{missing} of {session.part_count} parts have not been received", 409)
+        expected = (checksum.lower() if checksum else None) or session.checksum
+        if expected and self.file_checksum(upload_id) != expected:
+            session.status = "failed"
+            session.error = "The uploaded file does not match its checksum"
+            self.save(session)
+            raise UploadError(session.error, 422)
+        session.status = "complete"
+        self.save(session)
+        return session
+
+    def wait_complete(self, upload_id: str, poll: float = 1.0) -> UploadSession:
+        """Block until the upload is completed; raises UploadError if it fails or disappears"""
+        while True:
+            session = self.get(upload_id)
+            if session is None:
+                raise UploadError(f"Upload {upload_id} was aborted or expired", 410)
+            if session.status == "complete":
+                return session
+            if session.status == "failed":
+                raise UploadError(session.error or f"Upload {upload_id} failed", 422)
+            self.check_idle(upload_id)
+            self.wait(poll)
+
+    @staticmethod
+    def _touched(path: Path) -> float:
+        """When anything of the upload in ``path`` was last written, including a part still arriving"""
+        times = []
+        for entry in [path, path / "parts", path / "session.json", path / "data"]:
+            try:
+                times.append(entry.stat().st_mtime)
+            except FileNotFoundError:
+                continue
+        if not times:
+            raise FileNotFoundError(path)
+        return max(times)
+
+    def check_idle(self, upload_id: str):
+        """Raise UploadIdleError if nothing was written to the upload for ``idle_timeout`` seconds"""
+        if not self.idle_timeout:
+            return
+        try:
+            touched = self._touched(self._path(upload_id))
+        except FileNotFoundError:
+            return  # removed meanwhile; the caller notices on its next check
+        if time.time() - touched > self.idle_timeout:
+            raise UploadIdleError(f"Nothing was received for upload {upload_id} in {self.idle_timeout:g} seconds")
+
+    def reader(self, upload_id: str) -> io.BufferedReader:
+        """A blocking reader of the upload as its parts arrive"""
+        self.require(upload_id)
+        return io.BufferedReader(UploadReader(self, upload_id), buffer_size=_READ_SIZE)
+
+    def take(self, upload_id: str, suffix: str = "") -> Path:
+        """Move a completed upload's file next to the sessions directory, named with ``suffix``, and remove the session"""
+        path = self.directory.parent / f"{upload_id}{suffix}"
+        os.replace(self.data_path(upload_id), path)
+        self.remove(upload_id)
+        return path
+
+    def remove(self, upload_id: str):
+        shutil.rmtree(self._path(upload_id), ignore_errors=True)
+        self.notify()
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Remove sessions untouched for longer than the TTL; returns how many"""
+        if not self.directory.exists():
+            return 0
+        cutoff = (now or time.time()) - self.ttl
+        removed = 0
+        for path in self.directory.iterdir():
+            try:
+                touched = self._touched(path)
+            except FileNotFoundError:
+                continue
+            if touched < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        if removed:
+            self.notify()
+        return removed
+
+    async def run_expiry(self, interval: Optional[float] = None):
+        """Periodically remove expired uploads; runs until cancelled"""
+        interval = interval or settings.UPLOAD_EXPIRE_INTERVAL
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                removed = await asyncio.to_thread(self.expire)
+                if removed:
+                    logger.info("Removed %d expired uploads", removed)
+            except Exception:
+                logger.exception("Upload expiry failed")
@@ -0,0 +1,476 @@
+from typing import Dict, Any, Optional, Iterator, List, Sequence, Tuple
+from contextlib import contextmanager
+from pathlib import Path
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import numpy as np
+from core.config import settings
+
+_METADATA_KEY = re.compile(r"[A-Za-z0-9_]+")
+
+logger = logging.getLogger("owlynn.vector_store")
+
+class VectorStore:
+    """Interface of the chunk vector backends used by MemoryManager.
+
+    Hits are dicts with ``id``, ``metadata``, ``document`` and ``distance``,
+    where distance is the squared L2 distance between normalized vectors
+    (``2 - 2 * cosine``), matching what ChromaDB returns.
+    """
+
+    def add(self, ids: List[str], embeddings: Any, metadatas: Optional[List[Dict[str, Any]]] = None, documents: Optional[List[str]] = None):
+        raise NotImplementedError
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        raise NotImplementedError
+
+    def query(self, embedding: Optional[Sequence[float]] = None, n_results: int = 10, where: Optional[Dict[str, Any]] = None, text: Optional[str] = None) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+class ChromaVectorStore(VectorStore):
+    """A collection on the ChromaDB server"""
+
+    # The server rejects larger add requests
+    MAX_BATCH = 4096
+
+    def __init__(self, client: Any, collection_name: str = "documents"):
+        self.collection = client.get_or_create_collection(collection_name)
+
+    def add(self, ids, embeddings, metadatas=None, documents=None):
+        for start in range(0, len(ids), self.MAX_BATCH):
+            end = start + self.MAX_BATCH
+            self.collection.add(
+                ids=ids[start:end],
+                embeddings=[list(map(float, vector)) for vector in embeddings[start:end]],
+                metadatas=metadatas[start:end] if metadatas is not None else None,
+                documents=documents[start:end] if documents is not None else None
+            )
+
+    def delete(self, ids=None, where=None):
+        self.collection.delete(ids=ids, where=where)
+
+    def query(self, embedding=None, n_results=10, where=None, text=None):
+        query_args: Dict[str, Any] = {"n_results": n_results, "where": where, "include": ["metadatas", "documents", "distances"]}
+        if embedding is not None:
+            query_args["query_embeddings"] = [list(map(float, embedding))]
+        else:
+            query_args["query_texts"] = [text]
+        results = self.collection.query(**query_args)
+        return [
+            {"id": hit_id, "metadata": metadata or {}, "document": document, "distance": distance}
+            for hit_id, metadata, document, distance in zip(
+                results["ids"][0], results["metadatas"][0], results["documents"][0], results["distances"][0]
+            )
+        ]
+
+    def count(self):
+        return self.collection.count()
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class LocalVectorStore(VectorStore):
+    """In-process ANN index over memory-mapped vectors.
+
+    Vectors are normalized and stored row by row in ``vectors.bin`` as
+    float32, or as int8 with a per-row scale in ``scales.bin``. Ids,
+    metadata and documents live in SQLite next to them. Once ``train_size``
+    vectors are stored, k-means centroids are trained (in the background by
+    default) and every row is assigned to its nearest centroid (an
+    inverted-file index), so a query only scores the rows in its ``nprobe``
+    closest lists, plus any row not assigned yet. Deletes are tombstones;
+    re-adding an id replaces it. ``compact`` moves live rows over the
+    space of deleted ones.
+
+    Several processes may share a directory (API workers next to the bulk
+    ingester): writes allocate rows inside an SQLite write transaction,
+    and every instance picks up the file size, dimension and centroids
+    written by the others before using them.
+    """
+
+    # Rows scored at a time, which bounds the memory a query needs
+    QUERY_BLOCK_ROWS = 16384
+    # Deletes compact once at least this many rows (and VECTOR_STORE_COMPACT_RATIO of all) are dead
+    COMPACT_MIN_ROWS = 16384
+    _ASSIGN_BLOCK_ROWS = 65536
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        dtype: Optional[str] = None,
+        nlist: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        train_size: Optional[int] = None,
+        background_train: Optional[bool] = None
+    ):
+        self.path = Path(path or settings.VECTOR_STORE_DIR)
+        os.makedirs(self.path, exist_ok=True)
+        self.nlist = nlist or settings.VECTOR_STORE_NLIST
+        self.nprobe = nprobe or settings.VECTOR_STORE_NPROBE
+        self.train_size = train_size or settings.VECTOR_STORE_TRAIN_SIZE
+        self.background_train = settings.VECTOR_STORE_BACKGROUND_TRAIN if background_train is None else background_train
+        self._lock = threading.RLock()
+        self._training: Optional[threading.Thread] = None
+
+        # Autocommit, so that write transactions are explicit (BEGIN IMMEDIATE)
+        self._db = sqlite3.connect(self.path / "index.sqlite3", timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS items (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                list_id INTEGER,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                metadata TEXT,
+                document TEXT
+            );
+            CREATE INDEX IF NOT EXISTS items_list_idx ON items (list_id) WHERE deleted = 0;
+            CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+        self.dtype = dtype or settings.VECTOR_STORE_DTYPE
+        self.dim: Optional[int] = None
+        self.centroids: Optional[np.ndarray] = None
+        self._centroids_mtime: Optional[int] = None
+        self._vectors: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._sync()
+        if self.dtype not in ("float32", "int8"):
+            raise ValueError(f"Unsupported vector dtype: {self.dtype}")
+
+    # Storage
+
+    def _set_setting(self, key: str, value: Any):
+        self._db.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _sync(self):
+        """Pick up the dimension, dtype and centroids another process may have written"""
+        stored = dict(self._db.execute("SELECT key, value FROM settings").fetchall())
+        self.dtype = stored.get("dtype") or self.dtype
+        if "dim" in stored:
+            self.dim = int(stored["dim"])
+        centroids_path = self.path / "centroids.npy"
+        try:
+            mtime = centroids_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            self.centroids, self._centroids_mtime = None, None
+            return
+        if mtime != self._centroids_mtime:
+            self.centroids = np.load(centroids_path)
+            self._centroids_mtime = mtime
+
+    @contextmanager
+    def _write(self) -> Iterator[None]:
+        """A write transaction; other processes' writers wait until it ends"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._sync()
+                yield
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _allocated(self) -> int:
+        """Rows handed out so far, including ones whose item was deleted"""
+        next_row = self._db.execute("SELECT value FROM settings WHERE key = 'next_row'").fetchone()
+        max_row = self._db.execute("SELECT MAX(row) FROM items").fetchone()[0]
+        return max(int(next_row[0]) if next_row else 0, max_row + 1 if max_row is not None else 0)
+
+    def _open(self, min_rows: int = 0):
+        """Map the vector files, growing them to hold at least ``min_rows``
+
+        The files only grow (under the write transaction), so a mapping made
+        by any process stays valid; it is remapped when the file got larger.
+        """
+        if self.dim is None:
+            return
+        item_size = np.dtype(self.dtype).itemsize
+        vectors_path = self.path / "vectors.bin"
+        scales_path = self.path / "scales.bin"
+        current = os.path.getsize(vectors_path) // (self.dim * item_size) if vectors_path.exists() else 0
+        rows = current
+        if min_rows > current:
+            rows = max(min_rows, current * 2, 1024)
+            with open(vectors_path, "ab") as f:
+                f.truncate(rows * self.dim * item_size)
+            if self.dtype == "int8":
+                with open(scales_path, "ab") as f:
+                    f.truncate(rows * 4)
+        if rows == 0:
+            return
+        if self._vectors is None or self._vectors.shape[0] != rows:
+            self._vectors = np.memmap(vectors_path, dtype=self.dtype, mode="r+", shape=(rows, self.dim))
+            if self.dtype == "int8":
+                self._scales = np.memmap(scales_path, dtype=np.float32, mode="r+", shape=(rows,))
+
+    def _write_rows(self, start: int, vectors: np.ndarray):
+        self._open(start + len(vectors))
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._vectors[start:start + len(vectors)] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._scales[start:start + len(vectors)] = scales
+            self._scales.flush()
+        else:
+            self._vectors[start:start + len(vectors)] = vectors
+        self._vectors.flush()
+
+    def _read_rows(self, rows: np.ndarray) -> np.ndarray:
+        self._open()
+        vectors = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self.dtype == "int8":
+            vectors *= np.asarray(self._scales[rows])[:, None]
+        return vectors
+
+    # Index
+
+    def _assign(self, vectors: np.ndarray) -> Optional[np.ndarray]:
+        if self.centroids is None:
+            return None
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def _maybe_train(self):
+        if self.centroids is not None or (self._training is not None and self._training.is_alive()):
+            return
+        if self.count() < self.train_size:
+            return
+        if not self.background_train:
+            self.train()
+            return
+        self._training = threading.Thread(target=self._train_logged, name="vector-train", daemon=True)
+        self._training.start()
+
+    def _train_logged(self):
+        try:
+            self.train()
+        except Exception:
+            logger.exception("Training the vector index failed")
+
+    def train(self, iterations: int = 10, sample_size: int = 100000) -> bool:
+        """Train spherical k-means centroids and assign every stored row to its list
+
+        Only the sample is read under the lock; k-means runs without it, so
+        adds and queries (exact over unassigned rows) go on meanwhile.
+        Returns False if the index was already trained, here or by another
+        process sharing the directory.
+        """
+        with self._lock:
+            self._sync()
+            if self.centroids is not None:
+                return False
+            live = np.array([row for (row,) in self._db.execute("SELECT row FROM items WHERE deleted = 0 ORDER BY row")], dtype=np.int64)
+            if not len(live):
+                return False
+            rng = np.random.default_rng(0)
+            sample = np.sort(rng.choice(live, size=min(sample_size, len(live)), replace=False))
+            data = self._read_rows(sample)
+        del live
+
+        nlist = min(self.nlist, len(data))
+        centroids = data[rng.choice(len(data), size=nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = data[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+
+        with self._write():
+            if self.centroids is not None:
+                return False
+            temporary = self.path / f".centroids.{os.getpid()}.npy"
+            np.save(temporary, centroids.astype(np.float32))
+            os.replace(temporary, self.path / "centroids.npy")
+            self._sync()
+
+        # Rows added from here on are assigned as they are written; assign
+        # the rest a block per transaction so writers are not held up
+        while True:
+            with self._write():
+                rows = np.array(
+                    [row for (row,) in self._db.execute(
+                        "SELECT row FROM items WHERE list_id IS NULL AND deleted = 0 ORDER BY row LIMIT ?", (self._ASSIGN_BLOCK_ROWS,)
+                    )],
+                    dtype=np.int64
+                )
+                if not len(rows):
+                    return True
+                lists = self._assign(self._read_rows(rows))
+                self._db.executemany(
+                    "UPDATE items SET list_id = ? WHERE row = ?",
+                    [(int(list_id), int(row)) for list_id, row in zip(lists, rows)]
+                )
+
+    def compact(self) -> int:
+        """Move live rows down over the rows of deleted and replaced items; returns the rows reclaimed
+
+        The files keep their size (another process may have them mapped) and
+        the freed rows are reused by later adds. A query running in another
+        process during compaction may score a few moved rows against the
+        wrong vector.
+        """
+        with self._write():
+            self._db.execute("DELETE FROM items WHERE deleted = 1")
+            allocated = self._allocated()
+            live = np.array([row for (row,) in self._db.execute("SELECT row FROM items ORDER BY row")], dtype=np.int64)
+            if len(live) == allocated:
+                return 0
+            self._open()
+            # New positions never exceed old ones, so moving in ascending
+            # order overwrites only rows that were already moved or are dead
+            for start in range(0, len(live), self._ASSIGN_BLOCK_ROWS):
+                rows = live[start:start + self._ASSIGN_BLOCK_ROWS]
+                targets = np.arange(start, start + len(rows))
+                self._vectors[targets] = self._vectors[rows]
+                if self.dtype == "int8":
+                    self._scales[targets] = self._scales[rows]
+                self._db.executemany(
+                    "UPDATE items SET row = ? WHERE row = ?",
+                    [(int(target), int(row)) for target, row in zip(targets, rows) if target != row]
+                )
+            self._vectors.flush()
+            if self._scales is not None:
+                self._scales.flush()
+            self._set_setting("next_row", len(live))
+            return allocated - len(live)
+
+    def _maybe_compact(self):
+        with self._lock:
+            allocated = self._allocated()
+            dead = allocated - self.count()
+        if dead >= self.COMPACT_MIN_ROWS and dead >= allocated * settings.VECTOR_STORE_COMPACT_RATIO:
+            self.compact()
+
+    def _where_sql(self, where: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+        """Translate an equality / ``$in`` metadata filter into SQL"""
+        clauses: List[str] = []
+        params: List[Any] = []
+        for key, condition in (where or {}).items():
+            if not _METADATA_KEY.fullmatch(key):
+                raise ValueError(f"Invalid metadata key: {key}")
+            field = f"json_extract(metadata, '$.{key}')"
+            if isinstance(condition, dict) and "$in" in condition:
+                values = list(condition["$in"])
+                clauses.append(f"{field} IN ({', '.join('?' * len(values))})" if values else "0")
+                params.extend(values)
+            else:
+                value = condition.get("$eq") if isinstance(condition, dict) else condition
+                clauses.append(f"{field} = ?")
+                params.append(value)
+        return "".join(f" AND {clause}" for clause in clauses), params
+
+    # VectorStore API
+
+    def add(self, ids, embeddings, metadatas=None, documents=None):
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        with self._write():
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._set_setting("dim", self.dim)
+                self._set_setting("dtype", self.dtype)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+            start = self._allocated()
+            self._write_rows(start, vectors)
+            lists = self._assign(vectors)
+            self._db.executemany("DELETE FROM items WHERE id = ?", [(str(i),) for i in ids])
+            self._db.executemany(
+                "INSERT INTO items (row, id, list_id, metadata, document) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        start + i,
+                        str(item_id),
+                        int(lists[i]) if lists is not None else None,
+                        json.dumps((metadatas or [{}] * len(ids))[i] or {}),
+                        (documents or [None] * len(ids))[i]
+                    )
+                    for i, item_id in enumerate(ids)
+                ]
+            )
+            self._set_setting("next_row", start + len(ids))
+        self._maybe_train()
+
+    def delete(self, ids=None, where=None):
+        sql, params = self._where_sql(where)
+        if ids is not None:
+            if not ids:
+                return
+            sql += f" AND id IN ({', '.join('?' * len(ids))})"
+            params += [str(i) for i in ids]
+        with self._write():
+            self._db.execute(f"UPDATE items SET deleted = 1 WHERE deleted = 0{sql}", params)
+        self._maybe_compact()
+
+    def query(self, embedding=None, n_results=10, where=None, text=None):
+        if embedding is None:
+            raise ValueError("The local vector store needs a query embedding")
+        query = _normalize(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+
+        with self._lock:
+            self._sync()
+            if self.dim is None:
+                return []
+            sql, params = self._where_sql(where)
+            if self.centroids is not None:
+                probes = np.argsort(-(self.centroids @ query))[:self.nprobe]
+                # Rows written before training finished have no list yet
+                sql += f" AND (list_id IN ({', '.join('?' * len(probes))}) OR list_id IS NULL)"
+                params += [int(p) for p in probes]
+
+            # Score the candidates a block at a time, keeping a running top-k
+            best_rows = np.empty(0, dtype=np.int64)
+            best_scores = np.empty(0, dtype=np.float32)
+            cursor = self._db.execute(f"SELECT row FROM items WHERE deleted = 0{sql} ORDER BY row", params)
+            while block := cursor.fetchmany(self.QUERY_BLOCK_ROWS):
+                rows = np.fromiter((row for (row,) in block), dtype=np.int64, count=len(block))
+                best_rows = np.concatenate([best_rows, rows])
+                best_scores = np.concatenate([best_scores, self._read_rows(rows) @ query])
+                if len(best_rows) > n_results:
+                    keep = np.argpartition(-best_scores, n_results - 1)[:n_results]
+                    best_rows, best_scores = best_rows[keep], best_scores[keep]
+            if not len(best_rows):
+                return []
+            order = np.argsort(-best_scores)
+            best_rows, best_scores = best_rows[order], best_scores[order]
+            details = {
+                row: (item_id, metadata, document)
+                for row, item_id, metadata, document in self._db.execute(
+                    f"SELECT row, id, metadata, document FROM items WHERE row IN ({', '.join('?' * len(best_rows))})",
+                    [int(row) for row in best_rows]
+                )
+            }
+        hits = []
+        for row, score in zip(best_rows, best_scores):
+            item_id, metadata, document = details[int(row)]
+            hits.append({
+                "id": item_id,
+                "metadata": json.loads(metadata) if metadata else {},
+                "document": document,
+                "distance": float(2 - 2 * score)
+            })
+        return hits
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM items WHERE deleted = 0").fetchone()[0]
+
+    def close(self):
+        if self._training is not None:
+            self._training.join()
+        with self._lock:
+            self._db.close()
+            self._vectors = None
+            self._scales = None
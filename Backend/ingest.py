@@ -0,0 +1,308 @@
+"""Bulk-ingest a directory tree into the document store.
+
+Run from the Backend directory:
+
+    python ingest.py /path/to/documents --workers 8
+
+Files are extracted and chunked on a pool of worker processes, embedded in
+cross-file batches and written with one bulk insert per batch. Progress is
+appended to a checkpoint manifest (``.owlynn-ingest.jsonl`` in the
+directory by default), so re-running the command after an interruption
+skips every file that was already stored and has not changed since.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from core.cache import ProcessingCache
+from core.dedup import DedupPlan
+from core.document_processor import process_file_in_worker
+from core.handlers import registry
+from core.jobs import init_worker
+from core.embeddings import EmbeddingPipeline
+from core.memory import MemoryManager
+
+MANIFEST_NAME = ".owlynn-ingest.jsonl"
+
+def supported_extensions() -> set:
+    registry.load_plugins()
+    return set(registry.extensions())
+
+def discover(root: Path) -> Iterator[Path]:
+    """Supported files under ``root`` in a stable order, skipping hidden entries"""
+    extensions = supported_extensions()
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for filename in sorted(filenames):
+            if not filename.startswith(".") and os.path.splitext(filename)[1].lower() in extensions:
+                yield Path(directory) / filename
+
+class IngestManifest:
+    """Append-only record of the files an ingestion run has handled.
+
+    Each line is a JSON object keyed by the path relative to the ingested
+    directory; the last record for a path wins. A file counts as done when
+    its last record succeeded and its size and mtime still match.
+    """
+
+    def __init__(self, path: Path, root: Path):
+        self.path = path
+        self.root = root
+        self.records: Dict[str, Dict[str, Any]] = {}
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut short by an interruption
+                    self.records[record["path"]] = record
+        self._file = open(path, "a", encoding="utf-8")
+
+    def key(self, file_path: Path) -> str:
+        return file_path.relative_to(self.root).as_posix()
+
+    def done(self, file_path: Path, retry_failed: bool = True) -> bool:
+        record = self.records.get(self.key(file_path))
+        if record is None:
+            return False
+        stat = file_path.stat()
+        if record["size"] != stat.st_size or record["mtime_ns"] != stat.st_mtime_ns:
+            return False
+        return record["status"] == "done" or (record["status"] == "failed" and not retry_failed)
+
+    def record(self, file_path: Path, status: str, **details: Any):
+        stat = file_path.stat()
+        record = {"path": self.key(file_path), "status": status, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, **details}
+        self.records[record["path"]] = record
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def flush(self):
+        """Make the records written so far survive a crash"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+class BulkIngester:
+    """Extract files on a process pool and store them in batches"""
+
+    def __init__(
+        self,
+        memory: MemoryManager,
+        embedder: EmbeddingPipeline,
+        manifest: IngestManifest,
+        workers: int,
+        batch_size: int,
+        use_cache: bool = True
+    ):
+        self.memory = memory
+        self.embedder = embedder
+        self.manifest = manifest
+        self.workers = workers
+        self.batch_size = batch_size
+        self.use_cache = use_cache
+        self.cache = ProcessingCache()
+        self.stats = {"files": 0, "failed": 0, "chunks": 0, "embedded_chunks": 0, "worker_restarts": 0}
+        self.started = time.perf_counter()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(self.workers,)
+        )
+
+    def _extracted(self, files: List[Path]) -> Iterator[Tuple[Path, Optional[Tuple[str, Dict[str, Any]]], Optional[str]]]:
+        """Yield ``(path, result, error)`` as workers finish, keeping a bounded backlog
+
+        A worker that dies (a crash in a native parser, the OOM killer) breaks
+        the pool and every file in flight with it. The pool is restarted and
+        those files are retried one at a time, so only a file that crashes a
+        worker again is reported as failed.
+        """
+        executor = self._pool()
+        pending: Dict[Future, Path] = {}
+        queue: Deque[Path] = deque(files)
+        suspects: Deque[Path] = deque()
+        retried: Set[Path] = set()
+        try:
+            while True:
+                try:
+                    if suspects or retried.intersection(pending.values()):
+                        if not pending:
+                            future = executor.submit(process_file_in_worker, str(suspects[0]), self.use_cache)
+                            pending[future] = suspects.popleft()
+                            retried.add(pending[future])
+                    else:
+                        # Limit in-flight files so extracted results do not pile up in memory
+                        while queue and len(pending) < self.workers * 2:
+                            future = executor.submit(process_file_in_worker, str(queue[0]), self.use_cache)
+                            pending[future] = queue.popleft()
+                except BrokenProcessPool:
+                    # An idle worker died; files in flight, if any, report it below
+                    if not pending:
+                        executor.shutdown(wait=False)
+                        executor = self._pool()
+                        self.stats["worker_restarts"] += 1
+                        continue
+                if not pending:
+                    return
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                crashed = any(isinstance(future.exception(), BrokenProcessPool) for future in finished)
+                if crashed:
+                    # The other files in flight fail along with the crashed one
+                    finished, _ = wait(pending)
+                for future in finished:
+                    file_path = pending.pop(future)
+                    error = future.exception()
+                    if isinstance(error, BrokenProcessPool) and file_path not in retried:
+                        suspects.append(file_path)
+                    elif error is not None:
+                        yield file_path, None, str(error)
+                    else:
+                        yield file_path, future.result(), None
+                if crashed:
+                    executor.shutdown(wait=False)
+                    executor = self._pool()
+                    self.stats["worker_restarts"] += 1
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _embed(self, batch: List[Tuple[Path, str, Dict[str, Any]]], plans: Optional[List[DedupPlan]]) -> List[Any]:
+        """Embeddings of each file's canonical chunks, embedding all uncached ones in one call"""
+        embeddings: List[Any] = []
+        missing: List[int] = []
+        canonical: List[List[int]] = []
+        for i, (_, _, metadata) in enumerate(batch):
+            chunks = metadata.get("chunks", [])
+            canonical.append(plans[i].canonical if plans else list(range(len(chunks))))
+            cache_key = metadata.get("cache_key")
+            cached = self.cache.get_embeddings(cache_key) if cache_key else None
+            if cached is not None and len(cached) == len(chunks):
+                embeddings.append(cached[canonical[i]])
+            else:
+                embeddings.append(None)
+                missing.append(i)
+        texts = [batch[i][2]["chunks"][j] for i in missing for j in canonical[i]]
+        vectors = self.embedder.embed_documents(texts) if texts else []
+        offset = 0
+        for i in missing:
+            metadata = batch[i][2]
+            count = len(canonical[i])
+            embeddings[i] = vectors[offset:offset + count]
+            offset += count
+            # Only complete sets are cached; a partial one depends on what was stored before
+            if metadata.get("cache_key") and count and count == len(metadata.get("chunks", [])):
+                self.cache.put_embeddings(metadata["cache_key"], embeddings[i])
+        self.stats["embedded_chunks"] += sum(len(indexes) for indexes in canonical)
+        return embeddings
+
+    def _store(self, batch: List[Tuple[Path, str, Dict[str, Any]]]):
+        # Near-duplicates of stored chunks or of other chunks in the batch are linked, not embedded
+        plans = self.memory.plan_dedup([metadata.get("chunks", []) for _, _, metadata in batch])
+        embeddings = self._embed(batch, plans)
+        documents = []
+        for i, ((file_path, content, metadata), chunk_embeddings) in enumerate(zip(batch, embeddings)):
+            documents.append({
+                "filename": metadata["filename"],
+                "file_type": metadata["file_type"],
+                "content": content,
+                # Chunks (and their pages) are stored as rows of their own
+                # and left out of the document's metadata
+                "metadata": {**metadata, "source_path": self.manifest.key(file_path)},
+                "chunks": metadata.get("chunks", []),
+                "chunk_embeddings": chunk_embeddings,
+                "dedup": plans[i] if plans else None
+            })
+        doc_ids = self.memory.store_documents(documents)
+        for (file_path, _, metadata), doc_id in zip(batch, doc_ids):
+            chunks = len(metadata.get("chunks", []))
+            self.manifest.record(file_path, "done", document_id=doc_id, chunks=chunks)
+            self.stats["files"] += 1
+            self.stats["chunks"] += chunks
+        self.manifest.flush()
+
+    def report(self) -> Dict[str, Any]:
+        seconds = time.perf_counter() - self.started
+        return {
+            **self.stats,
+            "seconds": round(seconds, 2),
+            "files_per_second": round(self.stats["files"] / seconds, 2) if seconds else None,
+            "chunks_per_second": round(self.stats["chunks"] / seconds, 1) if seconds else None,
+            # Share of chunks linked to an existing chunk instead of embedded
+            "dedup_ratio": round(1 - self.stats["embedded_chunks"] / self.stats["chunks"], 4) if self.stats["chunks"] else 0.0
+        }
+
+    def run(self, files: List[Path], progress: bool = True) -> Dict[str, Any]:
+        batch: List[Tuple[Path, str, Dict[str, Any]]] = []
+        for file_path, result, error in self._extracted(files):
+            if error is not None:
+                self.manifest.record(file_path, "failed", error=error)
+                self.stats["failed"] += 1
+                continue
+            content, metadata = result
+            batch.append((file_path, content, metadata))
+            if len(batch) >= self.batch_size:
+                self._store(batch)
+                batch = []
+                if progress:
+                    report = self.report()
+                    print(
+                        f"{report['files']}/{len(files)} files, {report['failed']} failed, "
+                        f"{report['files_per_second']} files/s, {report['chunks_per_second']} chunks/s",
+                        file=sys.stderr
+                    )
+        if batch:
+            self._store(batch)
+        return self.report()
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="extraction processes")
+    parser.add_argument("--batch-size", type=int, default=32, help="files embedded and stored together")
+    parser.add_argument("--manifest", type=Path, help=f"checkpoint file (default: <directory>/{MANIFEST_NAME})")
+    parser.add_argument("--skip-failed", action="store_true", help="do not retry files that failed in an earlier run")
+    parser.add_argument("--no-cache", action="store_true", help="ignore the processing cache")
+    parser.add_argument("--quiet", action="store_true", help="only print the final report")
+    args = parser.parse_args(argv)
+
+    root = args.directory.resolve()
+    manifest = IngestManifest(args.manifest or root / MANIFEST_NAME, root)
+    files = list(discover(root))
+    todo = [f for f in files if not manifest.done(f, retry_failed=not args.skip_failed)]
+    if not args.quiet:
+        print(f"{len(files)} supported files, {len(files) - len(todo)} already ingested", file=sys.stderr)
+
+    embedder = EmbeddingPipeline()
+    memory = MemoryManager(embedder=embedder)
+    ingester = BulkIngester(memory, embedder, manifest, args.workers, args.batch_size, use_cache=not args.no_cache)
+    try:
+        report = ingester.run(todo, progress=not args.quiet)
+    except KeyboardInterrupt:
+        report = {**ingester.report(), "interrupted": True}
+    except Exception:
+        traceback.print_exc()
+        report = {**ingester.report(), "error": True}
+    finally:
+        manifest.close()
+        memory.close()
+    report["skipped"] = len(files) - len(todo)
+    print(json.dumps(report))
+    return 1 if report.get("error") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
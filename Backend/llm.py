@@ -1,17 +1,30 @@
-from langchain_openai import ChatOpenAI
 from typing import List, Dict, Tuple, Any, Optional, Union
 from pydantic import BaseModel, Field
-from langchain_core.messages import HumanMessage, AIMessage
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from core.config import settings
+from core.gateway import LLMGateway
 
 # Base LLM configuration
-llm = ChatOpenAI(
-    openai_api_base="http://localhost:1234/v1",
-    openai_api_key="none",
-    temperature=0.65,
-    max_tokens=8096,
-)
+def create_llm():
+    # langchain_openai (and the openai SDK) take over a second to import,
+    # so the client is only built for the first generation
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        openai_api_base=settings.LLM_BASE_URL,
+        openai_api_key="none",
+        temperature=settings.LLM_TEMPERATURE,
+        max_tokens=settings.LLM_MAX_TOKENS,
+    )
+
+# Every generation goes through the gateway, which bounds concurrency on
+# the LLM server and queues requests by priority
+gateway = LLMGateway(client_factory=create_llm)
+
+def __getattr__(name: str) -> Any:
+    # ``from llm import llm`` still returns the shared client
+    if name == "llm":
+        return gateway.client
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Pydantic models Types
 class Message(BaseModel):
@@ -26,9 +39,11 @@ class State(BaseModel):
     metadata: Dict[str, Any] = Field(default_factory=dict, description="Metadata of the state")
 
 # Convert Pydantic models to LangGraph nodes
-def convert_to_langgraph_message(message: Message) -> Union[HumanMessage, AIMessage]:
+def convert_to_langgraph_message(message: Message) -> Union[HumanMessage, AIMessage, SystemMessage]:
     if message.role == "user":
         return HumanMessage(content=message.content)
+    if message.role == "system":
+        return SystemMessage(content=message.content)
     return AIMessage(content=message.content)
 
 def convert_to_pydantic_message(message: Union[HumanMessage, AIMessage]) -> Message:
@@ -1,21 +1,60 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, BackgroundTasks, Request, Response, Header
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict, Any, Optional
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from typing import List, Dict, Any, Optional, AsyncIterator
 import uuid
 import os
+import json
+import functools
+import asyncio
+import time
 from pathlib import Path
 from pydantic import BaseModel
 import traceback
+from contextlib import asynccontextmanager
 
 from core.config import settings
 from core.memory import MemoryManager
-from core.document_processor import DocumentProcessor
-from llm import llm, State, Message, convert_to_langgraph_message, convert_to_pydantic_message
+from core.document_processor import DocumentProcessor, process_file_in_worker
+from core.jobs import Job, JobQueue
+from core.uploads import PartWriter, UploadStore, UploadSession, UploadError, UploadIdleError
+from core.dedup import DedupPlan
+from core.cache import ResponseCache
+from core.embeddings import EmbeddingPipeline
+from core.models import model_manager
+from core.model_server import model_client, run_model
+from core.context import ContextWindow, PromptWindow, message_tokens, summarize_messages
+from core.metrics import (
+    metrics, logger, configure_logging, start_trace, timed_stage, observe_stage, observe_document, observe_generation,
+    CACHE_REQUESTS, HTTP_REQUEST_SECONDS, LLM_FIRST_TOKEN_SECONDS
+)
+from core.gateway import LLMSaturated
+from llm import gateway, State, Message, convert_to_langgraph_message, convert_to_pydantic_message
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.MODEL_WARMUP:
+        await run_in_threadpool(run_model, "warmup", settings.MODEL_WARMUP, model_manager.warmup)
+    idle_reaper = asyncio.create_task(model_manager.run_idle_reaper())
+    retention = asyncio.create_task(memory_manager.run_retention()) if settings.CONVERSATION_RETENTION_INTERVAL else None
+    upload_expiry = asyncio.create_task(upload_store.run_expiry()) if settings.UPLOAD_EXPIRE_INTERVAL else None
+    yield
+    idle_reaper.cancel()
+    if retention is not None:
+        retention.cancel()
+    if upload_expiry is not None:
+        upload_expiry.cancel()
+    job_queue.shutdown()
+    document_processor.close()
+    memory_manager.close()
 
 app = FastAPI(
     title=settings.APP_NAME,
     description="Local AI Personal Assistant with document processing capabilities",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -27,51 +66,349 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """Time every request by route and, with TRACE_REQUESTS, log it under a trace ID"""
+    trace = start_trace(request.headers.get("X-Request-ID")) if settings.TRACE_REQUESTS else None
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, route=route, status=response.status_code)
+    if trace is not None:
+        response.headers["X-Request-ID"] = trace.id
+
+        # Log once the body is sent so streamed stages are included
+        async def body_then_log(body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                logger.info(
+                    "%s %s %s %.1fms %s", request.method, request.url.path, response.status_code,
+                    (time.perf_counter() - started) * 1000, trace.summary()
+                )
+        response.body_iterator = body_then_log(response.body_iterator)
+    return response
+
 # Initialize components
-memory_manager = MemoryManager()
+configure_logging(settings.LOG_LEVEL)
+embedding_pipeline = EmbeddingPipeline()
+memory_manager = MemoryManager(embedder=embedding_pipeline)
 document_processor = DocumentProcessor()
+context_window = ContextWindow()
+job_queue = JobQueue()
+upload_store = UploadStore()
+# Uploads being indexed while their parts arrive
+streaming_uploads: set = set()
+# Bytes of a part body collected before each write in the threadpool
+UPLOAD_WRITE_BLOCK = 1024 * 1024
+response_cache = ResponseCache(memory_manager.redis_client, embedder=embedding_pipeline) if settings.RESPONSE_CACHE_ENABLED else None
+
+class WarmupRequest(BaseModel):
+    models: Optional[List[str]] = None
+
+class UploadInit(BaseModel):
+    filename: str
+    size: int
+    part_size: Optional[int] = None
+    checksum: Optional[str] = None  # SHA-256 of the whole file, checked on completion
+    metadata: Optional[Dict[str, Any]] = None
+    ocr: bool = True
+    caption: bool = True
 
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
     context: Optional[Dict[str, Any]] = None
 
+async def _build_prompt(session_id: str, user_message: Message) -> PromptWindow:
+    """Fit the session history and the new message into the prompt budget"""
+    with timed_stage("history"):
+        conversation = await memory_manager.aget_conversation(session_id, last_n=settings.CONTEXT_MAX_MESSAGES)
+    with timed_stage("context"):
+        history = [Message(**msg) if isinstance(msg, dict) else msg for msg in (conversation["messages"] if conversation else [])]
+        offset = conversation["message_count"] - len(history) if conversation else 0
+        window = context_window.build(history, user_message, offset)
+    # Only look up the summary once older turns actually fall out of the window
+    if settings.CONTEXT_SUMMARY_ENABLED and (window.dropped or offset > 0):
+        with timed_stage("summary"):
+            summary = await memory_manager.aget_summary(session_id)
+        if summary:
+            with timed_stage("context"):
+                window = context_window.build(history, user_message, offset, summary)
+    return window
+
+async def _refresh_summary(session_id: str, window: PromptWindow):
+    """Roll turns that left the prompt window into the session summary"""
+    if not settings.CONTEXT_SUMMARY_ENABLED or not window.dropped:
+        return
+    try:
+        summary = await memory_manager.aget_summary(session_id)
+        upto = summary["upto"] if summary else 0
+        dropped_start = window.first_kept - len(window.dropped)
+        pending = window.dropped[max(0, upto - dropped_start):]
+        if len(pending) < settings.CONTEXT_SUMMARY_BATCH:
+            return
+        content = await summarize_messages(pending, summary["content"] if summary else None)
+        await memory_manager.astore_summary(session_id, {"content": content, "upto": window.first_kept})
+    except Exception:
+        traceback.print_exc()
+
+def _window_metadata(window: PromptWindow) -> Dict[str, Any]:
+    """Prompt statistics reported alongside a response"""
+    return {
+        "prompt_tokens": window.prompt_tokens,
+        "context_messages": len(window.messages),
+        "summary_used": window.summary_used
+    }
+
+def _cacheable(window: PromptWindow) -> bool:
+    """Whether the reply to this prompt may be served from or stored in the response cache"""
+    if response_cache is None:
+        return False
+    return not settings.RESPONSE_CACHE_FIRST_TURN_ONLY or len(window.messages) == 1
+
+async def _cached_response(request: ChatRequest, window: PromptWindow) -> Optional[Dict[str, Any]]:
+    """Look the prompt up in the response cache; cache errors count as misses"""
+    if not _cacheable(window):
+        return None
+    try:
+        with timed_stage("response_cache"):
+            cached = await response_cache.alookup(request.message, request.context)
+    except Exception:
+        traceback.print_exc()
+        return None
+    CACHE_REQUESTS.inc(cache="response", result=cached["match"] if cached else "miss")
+    return cached
+
+async def _store_response(request: ChatRequest, content: str, generation_seconds: float):
+    try:
+        await response_cache.astore(request.message, request.context, content, generation_seconds)
+    except Exception:
+        traceback.print_exc()
+
+def _cache_metadata(cached: Dict[str, Any]) -> Dict[str, Any]:
+    return {"cache": {"match": cached["match"], "similarity": cached["similarity"]}}
+
+def _saturated(e: LLMSaturated) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def _observe_llm(window: PromptWindow, ai_message: Message, seconds: float, timings: Dict[str, Any], usage: Optional[Dict[str, Any]] = None):
+    """Record LLM time and tokens, preferring the server's own token counts"""
+    usage = usage or {}
+    queue_seconds = timings.get("queue", 0.0)
+    observe_stage("llm_queue", queue_seconds)
+    seconds -= queue_seconds
+    observe_stage("llm", seconds)
+    observe_generation(usage.get("input_tokens", window.prompt_tokens), usage.get("output_tokens", message_tokens(ai_message)), seconds)
+
 @app.post("/api/v1/chat")
-async def chat(request: ChatRequest) -> Dict[str, Any]:
+async def chat(request: ChatRequest, background_tasks: BackgroundTasks) -> Dict[str, Any]:
     message = request.message
     session_id = request.session_id
     context = request.context
     try:
         if not session_id:
             session_id = str(uuid.uuid4())
-        conversation = memory_manager.get_conversation(session_id)
-        messages = [Message(**msg) if isinstance(msg, dict) else msg for msg in (conversation["messages"] if conversation else [])]
-        user_message = Message(role="user", content=message, metadata=context or {})
-        messages.append(user_message)
-        langgraph_messages = [convert_to_langgraph_message(msg) for msg in messages]
-        response = llm.invoke(langgraph_messages)
-        ai_message = convert_to_pydantic_message(response)
-        messages.append(ai_message)
-        memory_manager.store_conversation(session_id, messages)
+        user_message = Message(role="user", content=message, metadata=dict(context or {}))
+        window = await _build_prompt(session_id, user_message)
+        cached = await _cached_response(request, window)
+        if cached:
+            ai_message = Message(role="assistant", content=cached["response"], metadata=_cache_metadata(cached))
+        else:
+            with timed_stage("prompt"):
+                langgraph_messages = [convert_to_langgraph_message(msg) for msg in window.messages]
+            started = time.perf_counter()
+            llm_timings: Dict[str, Any] = {}
+            response = await gateway.ainvoke(langgraph_messages, timings=llm_timings)
+            generation_seconds = time.perf_counter() - started
+            ai_message = convert_to_pydantic_message(response)
+            _observe_llm(window, ai_message, generation_seconds, llm_timings, getattr(response, "usage_metadata", None))
+            if _cacheable(window):
+                background_tasks.add_task(_store_response, request, ai_message.content, generation_seconds)
+        ai_message.metadata.update(_window_metadata(window))
+        message_tokens(ai_message)
+        with timed_stage("persist"):
+            await memory_manager.aappend_messages(session_id, [user_message, ai_message])
+        background_tasks.add_task(_refresh_summary, session_id, window)
         return {
             "session_id": session_id,
             "response": ai_message.content,
             "metadata": ai_message.metadata
         }
+    except LLMSaturated as e:
+        raise _saturated(e)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _sse(event: Dict[str, Any]) -> str:
+    """Format an event as a Server-Sent Events frame"""
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@app.post("/api/v1/chat/stream")
+async def chat_stream(request: ChatRequest) -> StreamingResponse:
+    """Stream the assistant reply token by token as Server-Sent Events.
+
+    Each frame carries a JSON event: ``{"type": "token", "content": ...}`` for
+    every chunk emitted by the model, followed by a single ``done`` event (or an
+    ``error`` event). The conversation is only persisted once the stream has
+    completed, so an aborted stream leaves the stored history untouched.
+    """
+    session_id = request.session_id or str(uuid.uuid4())
+    user_message = Message(role="user", content=request.message, metadata=dict(request.context or {}))
+    try:
+        window = await _build_prompt(session_id, user_message)
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+    with timed_stage("prompt"):
+        langgraph_messages = [convert_to_langgraph_message(msg) for msg in window.messages]
+    cached = await _cached_response(request, window)
+    if not cached:
+        # Reject before the stream starts so the client sees a real 429
+        try:
+            gateway.check_admission()
+        except LLMSaturated as e:
+            raise _saturated(e)
 
-@app.post("/api/v1/upload")
+    async def event_stream() -> AsyncIterator[str]:
+        yield _sse({"type": "start", "session_id": session_id, **_window_metadata(window)})
+        parts: List[str] = []
+        metadata = _window_metadata(window)
+        try:
+            if cached:
+                # A cached reply is sent whole as a single token event
+                parts.append(cached["response"])
+                metadata.update(_cache_metadata(cached))
+                yield _sse({"type": "token", "content": cached["response"]})
+            else:
+                started = time.perf_counter()
+                llm_timings: Dict[str, Any] = {}
+                async for chunk in gateway.astream(langgraph_messages, timings=llm_timings):
+                    if chunk.content:
+                        if not parts:
+                            LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                        parts.append(chunk.content)
+                        yield _sse({"type": "token", "content": chunk.content})
+                generation_seconds = time.perf_counter() - started
+            ai_message = Message(role="assistant", content="".join(parts), metadata=metadata)
+            message_tokens(ai_message)
+            if not cached:
+                _observe_llm(window, ai_message, generation_seconds, llm_timings)
+            with timed_stage("persist"):
+                await memory_manager.aappend_messages(session_id, [user_message, ai_message])
+            yield _sse({"type": "done", "session_id": session_id, "metadata": ai_message.metadata})
+            if not cached and _cacheable(window):
+                await _store_response(request, ai_message.content, generation_seconds)
+        except Exception as e:
+            traceback.print_exc()
+            yield _sse({"type": "error", "detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(_refresh_summary, session_id, window)
+    )
+
+async def _ingest_file(
+    job: Job,
+    file_path: Path,
+    filename: str,
+    metadata: Optional[Dict[str, Any]] = None,
+    ocr: bool = True,
+    caption: bool = True
+) -> Dict[str, Any]:
+    """Extract, embed and store an uploaded file as a background job"""
+    try:
+        # Parsing, OCR, captioning and chunking run in a worker process
+        with job.stage("extract") as stage:
+            content, file_metadata = await job_queue.run_in_worker(process_file_in_worker, str(file_path), True, ocr, caption)
+            file_metadata["filename"] = filename
+            stage.detail["cache_hit"] = file_metadata.get("cache_hit", False)
+        file_type = os.path.splitext(filename)[1].lower()
+        CACHE_REQUESTS.inc(cache="processing", result="hit" if file_metadata.get("cache_hit") else "miss")
+        if not file_metadata.get("cache_hit"):
+            observe_document(file_type, file_metadata.get("timings", {}))
+        
+        # Near-duplicates of stored chunks (and of earlier chunks of this
+        # file) are linked instead of embedded
+        chunks = file_metadata.get("chunks", [])
+        with job.stage("dedup") as stage:
+            plans = await memory_manager.aplan_dedup([chunks])
+            dedup = plans[0] if plans else None
+            canonical = dedup.canonical if dedup else list(range(len(chunks)))
+            if dedup:
+                stage.detail.update(dedup.summary())
+        
+        # Embed every chunk in batches, reusing embeddings of identical files
+        cache_key = file_metadata.get("cache_key")
+        with job.stage("embed") as stage:
+            chunk_embeddings = await run_in_threadpool(document_processor.cache.get_embeddings, cache_key) if cache_key else None
+            embeddings_cached = chunk_embeddings is not None and len(chunk_embeddings) == len(chunks)
+            if embeddings_cached:
+                chunk_embeddings = chunk_embeddings[canonical]
+            else:
+                chunk_embeddings = await run_in_threadpool(embedding_pipeline.embed_documents, [chunks[i] for i in canonical])
+                # Only complete sets are cached; a partial one depends on what was stored before
+                if cache_key and len(chunks) and len(canonical) == len(chunks):
+                    await run_in_threadpool(document_processor.cache.put_embeddings, cache_key, chunk_embeddings)
+            stage.detail.update({"chunks": len(chunks), "embedded": len(canonical), "cached": embeddings_cached})
+        embedding_seconds = job.stages["embed"].seconds
+        CACHE_REQUESTS.inc(cache="embeddings", result="hit" if embeddings_cached else "miss")
+        
+        # Store in database
+        with job.stage("store"):
+            document_id = await memory_manager.astore_document(
+                filename=filename,
+                file_type=os.path.splitext(filename)[1],
+                content=content,
+                metadata={**(metadata or {}), **file_metadata},
+                chunks=chunks,
+                chunk_embeddings=chunk_embeddings,
+                dedup=dedup
+            )
+        observe_document(file_type, {name: stage.seconds for name, stage in job.stages.items()})
+        
+        return {
+            "document_id": document_id,
+            "filename": filename,
+            "content": content,
+            "metadata": file_metadata,
+            "ingestion": {
+                "cache_hit": file_metadata.get("cache_hit", False),
+                "embeddings_cached": embeddings_cached,
+                "chunks": len(chunks),
+                "embedded_chunks": len(canonical),
+                "dedup": dedup.summary() if dedup else None,
+                "embedding_seconds": embedding_seconds,
+                "chunks_per_second": round(len(chunks) / embedding_seconds, 1) if embedding_seconds else None
+            }
+        }
+    finally:
+        # Cleanup
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+@app.post("/api/v1/upload", status_code=202)
 async def upload_file(
     file: UploadFile = File(...),
-    metadata: Optional[Dict[str, Any]] = None
+    metadata: Optional[Dict[str, Any]] = None,
+    ocr: bool = True,
+    caption: bool = True
 ) -> Dict[str, Any]:
-    """Upload and process a file"""
+    """Upload a file and queue it for processing
+    
+    ``ocr=false`` skips Tesseract and ``caption=false`` skips image
+    captioning, which makes image and scanned PDF uploads much cheaper.
+    """
+    # Store under a unique name so concurrent uploads of the same file name
+    # do not overwrite each other
+    file_path = settings.UPLOAD_DIR / f"{uuid.uuid4().hex}{os.path.splitext(file.filename)[1].lower()}"
     try:
         # Validate file size
         file_size = 0
-        file_path = settings.UPLOAD_DIR / file.filename
         
         # Save file
         with open(file_path, "wb") as f:
@@ -83,43 +420,381 @@ async def upload_file(
                         detail="File too large"
                     )
                 f.write(chunk)
-        
-        # Process file
-        content, file_metadata = document_processor.process_file(str(file_path))
-        
-        # Store in database
-        memory_manager.store_document(
-            filename=file.filename,
-            file_type=os.path.splitext(file.filename)[1],
-            content=content,
-            metadata={**(metadata or {}), **file_metadata}
-        )
-        
-        return {
-            "filename": file.filename,
-            "content": content,
-            "metadata": file_metadata
-        }
-        
+    except HTTPException:
+        os.remove(file_path)
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        # Cleanup
         if os.path.exists(file_path):
             os.remove(file_path)
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    job = job_queue.submit(
+        file.filename,
+        functools.partial(_ingest_file, file_path=file_path, filename=file.filename, metadata=metadata, ocr=ocr, caption=caption),
+        stages=["extract", "dedup", "embed", "store"]
+    )
+    return {
+        "job_id": job.id,
+        "filename": file.filename,
+        "status": job.status,
+        "status_url": f"{settings.API_V1_STR}/jobs/{job.id}"
+    }
+
+def _upload_error(e: UploadError) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=str(e))
+
+def _upload_status(upload_id: str) -> Dict[str, Any]:
+    status = upload_store.status(upload_id)
+    status["parts_url"] = f"{settings.API_V1_STR}/uploads/{upload_id}/parts/{{index}}"
+    if status["job_id"]:
+        status["status_url"] = f"{settings.API_V1_STR}/jobs/{status['job_id']}"
+    return status
+
+def _index_stream(job: Job, upload: UploadSession, handler: Any) -> Dict[str, Any]:
+    """Chunk, embed and store an upload batch by batch as its parts arrive (runs in a thread)"""
+    file_type = os.path.splitext(upload.filename)[1].lower()
+    reader = upload_store.reader(upload.id)
+    extracted: Dict[str, Any] = {}
+
+    def chunks():
+        extracted["result"] = yield from handler(
+            document_processor, reader, filename=upload.filename, ocr=upload.ocr, caption=upload.caption
+        )
+
+    document_id = memory_manager.create_document(
+        upload.filename, file_type, {**upload.metadata, "filename": upload.filename, "upload_id": upload.id}
+    )
+    stored = 0
+    embedded = 0
+    duplicates: List[Any] = []
+    try:
+        with job.stage("stream") as stage:
+            def flush(batch: List[str]):
+                nonlocal stored, embedded
+                plans = memory_manager.plan_dedup([batch])
+                dedup = plans[0] if plans else None
+                canonical = dedup.canonical if dedup else list(range(len(batch)))
+                chunk_embeddings = embedding_pipeline.embed_documents([batch[i] for i in canonical])
+                memory_manager.append_chunks(document_id, upload.filename, file_type, stored, batch, chunk_embeddings, dedup)
+                duplicates.extend(dedup.duplicates if dedup else [None] * len(batch))
+                stored += len(batch)
+                embedded += len(canonical)
+                stage.detail.update({"chunks": stored, "embedded": embedded, "bytes_read": reader.raw.position})
+
+            batch: List[str] = []
+            for chunk in chunks():
+                batch.append(chunk)
+                if len(batch) >= settings.UPLOAD_STREAM_BATCH:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+
+        # The file is only accepted once the client completes the upload and
+        # its checksum matches
+        with job.stage("finalize"):
+            upload_store.wait_complete(upload.id)
+            content, file_metadata = extracted["result"]
+            dedup_summary = DedupPlan([], duplicates).summary([document_id], document_id) if settings.DEDUP_ENABLED else None
+            file_metadata = {**file_metadata, "filename": upload.filename, "file_type": file_type, "file_size": upload.size, "handler": "stream"}
+            metadata = {**upload.metadata, **file_metadata, "upload_id": upload.id}
+            if dedup_summary:
+                metadata["dedup"] = dedup_summary
+            memory_manager.finish_document(document_id, content, metadata)
+    except Exception as e:
+        memory_manager.delete_document(document_id)
+        session = upload_store.get(upload.id)
+        if isinstance(e, UploadIdleError) and session is not None and session.status == "open":
+            # Free the streaming slot; the upload is processed on completion
+            # like any other
+            session.job_id = None
+            upload_store.save(session)
+        elif session is not None and session.status != "failed":
+            session.status = "failed"
+            session.error = f"Indexing failed: {e}"
+            upload_store.save(session)
+        raise
+    finally:
+        reader.close()
+    upload_store.remove(upload.id)
+    observe_document(file_type, {name: stage.seconds for name, stage in job.stages.items()})
+    return {
+        "document_id": document_id,
+        "filename": upload.filename,
+        "metadata": file_metadata,
+        "ingestion": {
+            "streamed": True,
+            "chunks": stored,
+            "embedded_chunks": embedded,
+            "dedup": dedup_summary
+        }
+    }
+
+async def _stream_upload(job: Job, upload: UploadSession, handler: Any) -> Dict[str, Any]:
+    try:
+        return await run_in_threadpool(_index_stream, job, upload, handler)
+    finally:
+        streaming_uploads.discard(upload.id)
+
+@app.post("/api/v1/uploads", status_code=201)
+async def start_upload(request: UploadInit) -> Dict[str, Any]:
+    """Start a resumable chunked upload
+    
+    PUT the parts to ``parts_url`` (``part_size`` bytes each, the last one
+    shorter) in any order, then POST to ``/complete``. Text and CSV files
+    are indexed while the parts arrive, in order; other formats are queued
+    for processing on completion.
+    """
+    if document_processor.handler_for(request.filename) is None:
+        raise HTTPException(status_code=415, detail=f"Unsupported file type: {os.path.splitext(request.filename)[1]}")
+    try:
+        upload = await run_in_threadpool(
+            upload_store.create, request.filename, request.size, request.part_size,
+            request.checksum, request.metadata, request.ocr, request.caption
+        )
+    except UploadError as e:
+        raise _upload_error(e)
+    
+    handler = document_processor.handlers.incremental(os.path.splitext(upload.filename)[1]) if settings.UPLOAD_STREAMING else None
+    if handler is not None and len(streaming_uploads) < settings.UPLOAD_MAX_STREAMING:
+        # Streaming jobs mostly wait for parts, so they do not take ingestion slots
+        streaming_uploads.add(upload.id)
+        job = job_queue.submit(
+            upload.filename,
+            functools.partial(_stream_upload, upload=upload, handler=handler),
+            stages=["stream", "finalize"],
+            limited=False
+        )
+        upload.job_id = job.id
+        upload_store.save(upload)
+    return _upload_status(upload.id)
+
+async def _write_part(writer: PartWriter, request: Request):
+    """Write a request body through ``writer`` in the threadpool, a few blocks at a time"""
+    await run_in_threadpool(writer.__enter__)
+    try:
+        block = bytearray()
+        async for data in request.stream():
+            block += data
+            if len(block) >= UPLOAD_WRITE_BLOCK:
+                await run_in_threadpool(writer.write, bytes(block))
+                block.clear()
+        if block:
+            await run_in_threadpool(writer.write, bytes(block))
+    except BaseException as e:
+        await run_in_threadpool(writer.__exit__, type(e), e, e.__traceback__)
+        raise
+    await run_in_threadpool(writer.__exit__, None, None, None)
+
+@app.put("/api/v1/uploads/{upload_id}/parts/{index}")
+async def upload_part(
+    upload_id: str,
+    index: int,
+    request: Request,
+    checksum: Optional[str] = Header(None, alias="X-Checksum-SHA256")
+) -> Dict[str, Any]:
+    """Store one part of an upload; re-sending a received part is a no-op if it is identical"""
+    try:
+        writer = await run_in_threadpool(upload_store.write_part, upload_id, index, checksum)
+        await _write_part(writer, request)
+        return _upload_status(upload_id)
+    except UploadError as e:
+        raise _upload_error(e)
+
+@app.get("/api/v1/uploads/{upload_id}")
+async def upload_status(upload_id: str) -> Dict[str, Any]:
+    """Received and missing parts, for resuming an upload"""
+    try:
+        return _upload_status(upload_id)
+    except UploadError as e:
+        raise _upload_error(e)
+
+@app.post("/api/v1/uploads/{upload_id}/complete", status_code=202)
+async def complete_upload(upload_id: str, checksum: Optional[str] = None) -> Dict[str, Any]:
+    """Finish an upload once every part is in, verifying the file's SHA-256 if one was given"""
+    try:
+        upload = await run_in_threadpool(upload_store.complete, upload_id, checksum)
+        if upload.job_id is None:
+            file_path = await run_in_threadpool(upload_store.take, upload_id, os.path.splitext(upload.filename)[1].lower())
+    except UploadError as e:
+        raise _upload_error(e)
+    
+    job_id = upload.job_id
+    if job_id is None:
+        job_id = job_queue.submit(
+            upload.filename,
+            functools.partial(
+                _ingest_file, file_path=file_path, filename=upload.filename,
+                metadata=upload.metadata, ocr=upload.ocr, caption=upload.caption
+            ),
+            stages=["extract", "dedup", "embed", "store"]
+        ).id
+    job = job_queue.get(job_id)
+    return {
+        "upload_id": upload_id,
+        "job_id": job_id,
+        "filename": upload.filename,
+        "status": job.status if job else None,
+        "status_url": f"{settings.API_V1_STR}/jobs/{job_id}"
+    }
+
+@app.delete("/api/v1/uploads/{upload_id}")
+async def abort_upload(upload_id: str) -> Dict[str, Any]:
+    """Abandon an upload and its parts; a document being indexed from it is removed"""
+    try:
+        upload_store.require(upload_id)
+    except UploadError as e:
+        raise _upload_error(e)
+    await run_in_threadpool(upload_store.remove, upload_id)
+    return {"upload_id": upload_id, "deleted": True}
+
+@app.get("/api/v1/jobs")
+async def list_jobs() -> Dict[str, Any]:
+    """Status of recent ingestion jobs"""
+    return {
+        **job_queue.stats(),
+        "items": [job.summary() for job in job_queue.list_jobs()]
+    }
+
+@app.get("/api/v1/jobs/{job_id}")
+async def job_status(job_id: str) -> Dict[str, Any]:
+    """Status and per-stage progress of an ingestion job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.summary()
+
+@app.get("/api/v1/jobs/{job_id}/result")
+async def job_result(job_id: str) -> Dict[str, Any]:
+    """Result of a completed ingestion job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return job.result
 
 @app.get("/api/v1/search")
 async def search_documents(
     query: str,
+    response: Response,
     limit: int = 5
 ) -> List[Dict[str, Any]]:
     """Search through processed documents"""
     try:
-        results = memory_manager.search_documents(query, limit)
+        timings: Dict[str, float] = {}
+        results = await memory_manager.asearch_documents(query, limit, timings=timings)
+        for name, milliseconds in timings.items():
+            if name != "cache":
+                observe_stage(f"search_{name}", milliseconds / 1000)
+        # Per-leg timings (vector, lexical, fusion, hydrate) in milliseconds
+        response.headers["Server-Timing"] = ", ".join(f"{name};dur={value}" for name, value in timings.items())
         return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.delete("/api/v1/documents/{document_id}")
+async def delete_document(document_id: int) -> Dict[str, Any]:
+    """Remove a document and its chunks from the index"""
+    if not await memory_manager.adelete_document(document_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"document_id": document_id, "deleted": True}
+
+@app.get("/api/v1/documents/dedup")
+async def dedup_stats() -> Dict[str, Any]:
+    """Stored chunks and the share linked as near duplicates instead of embedded"""
+    return await run_in_threadpool(memory_manager.dedup_stats)
+
+@app.get("/api/v1/cache")
+async def cache_stats() -> Dict[str, Any]:
+    """Size of the document processing cache"""
+    return await run_in_threadpool(document_processor.cache.stats)
+
+@app.delete("/api/v1/cache")
+async def clear_cache() -> Dict[str, Any]:
+    """Drop every cached processing result"""
+    removed = await run_in_threadpool(document_processor.cache.clear)
+    return {"removed": removed}
+
+@app.delete("/api/v1/cache/{cache_key}")
+async def invalidate_cache_entry(cache_key: str) -> Dict[str, Any]:
+    """Drop the cached processing result of a single file"""
+    if not await run_in_threadpool(document_processor.cache.invalidate, cache_key):
+        raise HTTPException(status_code=404, detail="Cache entry not found")
+    return {"removed": 1}
+
+@app.get("/api/v1/response-cache")
+async def response_cache_stats() -> Dict[str, Any]:
+    """Hits, misses and generation time saved by the response cache"""
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **await run_in_threadpool(response_cache.stats)}
+
+@app.delete("/api/v1/response-cache")
+async def clear_response_cache() -> Dict[str, Any]:
+    """Drop every cached chat response"""
+    if response_cache is None:
+        return {"removed": 0}
+    removed = await run_in_threadpool(response_cache.clear)
+    return {"removed": removed}
+
+@app.get("/api/v1/formats")
+async def supported_formats() -> List[Dict[str, Any]]:
+    """Registered file format handlers and their capabilities"""
+    return [handler.describe() for handler in document_processor.handlers.handlers()]
+
+@app.get("/api/v1/llm")
+async def llm_status() -> Dict[str, Any]:
+    """Concurrency, queue depth and limits of the LLM gateway"""
+    return gateway.stats()
+
+@app.get("/api/v1/models")
+async def model_status() -> Dict[str, Any]:
+    """Load state and memory footprint of the local models, and of the model server if one is used"""
+    status = model_manager.status()
+    client = model_client()
+    if client is not None:
+        status["server"] = await run_in_threadpool(client.status)
+    return status
+
+@app.post("/api/v1/models/warmup")
+async def warmup_models(request: WarmupRequest) -> Dict[str, Any]:
+    """Load models ahead of the first request that needs them"""
+    try:
+        return await run_in_threadpool(run_model, "warmup", request.models, model_manager.warmup)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+@app.post("/api/v1/models/{name}/unload")
+async def unload_model(name: str) -> Dict[str, Any]:
+    """Release a resident model"""
+    try:
+        unloaded = await run_in_threadpool(run_model, "unload", name, model_manager.unload)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    return {"model": name, "unloaded": unloaded}
+
+INGESTION_JOBS = metrics.gauge("owlynn_ingestion_jobs", "Tracked ingestion jobs by status", ["status"])
+
+def _collect_metrics():
+    """Mirror statistics kept by other components into the registry"""
+    for name, stats in memory_manager.cache_stats().items():
+        CACHE_REQUESTS.set(stats["hits"], cache=name, result="hit")
+        CACHE_REQUESTS.set(stats["misses"], cache=name, result="miss")
+    for status, count in job_queue.stats()["jobs"].items():
+        INGESTION_JOBS.set(count, status=status)
+
+metrics.add_collector(_collect_metrics)
+
+@app.get("/api/v1/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint() -> PlainTextResponse:
+    """Request, pipeline, LLM, database and cache metrics in the Prometheus text format"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/api/v1/health")
 async def health_check() -> Dict[str, str]:
     """Health check endpoint"""
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import time
+import numpy as np
+import pytest
+from core.cache import LRUCache, ProcessingCache, ResponseCache, file_sha256, normalize_prompt
+
+def _key(name: str) -> str:
+    return hashlib.sha256(name.encode("utf-8")).hexdigest()
+
+def test_cache_round_trip(tmp_path):
+    """Test that results and embeddings come back as stored"""
+    cache = ProcessingCache(cache_dir=tmp_path, max_bytes=10 * 1024 * 1024)
+    key = _key("handbook.pdf")
+    assert cache.get(key) is None
+    
+    cache.put(key, "content", {"chunks": ["a", "b"]})
+    cache.put_embeddings(key, np.ones((2, 4), dtype=np.float32))
+    
+    content, metadata = cache.get(key)
+    assert content == "content"
+    assert metadata["chunks"] == ["a", "b"]
+    assert cache.get_embeddings(key).shape == (2, 4)
+    
+    assert cache.invalidate(key)
+    assert cache.get(key) is None
+    assert not cache.invalidate("../../etc")
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Test that the oldest unused entry is evicted once over the size limit"""
+    cache = ProcessingCache(cache_dir=tmp_path, max_bytes=2500)
+    first, second, third = _key("1"), _key("2"), _key("3")
+    cache.put(first, "x" * 1000, {})
+    cache.put(second, "y" * 1000, {})
+    
+    # Reading the first entry makes the second the least recently used
+    old = time.time() - 100
+    os.utime(cache._entry_dir(second), (old, old))
+    assert cache.get(first) is not None
+    
+    cache.put(third, "z" * 1000, {})
+    assert cache.get(second) is None
+    assert cache.get(first) is not None
+    assert cache.get(third) is not None
+
+def test_cache_tracks_size_without_scanning(tmp_path):
+    """Test that writes below the size limit keep a running total instead of walking the cache"""
+    ProcessingCache(cache_dir=tmp_path).put(_key("existing"), "w" * 500, {})
+    cache = ProcessingCache(cache_dir=tmp_path, max_bytes=10 * 1024 * 1024)
+    scans = []
+    entries = cache._entries
+    cache._entries = lambda: scans.append(1) or entries()
+
+    for i in range(20):
+        cache.put(_key(str(i)), "x" * 1000, {})
+        cache.put_embeddings(_key(str(i)), np.ones((2, 4), dtype=np.float32))
+    assert cache.invalidate(_key("0"))
+    assert not scans
+    assert cache._size == cache.stats()["size_bytes"]
+
+    scans.clear()
+    cache.max_bytes = cache._size // 2
+    cache.put(_key("20"), "x" * 1000, {})
+    assert len(scans) == 1
+    assert cache._size == cache.stats()["size_bytes"] <= cache.max_bytes
+
+def test_file_sha256(tmp_path):
+    """Test that file hashing matches hashlib on the full content"""
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"owlynn" * 1000)
+    assert file_sha256(str(path)) == hashlib.sha256(b"owlynn" * 1000).hexdigest()
+
+def test_lru_cache_evicts_and_expires():
+    """Test size-bounded eviction, TTL expiry and hit counting"""
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["hits"] == 2
+    
+    expiring = LRUCache(maxsize=2, ttl=0.01)
+    expiring.put("a", 1)
+    time.sleep(0.02)
+    assert expiring.get("a") is None
+
+class _KeywordEmbedder:
+    """Embeds prompts by the keywords they mention"""
+    VOCABULARY = ["refund", "policy", "shipping", "price"]
+
+    def embed_query(self, text):
+        vector = np.array([float(word in text) for word in self.VOCABULARY]) + 0.01
+        return vector / np.linalg.norm(vector)
+
+def test_response_cache_hits():
+    """Test exact and semantic hits, context isolation and counters"""
+    fakeredis = pytest.importorskip("fakeredis")
+    cache = ResponseCache(fakeredis.FakeRedis(decode_responses=True), _KeywordEmbedder(), threshold=0.95, ttl=60, max_entries=10)
+    assert cache.lookup("What is the refund policy?") is None
+    cache.store("What is the refund policy?", None, "30 days.", generation_seconds=4.0)
+
+    exact = cache.lookup("  what is the REFUND policy ")
+    assert exact["response"] == "30 days." and exact["match"] == "exact"
+    semantic = cache.lookup("Tell me the policy on refund")
+    assert semantic["match"] == "semantic"
+    assert cache.lookup("What is the shipping price?") is None
+    assert cache.lookup("What is the refund policy?", {"document_id": 7}) is None
+
+    stats = cache.stats()
+    assert (stats["hits_exact"], stats["hits_semantic"], stats["misses"]) == (1, 1, 3)
+    assert stats["saved_seconds"] == 8.0
+
+def test_response_cache_eviction():
+    """Test that the least recently used responses are evicted"""
+    fakeredis = pytest.importorskip("fakeredis")
+    cache = ResponseCache(fakeredis.FakeRedis(decode_responses=True), threshold=1, ttl=60, max_entries=2)
+    cache.store("first", None, "1", 1.0)
+    cache.store("second", None, "2", 1.0)
+    time.sleep(0.01)
+    assert cache.lookup("first")
+    cache.store("third", None, "3", 1.0)
+    assert cache.lookup("second") is None
+    assert cache.lookup("first") and cache.lookup("third")
+    assert cache.stats()["entries"] == 2
+    assert normalize_prompt("Hello   World?") == "hello world"
+
+class _FixedEmbedder:
+    """Embeds known prompts to fixed unit vectors"""
+
+    def __init__(self, vectors, model_name="e5"):
+        self.vectors = {prompt: np.asarray(vector, dtype=np.float32) / np.linalg.norm(vector) for prompt, vector in vectors.items()}
+        self.model_name = model_name
+        self.dimension = len(next(iter(vectors.values())))
+
+    def embed_query(self, text):
+        return self.vectors.get(text, np.eye(self.dimension, dtype=np.float32)[-1])
+
+def test_response_cache_near_miss_and_embedding_space():
+    """Test that a related but different question misses at the default threshold, and models do not share entries"""
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    # Cosine similarity 0.96 to the cached question, as for a question on the same topic
+    vectors = {
+        "how do i cancel my order": [1.0, 0.0, 0.0],
+        "how do i cancel my subscription": [0.96, 0.28, 0.0],
+        "how can i cancel my order": [0.99, 0.141, 0.0]
+    }
+    cache = ResponseCache(client, _FixedEmbedder(vectors), ttl=60, max_entries=10)
+    cache.store("How do I cancel my order?", None, "From the orders page.", 2.0)
+    assert cache.lookup("How do I cancel my subscription?") is None
+    assert cache.lookup("How can I cancel my order?")["match"] == "semantic"
+
+    other_model = ResponseCache(client, _FixedEmbedder({"x": [1.0, 0.0]}, model_name="bge"), ttl=60, max_entries=10)
+    assert other_model.namespace() != cache.namespace()
+    assert other_model.lookup("How do I cancel my order?") is None
@@ -0,0 +1,45 @@
+import pytest
+from core.chunking import SentenceChunker
+from core.tokens import count_tokens
+
+pytest.importorskip("spacy")
+
+ENGLISH = " ".join(f"Sentence number {i} talks about invoices and receipts." for i in range(200))
+THAI = " ".join("วันนี้อากาศดีมาก เราไปเที่ยวทะเลกัน" for _ in range(100))
+
+def test_chunks_respect_token_budget():
+    """Test that chunks stay within the token budget and cover every sentence"""
+    chunker = SentenceChunker(chunk_tokens=64, overlap_tokens=0)
+    chunks = chunker.chunk(ENGLISH)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 64 for chunk in chunks)
+    assert "Sentence number 0 " in chunks[0]
+    assert "Sentence number 199 " in chunks[-1]
+    # Without overlap every sentence appears exactly once
+    assert sum(chunk.count("Sentence number") for chunk in chunks) == 200
+
+def test_overlap_repeats_trailing_sentences():
+    """Test that consecutive chunks share trailing sentences"""
+    chunker = SentenceChunker(chunk_tokens=64, overlap_tokens=16)
+    chunks = chunker.chunk(ENGLISH)
+    last_sentence = chunks[0].split(". ")[-1].rstrip(".")
+    assert chunks[1].startswith(last_sentence)
+
+def test_thai_text_is_segmented():
+    """Test that Thai text without sentence punctuation is still split"""
+    chunker = SentenceChunker(chunk_tokens=64, overlap_tokens=0)
+    chunks = chunker.chunk(THAI)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 64 for chunk in chunks)
+
+def test_streaming_pages():
+    """Test that chunks can be produced from a stream of pages"""
+    chunker = SentenceChunker(chunk_tokens=64, overlap_tokens=0)
+    pages = (f"Page {i} starts here. It has a second sentence." for i in range(50))
+    chunks = list(chunker.iter_chunks(pages))
+    assert "Page 0 starts" in chunks[0]
+    assert "Page 49 starts" in chunks[-1]
+
+def test_overlap_must_be_smaller_than_chunk():
+    with pytest.raises(ValueError):
+        SentenceChunker(chunk_tokens=32, overlap_tokens=32)
@@ -0,0 +1,45 @@
+from core.context import ContextWindow, count_tokens, message_tokens
+from llm import Message
+
+def _turns(count: int, size: int = 400):
+    return [
+        Message(role="user" if i % 2 == 0 else "assistant", content=f"message {i} " + "x" * size)
+        for i in range(count)
+    ]
+
+def test_token_counts_are_cached_in_metadata():
+    """Test that message token counts are computed once and stored"""
+    message = Message(role="user", content="Hello there, how are you today?")
+    count = message_tokens(message)
+    assert count > 0
+    assert message.metadata["token_count"] == count
+
+    # Thai text is far denser than its character count suggests for English
+    assert count_tokens("สวัสดีครับ") > count_tokens("hello")
+
+def test_window_keeps_recent_turns_within_budget():
+    """Test that old turns are dropped to fit the prompt budget"""
+    window = ContextWindow(token_budget=500).build(_turns(20), Message(role="user", content="latest"))
+    assert window.prompt_tokens <= 500
+    assert window.messages[-1].content == "latest"
+    assert window.dropped
+    assert window.messages[-2].content.startswith("message 19")
+    assert window.first_kept == len(window.dropped)
+    assert not window.summary_used
+
+def test_window_uses_summary_for_dropped_turns():
+    """Test that the cached summary stands in for turns that no longer fit"""
+    history = _turns(20)
+    summary = {"content": "The user asked about invoices.", "upto": 10}
+    window = ContextWindow(token_budget=500).build(history, Message(role="user", content="latest"), summary=summary)
+    assert window.summary_used
+    assert window.messages[0].role == "system"
+    assert "invoices" in window.messages[0].content
+    assert window.prompt_tokens <= 500
+
+def test_short_history_is_sent_verbatim():
+    """Test that nothing is dropped when the whole history fits"""
+    history = _turns(4, size=10)
+    window = ContextWindow(token_budget=4096).build(history, Message(role="user", content="latest"))
+    assert [msg.content for msg in window.messages[:-1]] == [msg.content for msg in history]
+    assert window.dropped == []
@@ -3,6 +3,7 @@ from fastapi.testclient import TestClient
 from pathlib import Path
 import os
 import json
+import uuid
 from main import app
 from core.document_processor import DocumentProcessor
 from core.memory import MemoryManager
@@ -31,6 +32,27 @@ def test_chat_endpoint():
     assert "response" in data
     assert "metadata" in data
 
+def test_chat_stream_endpoint():
+    """Test that the streaming chat endpoint emits tokens and a final done event"""
+    events = []
+    with client.stream(
+        "POST",
+        "/api/v1/chat/stream",
+        json={
+            "message": "Hello, how are you?",
+            "session_id": "test_stream_session"
+        }
+    ) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        for line in response.iter_lines():
+            if line.startswith("data: "):
+                events.append(json.loads(line[len("data: "):]))
+    assert events[0]["type"] == "start"
+    assert any(event["type"] == "token" for event in events)
+    assert events[-1]["type"] == "done"
+    assert events[-1]["session_id"] == "test_stream_session"
+
 def test_document_processing():
     """Test document processing with updated libraries"""
     processor = DocumentProcessor()
@@ -66,6 +88,145 @@ def test_memory_management():
     assert retrieved is not None
     assert len(retrieved["messages"]) == 2
 
+def test_conversation_append_only():
+    """Test that turns are appended and the tail can be read on its own"""
+    memory = MemoryManager()
+    session_id = f"test_append_{uuid.uuid4()}"
+    
+    memory.append_messages(session_id, [
+        Message(role="user", content="First question"),
+        Message(role="assistant", content="First answer")
+    ])
+    count = memory.append_messages(session_id, [
+        Message(role="user", content="Second question"),
+        Message(role="assistant", content="Second answer")
+    ])
+    assert count == 4
+    
+    full = memory.get_conversation(session_id)
+    assert [msg["content"] for msg in full["messages"]] == [
+        "First question", "First answer", "Second question", "Second answer"
+    ]
+    
+    tail = memory.get_conversation(session_id, last_n=2)
+    assert [msg["content"] for msg in tail["messages"]] == ["Second question", "Second answer"]
+    assert tail["message_count"] == 4
+    
+    # Re-storing the full history must not duplicate messages
+    memory.store_conversation(session_id, [Message(**msg) for msg in full["messages"]])
+    assert memory.get_conversation(session_id)["message_count"] == 4
+
+def test_store_conversation_on_legacy_snapshot():
+    """Test that storing the full history of a legacy session appends only the new messages"""
+    memory = MemoryManager()
+    session_id = f"test_legacy_{uuid.uuid4()}"
+    history = [
+        {"role": "user", "content": "Legacy question", "metadata": {}},
+        {"role": "assistant", "content": "Legacy answer", "metadata": {}}
+    ]
+    with memory._pg_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO conversations (session_id, messages, metadata) VALUES (%s, %s, %s)",
+            (session_id, json.dumps(history), json.dumps({}))
+        )
+    
+    memory.store_conversation(session_id, [Message(**msg) for msg in history] + [Message(role="user", content="Follow-up")])
+    stored = memory.get_conversation(session_id)
+    assert stored["message_count"] == 3
+    assert [msg["content"] for msg in stored["messages"]] == ["Legacy question", "Legacy answer", "Follow-up"]
+
+def test_conversation_compaction_and_restore():
+    """Test that idle sessions are compacted into a snapshot and restored on the next append"""
+    memory = MemoryManager()
+    session_id = f"test_compact_{uuid.uuid4()}"
+    memory.append_messages(session_id, [
+        Message(role="user", content="Old question"),
+        Message(role="assistant", content="Old answer")
+    ], {"topic": "archive"})
+    memory.store_summary(session_id, {"content": "Earlier talk", "upto": 1})
+    with memory._pg_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "UPDATE conversation_sessions SET updated_at = NOW() - interval '400 days' WHERE session_id = %s",
+            (session_id,)
+        )
+    
+    assert memory.compact_conversations(inactive_days=30) >= 1
+    archived = memory.get_conversation(session_id)
+    assert [msg["content"] for msg in archived["messages"]] == ["Old question", "Old answer"]
+    assert archived["metadata"] == {"topic": "archive"}
+    
+    count = memory.append_messages(session_id, [Message(role="user", content="New question")])
+    assert count == 3
+    restored = memory.get_conversation(session_id)
+    assert [msg["content"] for msg in restored["messages"]] == ["Old question", "Old answer", "New question"]
+    assert memory.get_summary(session_id)["content"] == "Earlier talk"
+
+def test_store_conversation_after_compaction():
+    """Test that re-storing the full history of a compacted session does not duplicate it"""
+    memory = MemoryManager()
+    session_id = f"test_compact_store_{uuid.uuid4()}"
+    memory.store_conversation(session_id, [
+        Message(role="user", content="Old question"),
+        Message(role="assistant", content="Old answer")
+    ])
+    with memory._pg_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "UPDATE conversation_sessions SET updated_at = NOW() - interval '400 days' WHERE session_id = %s",
+            (session_id,)
+        )
+    assert memory.compact_conversations(inactive_days=30) >= 1
+    
+    history = [Message(**msg) for msg in memory.get_conversation(session_id)["messages"]]
+    memory.store_conversation(session_id, history + [Message(role="user", content="New question")])
+    stored = memory.get_conversation(session_id)
+    assert stored["message_count"] == 3
+    assert [msg["content"] for msg in stored["messages"]] == ["Old question", "Old answer", "New question"]
+
+def test_duplicate_chunks_are_linked_and_promoted():
+    """Test that repeated chunks get no vector and take over when the original is deleted"""
+    memory = MemoryManager()
+    footer = f"Confidential {uuid.uuid4()}: this document is intended only for the named recipient and may not be shared."
+    original = [f"Unique opening paragraph {uuid.uuid4()} about quarterly results.", footer]
+    copy = [f"Another opening {uuid.uuid4()} about the new office.", footer]
+    plans = memory.plan_dedup([original, copy])
+    assert plans[1].duplicates[1] is not None
+    documents = [
+        {"filename": name, "file_type": ".txt", "content": " ".join(chunks), "chunks": chunks,
+         "chunk_embeddings": [[0.1] * 384 for _ in plan.canonical], "dedup": plan}
+        for name, chunks, plan in [("original.txt", original, plans[0]), ("copy.txt", copy, plans[1])]
+    ]
+    original_id, copy_id = memory.store_documents(documents)
+    with memory._pg_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT duplicate_of_document FROM chunk_fingerprints WHERE document_id = %s AND chunk_index = 1", (copy_id,)
+        )
+        assert cur.fetchone()[0] == original_id
+
+    memory.delete_document(original_id)
+    with memory._pg_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT duplicate FROM document_chunks WHERE document_id = %s ORDER BY chunk_index", (copy_id,))
+        assert [row[0] for row in cur.fetchall()] == [False, False]
+    memory.delete_document(copy_id)
+
+def test_document_metadata_leaves_out_chunks():
+    """Test that per-chunk lists are stored as chunk rows rather than in the document metadata"""
+    memory = MemoryManager()
+    chunks = [f"Page one {uuid.uuid4()}", f"Page two {uuid.uuid4()}"]
+    doc_id = memory.store_document(
+        filename="pages.pdf",
+        file_type=".pdf",
+        content=" ".join(chunks),
+        metadata={"author": "Owlynn", "chunks": chunks, "chunk_pages": [1, 2]},
+        chunks=chunks,
+        chunk_embeddings=[[0.1] * 384 for _ in chunks]
+    )
+    with memory._pg_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT metadata FROM documents WHERE id = %s", (doc_id,))
+        assert cur.fetchone()[0] == {"author": "Owlynn"}
+        cur.execute("SELECT page FROM document_chunks WHERE document_id = %s ORDER BY chunk_index", (doc_id,))
+        assert [row[0] for row in cur.fetchall()] == [1, 2]
+    memory.delete_document(doc_id)
+
 def test_document_search():
     """Test document search with updated ChromaDB"""
     memory = MemoryManager()
@@ -0,0 +1,59 @@
+import random
+from core.dedup import ChunkDeduplicator, ChunkRef, DedupIndex, bands, hamming, simhash
+
+def _text(seed, words=200):
+    rng = random.Random(seed)
+    return " ".join(f"w{rng.randrange(3000)}" for _ in range(words))
+
+def test_simhash_separates_near_and_unrelated_texts():
+    """Test that a small edit keeps fingerprints close while unrelated texts are far apart"""
+    text = _text(1)
+    edited = text.replace(text.split()[100], "changed", 1)
+    fingerprint, features = simhash(text)
+    assert features == 198
+    assert -(1 << 63) <= fingerprint < 1 << 63
+    assert simhash(text.upper())[0] == fingerprint
+    assert hamming(fingerprint, simhash(edited)[0]) <= 6
+    assert hamming(fingerprint, simhash(_text(2))[0]) > 16
+    assert simhash("") == (0, 0)
+
+def test_band_index_finds_fingerprints_within_the_distance():
+    """Test that any fingerprint within the distance shares a band, and farther ones are not returned"""
+    index = DedupIndex(max_distance=3)
+    index.add(0x0F0F_0F0F_0F0F_0F0F, ChunkRef(7, 0))
+    assert index.find(0x0F0F_0F0F_0F0F_0F0F ^ 0b1011) == ChunkRef(7, 0)
+    assert index.find(0x0F0F_0F0F_0F0F_0F0F ^ 0b1011, exact=True) is None
+    assert index.find(0x0F0F_0F0F_0F0F_0F0F ^ 0b11111) is None
+    assert all(0 <= key < 1 << 31 for key in bands(-1))
+
+def test_plan_links_duplicates_across_stored_batch_and_document():
+    """Test that chunks link to stored chunks first, then to earlier chunks of the batch"""
+    footer = "This message is confidential and intended solely for the named recipient of this email."
+    stored_text = _text(3)
+    stored = [(41, 2, simhash(stored_text)[0]), (41, 3, simhash(_text(4))[0])]
+    looked_up = []
+
+    def lookup(keys):
+        looked_up.append(keys)
+        return stored
+
+    plans = ChunkDeduplicator(lookup, max_distance=3, min_features=8).plan([
+        [_text(5), footer, footer],
+        [stored_text, footer, "Page 1", "Page 1", ""]
+    ])
+    assert len(looked_up) == 1
+    first, second = plans
+    assert first.duplicates == [None, None, ChunkRef(0, 1, in_batch=True)]
+    assert second.duplicates == [ChunkRef(41, 2), ChunkRef(0, 1, in_batch=True), None, ChunkRef(1, 2, in_batch=True), None]
+    assert second.canonical == [2, 4]
+    assert second.summary() == {"chunks": 5, "duplicate_chunks": 3, "ratio": 0.6}
+
+def test_summary_names_the_document_a_copy_repeats(monkeypatch):
+    """Test that a mostly duplicated document is linked to the other document it repeats"""
+    monkeypatch.setattr("core.dedup.settings.DEDUP_DOCUMENT_THRESHOLD", 0.5)
+    chunks = [_text(6), _text(7)]
+    original, copy = ChunkDeduplicator(lambda keys: [], max_distance=3).plan([chunks, chunks + ["Signed"]])
+    assert original.summary() == {"chunks": 2, "duplicate_chunks": 0, "ratio": 0.0}
+    # In-batch targets are named once the batch has its document ids
+    assert "duplicate_of" not in copy.summary()
+    assert copy.summary(batch_ids=[10, 11], document_id=11)["duplicate_of"] == 10
@@ -0,0 +1,139 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from core.gateway import LLMGateway, LLMSaturated, INTERACTIVE, BACKGROUND
+
+class FakeClient:
+    """Chat client whose generations finish when the test releases them"""
+
+    def __init__(self):
+        self.calls = []
+        self.release = asyncio.Event()
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls.append(messages[0].content)
+        await self.release.wait()
+        return SimpleNamespace(content=f"reply to {messages[0].content}")
+
+    async def astream(self, messages, **kwargs):
+        self.calls.append(messages[0].content)
+        for word in ("one ", "two ", "three"):
+            await self.release.wait()
+            yield SimpleNamespace(content=word)
+
+def _messages(text):
+    return [SimpleNamespace(content=text)]
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_waiters_run_in_priority_order():
+    """Test that the concurrency limit holds and interactive requests jump the queue"""
+    async def scenario():
+        client = FakeClient()
+        gateway = LLMGateway(client, max_concurrent=1, max_queue=4, queue_timeout=5, coalesce=False)
+        first = asyncio.create_task(gateway.ainvoke(_messages("first")))
+        await _settle()
+        summary = asyncio.create_task(gateway.ainvoke(_messages("summary"), priority=BACKGROUND))
+        await _settle()
+        chat = asyncio.create_task(gateway.ainvoke(_messages("chat"), priority=INTERACTIVE))
+        await _settle()
+        stats = gateway.stats()
+        client.release.set()
+        await asyncio.gather(first, summary, chat)
+        return client.calls, stats, gateway.stats()
+
+    calls, busy, idle = asyncio.run(scenario())
+    assert calls == ["first", "chat", "summary"]
+    assert busy["active"] == 1
+    assert busy["queued_by_priority"] == {"interactive": 1, "background": 1}
+    assert idle["active"] == 0 and idle["queued"] == 0
+
+def test_full_queue_and_timeouts_are_rejected():
+    """Test that saturation fails fast with a retry hint and timed-out waiters leave the queue"""
+    async def scenario():
+        client = FakeClient()
+        gateway = LLMGateway(client, max_concurrent=1, max_queue=1, queue_timeout=0.05, coalesce=False)
+        running = asyncio.create_task(gateway.ainvoke(_messages("running")))
+        await _settle()
+        waiting = asyncio.create_task(gateway.ainvoke(_messages("waiting")))
+        await _settle()
+        with pytest.raises(LLMSaturated) as rejected:
+            await gateway.ainvoke(_messages("rejected"))
+        with pytest.raises(LLMSaturated):
+            gateway.check_admission()
+        with pytest.raises(LLMSaturated) as timed_out:
+            await waiting
+        queued = gateway.queue_depth
+        client.release.set()
+        await running
+        return rejected.value, timed_out.value, queued, client.calls
+
+    rejected, timed_out, queued, calls = asyncio.run(scenario())
+    assert rejected.retry_after >= 1
+    assert "within" in str(timed_out)
+    assert queued == 0
+    assert calls == ["running"]
+
+def test_identical_requests_share_one_generation():
+    """Test that identical in-flight invocations and streams are coalesced"""
+    async def scenario():
+        client = FakeClient()
+        gateway = LLMGateway(client, max_concurrent=2, max_queue=4, queue_timeout=5)
+        replies = [asyncio.create_task(gateway.ainvoke(_messages("same"))) for _ in range(3)]
+
+        async def collect():
+            return [chunk.content async for chunk in gateway.astream(_messages("streamed"))]
+
+        first_stream = asyncio.create_task(collect())
+        await _settle()
+        client.release.set()
+        second_stream = asyncio.create_task(collect())
+        return await asyncio.gather(*replies), await first_stream, await second_stream, client.calls
+
+    replies, first_stream, second_stream, calls = asyncio.run(scenario())
+    assert [reply.content for reply in replies] == ["reply to same"] * 3
+    assert first_stream == ["one ", "two ", "three"]
+    # A late joiner replays the chunks it missed
+    assert second_stream == first_stream
+    assert calls == ["same", "streamed"]
+
+def test_abandoned_generation_frees_its_slot():
+    """Test that a generation nobody waits for is cancelled and its slot released"""
+    async def scenario():
+        client = FakeClient()
+        gateway = LLMGateway(client, max_concurrent=1, max_queue=1, queue_timeout=5)
+        request = asyncio.create_task(gateway.ainvoke(_messages("abandoned")))
+        await _settle()
+        request.cancel()
+        await _settle()
+        return gateway.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["active"] == 0
+    assert stats["in_flight"] == 0
+
+def test_interactive_request_skips_background_flight():
+    """Test that an interactive request does not join an identical background one"""
+    async def scenario():
+        client = FakeClient()
+        gateway = LLMGateway(client, max_concurrent=1, max_queue=4, queue_timeout=5)
+        running = asyncio.create_task(gateway.ainvoke(_messages("running"), priority=BACKGROUND))
+        await _settle()
+        background = asyncio.create_task(gateway.ainvoke(_messages("same"), priority=BACKGROUND))
+        await _settle()
+        interactive = asyncio.create_task(gateway.ainvoke(_messages("same"), priority=INTERACTIVE))
+        await _settle()
+        queued = gateway.stats()["queued_by_priority"]
+        # A background request still joins the interactive generation
+        joiner = asyncio.create_task(gateway.ainvoke(_messages("same"), priority=BACKGROUND))
+        await _settle()
+        client.release.set()
+        await asyncio.gather(running, background, interactive, joiner)
+        return queued, client.calls, gateway.stats()
+
+    queued, calls, stats = asyncio.run(scenario())
+    assert queued == {"interactive": 1, "background": 1}
+    assert calls == ["running", "same", "same"]
+    assert stats["in_flight"] == 0
@@ -0,0 +1,59 @@
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from core.cache import ProcessingCache
+from core.document_processor import DocumentProcessor
+from core.handlers import HandlerRegistry, registry
+
+def test_builtin_handlers_cover_supported_extensions():
+    """Test that every configured extension has a handler with its declared capabilities"""
+    assert {".pdf", ".docx", ".csv", ".pptx", ".json", ".png", ".txt"} <= set(registry.extensions())
+    assert registry.get(".PDF").describe() == {
+        "name": "pdf", "extensions": [".pdf"], "streaming": True, "parallel": True
+    }
+    assert registry.get(".csv") is registry.get(".xlsx")
+    assert len(registry.handlers()) == len({handler.name for handler in registry.handlers()})
+
+def test_plugins_add_and_replace_handlers(tmp_path, monkeypatch):
+    """Test that plugin modules register new formats and override built-in ones"""
+    plugins = HandlerRegistry()
+    plugins.register([".txt"], lambda processor, path, **options: ("built-in", {}), name="text")
+    plugin = tmp_path / "owlynn_test_plugin.py"
+    plugin.write_text(
+        "from core.handlers import registry\n"
+        "registry.register(['.txt', '.log'], lambda processor, path, **options: "
+        "(open(path).read().upper(), {'chunks': ['plugin']}), name='shout')\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr("core.handlers.registry", plugins)
+    plugins.load_plugins(["owlynn_test_plugin"])
+    plugins.load_plugins(["owlynn_test_plugin"])
+
+    (tmp_path / "app.log").write_text("started")
+    processor = DocumentProcessor(cache=ProcessingCache(cache_dir=tmp_path / "cache"), handlers=plugins)
+    content, metadata = processor.process_file(str(tmp_path / "app.log"), use_cache=False)
+    assert content == "STARTED"
+    assert metadata["handler"] == "shout"
+    assert metadata["chunks"] == ["plugin"]
+    assert processor.supported_extensions() == [".log", ".txt"]
+
+def test_unknown_extension_is_rejected(tmp_path):
+    """Test that a file without a handler fails clearly"""
+    (tmp_path / "data.bin").write_text("x")
+    processor = DocumentProcessor(cache=ProcessingCache(cache_dir=tmp_path / "cache"), handlers=HandlerRegistry())
+    with pytest.raises(Exception, match="Unsupported file type: .bin"):
+        processor.process_file(str(tmp_path / "data.bin"), use_cache=False)
+
+def test_importing_the_processor_skips_format_libraries():
+    """Test that parsing libraries and the LLM client load on first use, not on import"""
+    heavy = ["docx", "pptx", "cv2", "fitz", "pandas", "bs4", "yaml", "langchain_openai", "langgraph"]
+    script = (
+        "import sys, core.document_processor, llm\n"
+        f"print(','.join(m for m in {heavy!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=Path(__file__).parent.parent,
+        capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip().splitlines()[-1:] in ([], [""])
@@ -0,0 +1,75 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+from PIL import Image
+from core.images import ImagePipeline, fit_within, load_frames, to_rgb
+from core.models import ModelManager
+
+def test_preprocessing_downscales_and_flattens():
+    """Test that large images are downscaled and transparency is flattened"""
+    array = np.zeros((3000, 1500, 3), dtype=np.uint8)
+    assert fit_within(array, 512).shape == (512, 256, 3)
+    assert fit_within(array, 4000) is array
+    rgba = Image.new("RGBA", (4, 4), (0, 0, 0, 0))
+    assert to_rgb(rgba).getpixel((0, 0)) == (255, 255, 255)
+
+class _FakeBlip:
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, images, return_tensors):
+        self.batches.append(len(images))
+        return {"pixel_values": images}
+
+    def generate(self, pixel_values, max_new_tokens):
+        return [f"frame of {image.size[0]}px" for image in pixel_values]
+
+    def batch_decode(self, output, skip_special_tokens):
+        return output
+
+def test_multi_frame_images_are_captioned_in_batches(tmp_path):
+    """Test that every frame of a TIFF is captioned with batched generate calls"""
+    pytest.importorskip("torch")
+    path = tmp_path / "scan.tiff"
+    frames = [Image.new("RGB", (2000, 1000), (i * 40, 0, 0)) for i in range(5)]
+    frames[0].save(path, save_all=True, append_images=frames[1:])
+    assert len(load_frames(str(path))) == 5
+
+    blip = _FakeBlip()
+    models = ModelManager(idle_timeout=0)
+    models.register("blip", lambda: (blip, blip))
+    content, metadata = ImagePipeline(models=models, batch_size=2).process(str(path), ocr=False)
+    assert blip.batches == [2, 2, 1]
+    assert metadata["frames"] == 5
+    assert metadata["captions"] == ["frame of 512px"] * 5
+    assert "OCR Text" not in content and "Page 5" in content
+
+def test_ocr_pool_is_reused_across_images(tmp_path, monkeypatch):
+    """Test that one OCR pool serves every image until closed and OCR waiting is timed apart"""
+    path = tmp_path / "scan.tiff"
+    frames = [Image.new("RGB", (64, 64), (i * 40, 0, 0)) for i in range(3)]
+    frames[0].save(path, save_all=True, append_images=frames[1:])
+
+    def slow_ocr(file_path, index):
+        time.sleep(0.05)
+        return f"text {index}"
+
+    monkeypatch.setattr("core.images.ocr_frame", slow_ocr)
+    pipeline = ImagePipeline(models=ModelManager(idle_timeout=0), ocr_workers=3)
+    pool = ThreadPoolExecutor(max_workers=3)
+    pipeline._executor = pool
+    for _ in range(2):
+        content, metadata = pipeline.process(str(path), caption=False)
+        assert pipeline.executor is pool
+    assert "text 2" in content
+    timings = metadata["image_seconds"]
+    assert timings["ocr"] >= 0.05 and timings["ocr_wait"] <= timings["ocr"]
+
+    pipeline.close()
+    assert pipeline._executor is None
+    started = pipeline.executor
+    assert started is not pool and pipeline.executor is started
+    pipeline.close()
@@ -0,0 +1,57 @@
+import os
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("docx")
+from ingest import BulkIngester, IngestManifest, discover
+
+def test_discover_filters_and_orders_files(tmp_path):
+    """Test that only supported, visible files are found, in a stable order"""
+    (tmp_path / "b").mkdir()
+    (tmp_path / ".git").mkdir()
+    for name in ["b/report.pdf", "a.txt", "notes.unknown", ".hidden.txt", ".git/config.txt"]:
+        (tmp_path / name).write_text("x")
+    assert [p.relative_to(tmp_path).as_posix() for p in discover(tmp_path)] == ["a.txt", "b/report.pdf"]
+
+def test_manifest_resumes_unchanged_files(tmp_path):
+    """Test that finished files are skipped on the next run unless they changed"""
+    done, failed = tmp_path / "done.txt", tmp_path / "failed.txt"
+    done.write_text("hello")
+    failed.write_text("broken")
+    manifest = IngestManifest(tmp_path / "manifest.jsonl", tmp_path)
+    manifest.record(done, "done", document_id=1, chunks=1)
+    manifest.record(failed, "failed", error="boom")
+    manifest.close()
+
+    reopened = IngestManifest(tmp_path / "manifest.jsonl", tmp_path)
+    assert reopened.done(done)
+    assert not reopened.done(failed)
+    assert reopened.done(failed, retry_failed=False)
+    done.write_text("hello, changed")
+    assert not reopened.done(done)
+    reopened.close()
+
+def _crashing_extract(file_path, use_cache=True):
+    """Kills its worker on ``crash`` files"""
+    name = os.path.basename(file_path)
+    if name.startswith("crash"):
+        os._exit(1)
+    return name, {"chunks": [name]}
+
+def test_crashed_workers_are_replaced(tmp_path, monkeypatch):
+    """Test that a crashed worker fails only the file that crashes it again"""
+    monkeypatch.setattr("ingest.process_file_in_worker", _crashing_extract)
+    names = ["a.txt", "crash.txt", "b.txt", "c.txt", "d.txt", "e.txt"]
+    files = [tmp_path / name for name in names]
+    for path in files:
+        path.write_text("x")
+    ingester = BulkIngester(None, None, None, workers=2, batch_size=8)
+    results = {path.name: (result, error) for path, result, error in ingester._extracted(files)}
+
+    assert sorted(results) == sorted(names)
+    assert results["crash.txt"][0] is None and "terminated abruptly" in results["crash.txt"][1]
+    for name in names:
+        if name != "crash.txt":
+            assert results[name] == ((name, {"chunks": [name]}), None)
+    # Once when the files in flight crashed, once more when crash.txt was retried
+    assert ingester.stats["worker_restarts"] == 2
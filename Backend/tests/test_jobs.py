@@ -0,0 +1,88 @@
+import asyncio
+import time
+from core.jobs import JobQueue, nested_workers
+from core.models import model_manager
+
+def _load_test_model() -> bool:
+    model_manager.register("worker-test", lambda: [0] * 10)
+    model_manager.get("worker-test")
+    return model_manager.status()["models"]["worker-test"]["loaded"]
+
+def _test_model_loaded() -> bool:
+    return model_manager.status()["models"]["worker-test"]["loaded"]
+
+def test_job_runs_stages_in_background():
+    """Test that a submitted job reports per-stage progress and its result"""
+    async def scenario():
+        queue = JobQueue(max_workers=1, max_concurrent=1)
+        
+        async def pipeline(job):
+            with job.stage("extract") as stage:
+                stage.detail["pages"] = 3
+            with job.stage("store"):
+                await asyncio.sleep(0)
+            return {"document_id": 1}
+        
+        job = queue.submit("report.pdf", pipeline, stages=["extract", "store"])
+        assert job.status == "queued"
+        while job.status in ("queued", "running"):
+            await asyncio.sleep(0.01)
+        queue.shutdown()
+        return job
+    
+    job = asyncio.run(scenario())
+    assert job.status == "completed"
+    assert job.progress == 1.0
+    assert job.result == {"document_id": 1}
+    assert job.stages["extract"].status == "completed"
+    assert job.stages["extract"].detail == {"pages": 3}
+    assert "result" not in job.summary()
+
+def test_failed_job_records_error_and_stage():
+    """Test that a failing stage marks the job as failed"""
+    async def scenario():
+        queue = JobQueue(max_workers=1, max_concurrent=1)
+        
+        async def pipeline(job):
+            with job.stage("extract"):
+                raise ValueError("Unsupported file type: .xyz")
+        
+        job = queue.submit("file.xyz", pipeline, stages=["extract", "store"])
+        while job.status in ("queued", "running"):
+            await asyncio.sleep(0.01)
+        return job
+    
+    job = asyncio.run(scenario())
+    assert job.status == "failed"
+    assert "Unsupported" in job.error
+    assert job.stages["extract"].status == "failed"
+    assert job.stages["store"].status == "pending"
+
+def test_workers_unload_idle_models(monkeypatch):
+    """Test that a model loaded inside an ingestion worker is unloaded once idle"""
+    # Spawned workers read their settings from the environment
+    monkeypatch.setenv("MODEL_IDLE_TIMEOUT", "0.05")
+    monkeypatch.setenv("MODEL_IDLE_CHECK_INTERVAL", "0.05")
+
+    async def scenario():
+        queue = JobQueue(max_workers=1, max_concurrent=1)
+        try:
+            loaded = await queue.run_in_worker(_load_test_model)
+            time.sleep(0.5)
+            return loaded, await queue.run_in_worker(_test_model_loaded)
+        finally:
+            queue.shutdown()
+
+    assert asyncio.run(scenario()) == (True, False)
+
+def test_nested_pools_share_the_cpus(monkeypatch):
+    """Test that pools inside an ingestion worker get at most its share of the CPUs"""
+    monkeypatch.setattr("os.cpu_count", lambda: 8)
+    monkeypatch.setattr("core.jobs._pool_size", None)
+    assert nested_workers() == 8
+    assert nested_workers(3) == 3
+    monkeypatch.setattr("core.jobs._pool_size", 2)
+    assert nested_workers() == 4
+    assert nested_workers(6) == 4
+    monkeypatch.setattr("core.jobs._pool_size", 8)
+    assert nested_workers() == 1
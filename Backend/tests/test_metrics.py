@@ -0,0 +1,65 @@
+import contextvars
+import logging
+from core.metrics import MetricsRegistry, RequestTrace, TraceIdFilter, start_trace, current_trace, observe_stage, STAGE_SECONDS
+
+def test_histogram_renders_cumulative_buckets():
+    """Test that histograms render cumulative buckets, sum and count per label set"""
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test_seconds", "Test latency", ["stage"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="llm")
+    histogram.observe(0.5, stage="llm")
+    histogram.observe(5, stage="llm")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE test_seconds histogram" in lines
+    assert 'test_seconds_bucket{stage="llm",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="llm",le="1"} 2' in lines
+    assert 'test_seconds_bucket{stage="llm",le="+Inf"} 3' in lines
+    assert 'test_seconds_sum{stage="llm"} 5.55' in lines
+    assert 'test_seconds_count{stage="llm"} 3' in lines
+
+def test_counters_escape_labels_and_run_collectors():
+    """Test counter rendering, label escaping and collectors mirroring outside totals"""
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "Test counter", ["cache", "result"])
+    counter.inc(cache='say "hi"', result="hit")
+    registry.add_collector(lambda: counter.set(7, cache="lru", result="miss"))
+
+    output = registry.render()
+    assert 'test_total{cache="say \\"hi\\"",result="hit"} 1' in output
+    assert 'test_total{cache="lru",result="miss"} 7' in output
+    # Registering the same name again returns the existing metric
+    assert registry.counter("test_total", "Test counter", ["cache", "result"]) is counter
+
+def test_stages_accumulate_on_the_current_trace():
+    """Test that stage timings reach both the histogram and the request trace"""
+    def scenario():
+        trace = start_trace("abc123")
+        observe_stage("history", 0.002)
+        observe_stage("history", 0.003)
+        observe_stage("llm", 0.5)
+        return trace
+
+    before = STAGE_SECONDS.count(stage="history")
+    trace = contextvars.copy_context().run(scenario)
+    assert trace.id == "abc123"
+    assert trace.stages["history"] == 0.005
+    assert trace.summary() == "history=5.0ms llm=500.0ms"
+    assert STAGE_SECONDS.count(stage="history") == before + 2
+    # The trace does not leak outside the request's context
+    assert current_trace() is None
+
+def test_log_records_carry_the_trace_id():
+    """Test that log records get the current trace ID, or '-' outside a request"""
+    record = logging.LogRecord("owlynn", logging.INFO, __file__, 1, "message", None, None)
+    TraceIdFilter().filter(record)
+    assert record.trace_id == "-"
+
+    def traced():
+        start_trace()
+        TraceIdFilter().filter(record)
+        return current_trace()
+
+    trace = contextvars.copy_context().run(traced)
+    assert isinstance(trace, RequestTrace)
+    assert record.trace_id == trace.id
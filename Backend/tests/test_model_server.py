@@ -0,0 +1,73 @@
+import threading
+import time
+import pytest
+from core.model_server import ModelClient, ModelServer, ModelServerUnavailable, _Batcher
+
+def test_batcher_merges_concurrent_requests():
+    """Test that requests arriving within the window share one call and get their own results"""
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = _Batcher("double", double, window=0.05, max_items=5)
+    futures = [batcher.submit([i, i + 10]) for i in range(3)]
+    assert [future.result(timeout=5) for future in futures] == [[0, 20], [2, 22], [4, 24]]
+    # The third request would overflow max_items, so it goes in a second call
+    assert calls == [[0, 10, 1, 11], [2, 12]]
+    assert batcher.stats() == {"requests": 3, "items": 6, "batches": 2, "average_batch": 3.0}
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    pytest.importorskip("cv2")
+    monkeypatch.setattr("core.model_server._serving", False)
+    server = ModelServer(str(tmp_path / "models.sock"), window=0.05)
+    server.batchers = {"embed": _Batcher("embed", lambda texts: [len(text) for text in texts], 0.05, 256)}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = ModelClient(server.address, timeout=5, fallback=False)
+    deadline = time.monotonic() + 5
+    while client.status() is None and time.monotonic() < deadline:
+        client._down_until = 0
+        time.sleep(0.01)
+    yield server
+    server.close()
+
+def test_workers_share_batched_calls(server):
+    """Test that concurrent workers are served through the shared batcher"""
+    results = {}
+
+    def worker(i):
+        results[i] = ModelClient(server.address, timeout=5, fallback=False).call("embed", ["x" * i, "yy"])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {i: [i, 2] for i in range(4)}
+    stats = ModelClient(server.address).status()["batches"]["embed"]
+    assert stats["requests"] == 4
+    assert stats["batches"] < 4
+
+def test_server_errors_keep_their_type(server):
+    """Test that an error raised on the server reaches the caller as the same exception"""
+    client = ModelClient(server.address, timeout=5)
+    with pytest.raises(KeyError, match="Unknown model"):
+        client.call("unload", "no-such-model")
+    with pytest.raises(ValueError, match="Unknown model server operation"):
+        client.call("train", None)
+    # The connection stays usable after an error
+    assert client.call("embed", ["abc"]) == [3]
+
+def test_unreachable_server_falls_back_in_process(tmp_path):
+    """Test per-worker fallback and that a down server is not retried on every call"""
+    client = ModelClient(str(tmp_path / "missing.sock"), fallback=True)
+    assert client.run("embed", ["abc"], lambda texts: ["local"]) == ["local"]
+    assert client._down_until > time.monotonic()
+    with pytest.raises(ModelServerUnavailable, match="recently"):
+        client.call("embed", ["abc"])
+    assert ModelClient(str(tmp_path / "missing.sock")).status() is None
+    strict = ModelClient(str(tmp_path / "missing.sock"), fallback=False)
+    with pytest.raises(ModelServerUnavailable):
+        strict.run("embed", ["abc"], lambda texts: ["local"])
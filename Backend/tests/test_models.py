@@ -0,0 +1,61 @@
+import sys
+import threading
+import time
+from core.models import ModelManager
+
+def test_models_load_on_first_use_and_unload_when_idle():
+    """Test lazy loading, status reporting and idle unloading"""
+    loads = []
+    manager = ModelManager(idle_timeout=0.01)
+    manager.register("dummy", lambda: loads.append(1) or {"weights": [0] * 10})
+    
+    assert manager.status()["models"]["dummy"]["loaded"] is False
+    assert loads == []
+    
+    model = manager.get("dummy")
+    assert manager.get("dummy") is model
+    assert loads == [1]
+    status = manager.status()["models"]["dummy"]
+    assert status["loaded"] is True
+    assert status["load_seconds"] is not None
+    
+    time.sleep(0.02)
+    assert manager.unload_idle() == ["dummy"]
+    assert manager.status()["models"]["dummy"]["loaded"] is False
+    
+    manager.get("dummy")
+    assert loads == [1, 1]
+
+def test_warmup_loads_requested_models():
+    """Test that warm-up loads only the named models"""
+    manager = ModelManager(idle_timeout=0)
+    manager.register("a", lambda: "a")
+    manager.register("b", lambda: "b")
+    status = manager.warmup(["a"])
+    assert status["models"]["a"]["loaded"] is True
+    assert status["models"]["b"]["loaded"] is False
+    # A zero timeout keeps models resident
+    assert manager.unload_idle() == []
+
+def test_get_never_returns_a_model_unloaded_meanwhile():
+    """Test that concurrent idle unloading cannot empty a model between loading and returning it"""
+    manager = ModelManager(idle_timeout=1e-9)
+    manager.register("dummy", lambda: object())
+    stop = threading.Event()
+
+    def reap():
+        while not stop.is_set():
+            manager.unload_idle()
+
+    # Switch threads as often as possible to hit the window between the two
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    reaper = threading.Thread(target=reap)
+    reaper.start()
+    try:
+        results = [manager.get("dummy") for _ in range(5000)]
+    finally:
+        stop.set()
+        reaper.join()
+        sys.setswitchinterval(interval)
+    assert all(model is not None for model in results)
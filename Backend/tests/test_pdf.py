@@ -0,0 +1,48 @@
+import pytest
+from core.pdf import PdfExtractor
+
+fitz = pytest.importorskip("fitz")
+
+def _make_pdf(path, pages: int):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"This is page {i + 1} of the manual.")
+    doc.save(str(path))
+    doc.close()
+
+def test_pages_stream_in_order_with_numbers(tmp_path):
+    """Test sequential extraction keeps page order and numbers"""
+    path = tmp_path / "manual.pdf"
+    _make_pdf(path, 5)
+    stats = {}
+    pages = list(PdfExtractor(workers=1).iter_pages(str(path), stats))
+    assert [page.number for page in pages] == [1, 2, 3, 4, 5]
+    assert "page 3 of" in pages[2].text
+    assert stats["pages_extracted"] == 5
+    assert stats["truncated"] is None
+
+def test_parallel_extraction_matches_sequential(tmp_path):
+    """Test that fanning page ranges out over processes preserves order"""
+    path = tmp_path / "manual.pdf"
+    _make_pdf(path, 12)
+    sequential = list(PdfExtractor(workers=1).iter_pages(str(path)))
+    extractor = PdfExtractor(workers=2, parallel_min_pages=4)
+    assert list(extractor.iter_pages(str(path))) == sequential
+
+    # Later documents reuse the pool started by the first one
+    pool = extractor.executor
+    assert list(extractor.iter_pages(str(path))) == sequential
+    assert extractor.executor is pool
+    extractor.close()
+    assert extractor._executor is None
+
+def test_page_cap_truncates(tmp_path):
+    """Test that extraction stops at the configured page cap"""
+    path = tmp_path / "manual.pdf"
+    _make_pdf(path, 6)
+    stats = {}
+    pages = list(PdfExtractor(max_pages=4, workers=1).iter_pages(str(path), stats))
+    assert len(pages) == 4
+    assert stats["page_count"] == 6
+    assert stats["truncated"] == "page_limit"
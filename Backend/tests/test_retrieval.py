@@ -0,0 +1,26 @@
+from core.retrieval import group_by_document, has_thai, like_patterns, reciprocal_rank_fusion
+
+def _hit(doc_id, chunk_index, score=1.0):
+    return {"document_id": doc_id, "chunk_index": chunk_index, "page": None, "text": f"{doc_id}:{chunk_index}", "score": score}
+
+def test_rrf_rewards_chunks_found_by_both_legs():
+    """Test that a chunk ranked by both legs beats single-leg top hits"""
+    fused = reciprocal_rank_fusion({
+        "vector": [_hit(1, 0), _hit(2, 0), _hit(3, 0)],
+        "lexical": [_hit(4, 0), _hit(2, 0)]
+    }, k=60)
+    assert (fused[0]["document_id"], fused[0]["chunk_index"]) == (2, 0)
+    assert set(fused[0]["sources"]) == {"vector", "lexical"}
+    assert len(fused) == 4
+
+def test_grouping_keeps_best_documents():
+    """Test that hits are grouped under the best-ranked documents only"""
+    hits = [_hit(1, 0), _hit(2, 3), _hit(1, 5), _hit(3, 1)]
+    grouped = group_by_document(hits, limit=2)
+    assert list(grouped) == [1, 2]
+    assert [hit["chunk_index"] for hit in grouped[1]] == [0, 5]
+
+def test_query_helpers():
+    assert has_thai("ราคา SKU-100")
+    assert not has_thai("SKU-100")
+    assert like_patterns("50% off_sale") == ["%50\\%%", "%off\\_sale%"]
@@ -0,0 +1,40 @@
+import pytest
+from core.spreadsheets import SpreadsheetChunker
+
+def test_csv_rows_are_grouped_under_the_header(tmp_path):
+    """Test that every CSV chunk carries the header and rows are not lost"""
+    pytest.importorskip("pandas")
+    path = tmp_path / "orders.csv"
+    lines = ["sku,name,price"] + [f"SKU-{i},Item {i},{i}.50" for i in range(2000)]
+    path.write_text("\n".join(lines), encoding="utf-8")
+
+    content, metadata = SpreadsheetChunker(chunk_tokens=128, batch_rows=300, preview_rows=3).process(str(path))
+    chunks = metadata["chunks"]
+    assert len(chunks) > 10
+    assert all(chunk.startswith("Sheet: orders\nsku | name | price\n") for chunk in chunks)
+    body_rows = [line for chunk in chunks for line in chunk.split("\n")[2:]]
+    assert body_rows == [f"SKU-{i} | Item {i} | {i}.50" for i in range(2000)]
+    assert metadata["sheets"] == [{"name": "orders", "columns": ["sku", "name", "price"], "rows": 2000}]
+    assert content.splitlines()[:3] == ["Sheet: orders (2000 rows)", "sku | name | price", "SKU-0 | Item 0 | 0.50"]
+
+def test_xlsx_sheets_are_chunked_separately(tmp_path):
+    """Test that each worksheet gets its own header and chunks"""
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    first = workbook.active
+    first.title = "Stock"
+    first.append(["sku", "qty"])
+    for i in range(50):
+        first.append([f"A{i}", float(i)])
+    second = workbook.create_sheet("Notes")
+    second.append([None])
+    second.append(["note"])
+    second.append(["ตรวจนับทุกเดือน"])
+    path = tmp_path / "book.xlsx"
+    workbook.save(path)
+
+    _, metadata = SpreadsheetChunker(chunk_tokens=64).process(str(path))
+    assert [sheet["name"] for sheet in metadata["sheets"]] == ["Stock", "Notes"]
+    assert [sheet["rows"] for sheet in metadata["sheets"]] == [50, 1]
+    assert "A7 | 7" in "".join(metadata["chunks"])
+    assert metadata["chunks"][-1] == "Sheet: Notes\nnote\nตรวจนับทุกเดือน"
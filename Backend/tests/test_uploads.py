@@ -0,0 +1,144 @@
+import hashlib
+import threading
+import time
+import pytest
+from core.cache import ProcessingCache
+from core.document_processor import DocumentProcessor
+from core.handlers import registry
+from core.uploads import UploadError, UploadIdleError, UploadStore
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def test_parts_are_checked_and_resumable(tmp_path):
+    """Test part lengths, checksums, resending received parts and completion checks"""
+    store = UploadStore(tmp_path / "sessions")
+    data = bytes(range(256)) * 40
+    upload = store.create("report.txt", len(data), part_size=4096, checksum=_sha256(data))
+    parts = [data[i:i + 4096] for i in range(0, len(data), 4096)]
+    assert upload.part_count == 3
+
+    store.put_part(upload.id, 2, [parts[2]], checksum=_sha256(parts[2]))
+    with pytest.raises(UploadError, match="checksum") as error:
+        store.put_part(upload.id, 0, [b"x" * 4096], checksum=_sha256(parts[0]))
+    assert error.value.status_code == 422
+    with pytest.raises(UploadError, match="larger") as error:
+        store.put_part(upload.id, 0, [parts[0], b"extra"])
+    assert error.value.status_code == 413
+    store.put_part(upload.id, 0, [parts[0][:100], parts[0][100:]])
+    status = store.status(upload.id)
+    assert status["missing_parts"] == [1]
+    assert status["received_bytes"] == len(parts[0]) + len(parts[2])
+
+    # A retried part is accepted only if it is identical
+    store.put_part(upload.id, 0, [parts[0]])
+    with pytest.raises(UploadError, match="different content") as error:
+        store.put_part(upload.id, 0, [b"y" * 4096])
+    assert error.value.status_code == 409
+    with pytest.raises(UploadError, match="1 of 3 parts"):
+        store.complete(upload.id)
+
+    store.put_part(upload.id, 1, [parts[1]])
+    assert store.complete(upload.id).status == "complete"
+    path = store.take(upload.id, ".txt")
+    assert path.read_bytes() == data
+    assert store.get(upload.id) is None
+
+def test_checksum_mismatch_fails_the_upload(tmp_path):
+    """Test that a corrupted file is rejected and no more parts are taken"""
+    store = UploadStore(tmp_path / "sessions")
+    upload = store.create("notes.txt", 5, checksum=_sha256(b"other"))
+    store.put_part(upload.id, 0, [b"hello"])
+    with pytest.raises(UploadError, match="does not match") as error:
+        store.complete(upload.id)
+    assert error.value.status_code == 422
+    assert store.status(upload.id)["status"] == "failed"
+    with pytest.raises(UploadError, match="failed"):
+        store.write_part(upload.id, 0)
+    with pytest.raises(UploadError, match="Unknown upload"):
+        store.get("../../etc")
+
+def test_reader_waits_for_parts_in_order(tmp_path):
+    """Test that the reader blocks on missing parts, whatever order they arrive in"""
+    store = UploadStore(tmp_path / "sessions")
+    data = b"".join(f"line {i}\n".encode() for i in range(3000))
+    upload = store.create("log.txt", len(data), part_size=1000)
+    result = {}
+
+    def read():
+        with store.reader(upload.id) as reader:
+            result["data"] = reader.read()
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    for index in reversed(range(upload.part_count)):
+        store.put_part(upload.id, index, [data[index * 1000:(index + 1) * 1000]])
+        time.sleep(0.001)
+    thread.join(timeout=10)
+    assert result["data"] == data
+    store.remove(upload.id)
+
+    aborted = store.create("log.txt", 2000, part_size=1000)
+    store.put_part(aborted.id, 0, [b"a" * 1000])
+    reader = store.reader(aborted.id)
+    assert reader.read1(5000) == b"a" * 1000
+    threading.Timer(0.05, store.remove, args=(aborted.id,)).start()
+    with pytest.raises(UploadError, match="aborted") as error:
+        reader.read1(5000)
+    assert error.value.status_code == 410
+
+    stale = store.create("old.txt", 1)
+    assert store.expire(now=time.time() + store.ttl + 1) == 1
+    assert store.get(stale.id) is None
+
+def test_waiting_gives_up_on_idle_uploads(tmp_path):
+    """Test that readers stop waiting once nothing arrives for the idle timeout, leaving the upload open"""
+    store = UploadStore(tmp_path / "sessions", idle_timeout=0.2)
+    upload = store.create("log.txt", 2000, part_size=1000)
+    store.put_part(upload.id, 0, [b"a" * 1000])
+    reader = store.reader(upload.id)
+    assert reader.read1(5000) == b"a" * 1000
+    with pytest.raises(UploadIdleError) as error:
+        reader.read1(5000)
+    assert error.value.status_code == 408
+    with pytest.raises(UploadIdleError):
+        store.wait_complete(upload.id, poll=0.05)
+    assert store.status(upload.id)["status"] == "open"
+
+    # A part arriving later resets the deadline
+    store.put_part(upload.id, 1, [b"b" * 1000])
+    assert store.complete(upload.id).status == "complete"
+    assert store.wait_complete(upload.id).status == "complete"
+
+def _run_incremental(extension, processor, store, upload_id):
+    handler = registry.incremental(extension)
+    result = {}
+
+    def chunks():
+        result["value"] = yield from handler(processor, store.reader(upload_id), filename=f"data{extension}")
+
+    return list(chunks()), result["value"]
+
+def test_incremental_handlers_match_whole_file_processing(tmp_path):
+    """Test that text and CSV chunked while arriving match processing the finished file"""
+    pytest.importorskip("spacy")
+    pytest.importorskip("pandas")
+    processor = DocumentProcessor(cache=ProcessingCache(cache_dir=tmp_path / "cache"))
+    store = UploadStore(tmp_path / "sessions")
+    files = {
+        ".txt": "\r\n\r\n".join(f"Paragraph {i} covers invoices. It ends here — ✓." for i in range(300)).encode(),
+        ".csv": ("sku,name\n" + "".join(f"SKU-{i},Item {i}\n" for i in range(3000))).encode()
+    }
+    for extension, data in files.items():
+        path = tmp_path / f"data{extension}"
+        path.write_bytes(data)
+        content, metadata = processor.process_file(str(path), use_cache=False)
+
+        # Parts of 7 bytes split multi-byte characters and line endings
+        upload = store.create(path.name, len(data), part_size=7)
+        for index in range(upload.part_count):
+            store.put_part(upload.id, index, [data[index * 7:(index + 1) * 7]])
+        chunks, (streamed_content, streamed_metadata) = _run_incremental(extension, processor, store, upload.id)
+        assert chunks == metadata["chunks"]
+        assert streamed_content == content
+        assert streamed_metadata.get("sheets") == metadata.get("sheets")
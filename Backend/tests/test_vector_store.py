@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from core.vector_store import LocalVectorStore
+
+def _corpus(n=400, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(n, dim)).astype(np.float32)
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_exact_search_finds_nearest(tmp_path, dtype):
+    """Test that a stored vector is its own nearest neighbour"""
+    store = LocalVectorStore(tmp_path, dtype=dtype, train_size=10 ** 6)
+    vectors = _corpus()
+    store.add([f"1:{i}" for i in range(len(vectors))], vectors, [{"document_id": 1, "chunk_index": i} for i in range(len(vectors))])
+    hits = store.query(vectors[42], n_results=3)
+    assert hits[0]["id"] == "1:42"
+    assert hits[0]["metadata"]["chunk_index"] == 42
+    assert hits[0]["distance"] == pytest.approx(0, abs=0.01)
+    assert [hit["distance"] for hit in hits] == sorted(hit["distance"] for hit in hits)
+
+def test_filter_delete_and_reopen(tmp_path):
+    """Test metadata filters, tombstones and persistence across instances"""
+    store = LocalVectorStore(tmp_path, train_size=10 ** 6)
+    vectors = _corpus(n=20)
+    store.add(
+        [f"{i % 2}:{i}" for i in range(20)],
+        vectors,
+        [{"document_id": i % 2, "chunk_index": i} for i in range(20)],
+        [f"chunk {i}" for i in range(20)]
+    )
+    hits = store.query(vectors[3], n_results=5, where={"document_id": 0})
+    assert all(hit["metadata"]["document_id"] == 0 for hit in hits)
+
+    store.delete(where={"document_id": 1})
+    store.delete(ids=["0:4"])
+    assert store.count() == 9
+    store.close()
+
+    reopened = LocalVectorStore(tmp_path)
+    hits = reopened.query(vectors[3], n_results=20)
+    assert len(hits) == 9
+    assert "0:4" not in {hit["id"] for hit in hits}
+    assert reopened.query(vectors[2], n_results=1)[0]["document"] == "chunk 2"
+
+def test_ivf_index_after_training(tmp_path):
+    """Test that queries keep finding neighbours once the lists are trained"""
+    store = LocalVectorStore(tmp_path, nlist=8, nprobe=2, train_size=200)
+    vectors = _corpus(n=300)
+    store.add([str(i) for i in range(150)], vectors[:150])
+    assert store.centroids is None
+    store.add([str(i) for i in range(150, 300)], vectors[150:])
+    # Training runs in the background; until then queries are exact
+    assert store.query(vectors[7], n_results=1)[0]["id"] == "7"
+    store._training.join()
+    assert store.centroids is not None and len(store.centroids) == 8
+    found = sum(store.query(vectors[i], n_results=1)[0]["id"] == str(i) for i in range(0, 300, 10))
+    assert found == 30
+
+    # Re-adding an id replaces the old vector
+    store.add(["0"], vectors[1:2])
+    assert store.count() == 300
+    assert {hit["id"] for hit in store.query(vectors[1], n_results=2)} == {"0", "1"}
+
+def test_processes_share_a_directory(tmp_path):
+    """Test that two instances on one directory allocate distinct rows and see each other's vectors"""
+    first = LocalVectorStore(tmp_path, train_size=10 ** 6)
+    second = LocalVectorStore(tmp_path, train_size=10 ** 6)
+    vectors = _corpus(n=3000)
+    # Alternate writers and grow the files past their first allocation
+    for start in range(0, 3000, 500):
+        writer = first if start % 1000 == 0 else second
+        writer.add([str(i) for i in range(start, start + 500)], vectors[start:start + 500])
+    assert first.count() == second.count() == 3000
+    for store in (first, second):
+        assert [store.query(vectors[i], n_results=1)[0]["id"] for i in (10, 1700, 2999)] == ["10", "1700", "2999"]
+
+    # Training by one instance is picked up by the other
+    first.train_size = 1
+    first.background_train = False
+    first.nlist = 4
+    first.add(["extra"], vectors[:1])
+    assert second.query(vectors[2500], n_results=1)[0]["id"] == "2500"
+    assert second.centroids is not None and len(second.centroids) == 4
+
+def test_blocked_scan_and_compaction(tmp_path, monkeypatch):
+    """Test that block-wise scoring keeps the best hits and compaction keeps every live vector"""
+    monkeypatch.setattr(LocalVectorStore, "QUERY_BLOCK_ROWS", 64)
+    monkeypatch.setattr(LocalVectorStore, "COMPACT_MIN_ROWS", 10 ** 6)
+    store = LocalVectorStore(tmp_path, dtype="int8", train_size=10 ** 6)
+    vectors = _corpus(n=1000)
+    store.add([str(i) for i in range(1000)], vectors, documents=[f"chunk {i}" for i in range(1000)])
+    hits = store.query(vectors[500], n_results=5)
+    exact = np.argsort(-(vectors @ vectors[500] / np.linalg.norm(vectors, axis=1)))[:5]
+    assert [hit["id"] for hit in hits] == [str(i) for i in exact]
+
+    store.delete(ids=[str(i) for i in range(0, 1000, 2)])
+    store.add(["1"], vectors[2:3])
+    assert store.compact() == 501
+    assert store._allocated() == 500
+    for i in (1, 3, 999):
+        hit = store.query(vectors[2 if i == 1 else i], n_results=1)[0]
+        assert (hit["id"], hit["distance"]) == (str(i), pytest.approx(0, abs=0.01))
+    assert store.query(vectors[999], n_results=1)[0]["document"] == "chunk 999"
+
+    # Deleting most of what is left compacts on its own
+    monkeypatch.setattr(LocalVectorStore, "COMPACT_MIN_ROWS", 100)
+    store.delete(ids=[str(i) for i in range(3, 1000, 2)])
+    assert store.count() == 1 and store._allocated() == 1